@@ -9,6 +9,30 @@ void setup() {
   Serial.begin(9600);  // Start serial communication at 9600 baud
 }
 
+// Set to 1 to echo every command back over serial (slows the 9600 baud link down)
+#define ECHO 0
+
+void setPwm(int dir, int pwmValue) {
+  if (ECHO) {
+    Serial.print("pwmValue: ");
+    Serial.println(pwmValue);
+  }
+  if (pwmValue >= 0 && pwmValue <= 255) {
+    analogWrite(dir, pwmValue);  // Apply PWM to control motor speed
+  }
+}
+
+int channelPin(char channel) {
+  if (channel == 'L') {
+    return LEFT;
+  } else if (channel == 'F') {
+    return FORWARD;
+  } else if (channel == 'R') {
+    return RIGHT;
+  }
+  return -1;
+}
+
 void loop() {
   // Read the serial input from the Python script
   if (Serial.available() > 0) {
@@ -27,17 +51,24 @@ void loop() {
         dir = RIGHT;
         input = input.substring(6);
       } else {
+        // multi-channel frame, e.g. "WARN: L200 F0 R50"
+        int start = 0;
+        while (start < input.length()) {
+          int end = input.indexOf(' ', start);
+          if (end == -1) {
+            end = input.length();
+          }
+          int pin = channelPin(input.charAt(start));
+          if (pin != -1 && end > start + 1) {
+            setPwm(pin, input.substring(start + 1, end).toInt());
+          }
+          start = end + 1;
+        }
         return;
       }
 
       int pwmValue = input.toInt();  // Skips "TEST " and converts "500"
-      Serial.print("pwmValue: ");
-      Serial.println(pwmValue);
-      if (pwmValue >= 0 && pwmValue <= 255) {
-        analogWrite(dir, pwmValue);  // Apply PWM to control motor speed
-        Serial.print("Motor PWM set to: ");
-        // Serial.println(pwmValue);
-      }
+      setPwm(dir, pwmValue);
 
       // if (input.endsWith("ON")) {
       //   digitalWrite(dir, HIGH);
@@ -1,7 +1,12 @@
-from ultralytics import YOLO
 from typing import List, Dict, Tuple
 import numpy as np
+import cv2
+import time
 from homography import Homog
+from YOLO_test.tracker import ObjectTracker
+from YOLO_test.hazards import HazardScorer, HAZARD_CLASSES
+from YOLO_test.gate import FrameGate
+from YOLO_test.backends import load_model, tier_weights
 
 # Initialize homography
 HOMOG = Homog()
@@ -9,79 +14,493 @@ HOMOG = Homog()
 # Initialize parameters
 CONF_THRESHOLD = .6
 DIST_THRESHOLD = 100 # inches away from the camera
+USE_DISTANCE_LUT = False # look distances up per pixel row instead of projecting every box (approximate, see Homog.row_distance_lut)
 
-def filter_results(results) -> Dict[str, Dict[str, List|Dict]]:
+SECTORS = ("left", "forward", "right")
+SECTOR_BOUNDS = (0.33, 0.66)  # normalized x_center boundaries between left | forward | right
+FOCUS_MARGIN = 0.05  # normalized width added on each side of the faced sector when it is cropped out
+
+
+def box_distances(xyxy: np.ndarray, height: int = None, width: float = None) -> np.ndarray:
+    """
+    Ground plane distance of each box from the camera, using the bottom center of the box.
+    :param xyxy: (n, 4) array of bounding boxes
+    :param height: height of the image, needed for the per-row lookup table
+    :param width: width of the image, needed for the per-row lookup table
+    :return: (n,) array of distances in inches (inf when the box does not touch the ground plane)
+    """
+    if USE_DISTANCE_LUT and height is not None and width is not None:
+        lut = HOMOG.row_distance_lut(height, width / 2)
+        rows = np.clip(xyxy[:, 3].astype(np.int64), 0, height - 1)
+        return lut[rows]
+    uv = np.stack([(xyxy[:, 0] + xyxy[:, 2]) / 2, xyxy[:, 3]], axis=1)  # u = x_center, v = bottom-most y
+    return HOMOG.distances(uv)
+
+
+def box_sectors(xyxy: np.ndarray, width: float | np.ndarray,
+                sector_bounds: Tuple[float, float] = SECTOR_BOUNDS) -> np.ndarray:
+    """
+    Direction of each box from its x_center.
+    :param xyxy: (n, 4) array of bounding boxes
+    :param width: width of the image the boxes are in, or a (n,) array of widths
+    :param sector_bounds: normalized x_center of the left/forward and forward/right boundaries
+    :return: (n,) array of directions, 0 = left, 1 = forward, 2 = right (the indices of SECTORS)
+    """
+    x_center = (xyxy[:, 0] + xyxy[:, 2]) / (2 * width)
+    return (x_center >= sector_bounds[0]).astype(np.int64) + (x_center > sector_bounds[1])
+
+
+def filter_boxes(xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, names: Dict[int, str], width: float | np.ndarray,
+                 sector_bounds: Tuple[float, float] = SECTOR_BOUNDS, height: int = None,
+                 dist_threshold: float | None = None,
+                 track_ids: np.ndarray = None) -> Dict[str, Dict[str, List|Dict]]:
+    """
+    Separate detected boxes into left, forward, and right categories with a few array operations.
+    :param xyxy: (n, 4) array of bounding boxes (Top-left x, Top-left y, Bottom-right x, Bottom-right y)
+    :param conf: (n,) array of confidences
+    :param cls: (n,) array of class ids
+    :param names: mapping of class id to object name
+    :param width: width of the image the boxes are in, or a (n,) array of widths
+    :param sector_bounds: normalized x_center of the left/forward and forward/right boundaries
+    :param height: height of the image the boxes are in, only used by the distance lookup table
+    :param dist_threshold: objects further away than this (in inches) are dropped, e.g. DIST_THRESHOLD. None keeps
+     everything, and so does a box whose distance is unknown (it does not touch the ground plane)
+    :param track_ids: (n,) array of track ids (see ObjectTracker), added per direction under "track_ids"
+    :return: Dictionary of detected objects (name -> count), their bounding boxes and distances per direction.
+    """
+    keep = conf >= CONF_THRESHOLD
+    xyxy = xyxy[keep]
+    cls = cls[keep].astype(np.int64)
+    width = width[keep] if isinstance(width, np.ndarray) else width
+    track_ids = track_ids[keep] if track_ids is not None else None
+
+    distances = box_distances(xyxy, height, None if isinstance(width, np.ndarray) else width)
+    if dist_threshold is not None:
+        # a box off the ground plane (inf) has an unknown distance rather than a far one, it is kept
+        near = (distances <= dist_threshold) | ~np.isfinite(distances)
+        xyxy, cls, distances = xyxy[near], cls[near], distances[near]
+        width = width[near] if isinstance(width, np.ndarray) else width
+        track_ids = track_ids[near] if track_ids is not None else None
+
+    sectors = box_sectors(xyxy, width, sector_bounds)
+
+    results_dict = {}
+    for i, sector in enumerate(SECTORS):
+        in_sector = sectors == i
+        ids = cls[in_sector]
+        # count the frequency of each detected object, keeping the order objects were first detected in
+        counts = np.bincount(ids)
+        unique_ids, first_seen = np.unique(ids, return_index=True)
+        ordered_ids = unique_ids[np.argsort(first_seen)]
+        results_dict[sector] = {
+            "objects": {names[class_id]: int(counts[class_id]) for class_id in ordered_ids},
+            "bounding_boxes": xyxy[in_sector].tolist(),
+            "distances": distances[in_sector].tolist()
+        }
+        if track_ids is not None:
+            results_dict[sector]["track_ids"] = track_ids[in_sector].tolist()
+
+    return results_dict
+
+
+def filter_results(results, sector_bounds: Tuple[float, float] = SECTOR_BOUNDS,
+                   dist_threshold: float | None = None) -> Dict[str, Dict[str, List|Dict]]:
     """
     Filter the results of the YOLO model to separate detected objects into left, forward, and right categories.
     :param results: Results object from YOLO model.
+    :param sector_bounds: normalized x_center of the left/forward and forward/right boundaries
+    :param dist_threshold: objects further away than this (in inches) are dropped, see filter_boxes
     """
-    # left, forward, right = [], [], []
-    results_dict = {"left": {"objects": [], "bounding_boxes": []},
-                "forward": {"objects": [], "bounding_boxes": []},
-                "right": {"objects": [], "bounding_boxes": []}}
-    for result in results:
-        if len(result.boxes) == 0:
-            continue
-        objects = result.to_df()['name'].to_list()
-        boxes = result.boxes  # Boxes object for bounding box outputs
-        coords = boxes.xywhn  # normalized xywh (x_center, y_center, width, height)
-        xyxy_coords = boxes.xyxy # Bounding box coordinates xyxy (Top-left x, Top-left y, Bottom-right x, Bottom-right y)
-        probs = boxes.conf  
-        for i in range(len(objects)):
-            prob = probs[i]
-            coord = coords[i]
-            xyxy_coord = xyxy_coords[i]
-            if prob < CONF_THRESHOLD:
-                continue
-            # z_dist, _ = HOMOG.transformUvToXy(u=coord[0].item(), v=xyxy_coord[3].item()) # u = x_center, v = bottom-most y
-            # if z_dist > DIST_THRESHOLD:
-            #     continue
-            x_center = coord[0]
-            if x_center < 0.33:
-                results_dict["left"]["objects"].append(objects[i])
-                results_dict["left"]["bounding_boxes"].append(xyxy_coord.tolist())
-            elif x_center > 0.66:
-                results_dict["right"]["objects"].append(objects[i])
-                results_dict["right"]["bounding_boxes"].append(xyxy_coord.tolist())
-            else:
-                results_dict["forward"]["objects"].append(objects[i])
-                results_dict["forward"]["bounding_boxes"].append(xyxy_coord.tolist())
-    # count the frequency of each detected object
-    results_dict["left"]["objects"] = count_objects(results_dict["left"]["objects"])
-    results_dict["forward"]["objects"] = count_objects(results_dict["forward"]["objects"])
-    results_dict["right"]["objects"] = count_objects(results_dict["right"]["objects"])
+    data = [result.boxes.data.cpu().numpy() for result in results]
+    widths = [np.full(len(boxes), result.orig_shape[1], dtype=np.float32) for boxes, result in zip(data, results)]
+    data = np.concatenate(data) if data else np.zeros((0, 6), dtype=np.float32)
+    widths = np.concatenate(widths) if widths else np.zeros(0, dtype=np.float32)
+    names = results[0].names if len(results) > 0 else {}
 
-    return results_dict
+    return filter_boxes(data[:, :4], data[:, 4], data[:, 5], names, widths, sector_bounds,
+                        dist_threshold=dist_threshold)
 
-def count_objects(objects: List[str]) -> Dict[str, int]:
+def read_rgb(path: str) -> np.ndarray:
+    """
+    Reads an image file the way the detector expects its frames.
+    :param path: the path to the image
+    :return: the image as an RGB array
     """
-    Count the frequency of each detected object.
-    :param objects: List of detected objects.
-    :return: Dictionary with object names as keys and their counts as values.
+    img = cv2.imread(path)
+    if img is None:
+        raise FileNotFoundError(f"Could not read the image {path}")
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+class Detector:
     """
-    object_counts = {}
-    for obj in objects:
-        if obj in object_counts:
-            object_counts[obj] += 1
+    A long-lived YOLO detector. The weights are loaded once, the model is warmed up with a dummy frame
+    and the letterbox buffer is reused across frames, so steady-state latency is inference only.
+
+    >>> detector = Detector("yolo11x.pt")  # doctest: +SKIP
+    >>> results_dict = detector.detect(img_rgb)  # doctest: +SKIP
+    >>> detector.timings  # doctest: +SKIP
+    {'preprocess': 1.2, 'inference': 180.4, 'postprocess': 0.9, 'total': 182.5}
+
+    Without a GPU, a smaller model on ONNX Runtime is much faster, see backends:
+
+    >>> detector = Detector(tier_weights("s"), backend="onnx-int8")  # doctest: +SKIP
+
+    With a tracker, detect only reports objects of confirmed tracks (see ObjectTracker), so the
+    counts do not flicker from frame to frame. With a hazard scorer, detect also scores the haptics
+    intensity of each direction, see hazards. With a gate, detect skips the frames the gate rejects
+    (static or blurry, see FrameGate) and returns the results of the last detected frame instead,
+    but never while the tracker is confirming or dropping a track, so the gate doesn't stretch its
+    min_hits and max_age frames into seconds.
+    detect_batch does none of this, its frames need not come from the same stream.
+
+    detect_focused spends the model on the sector the user faces: that sector is cropped out and
+    detected at imgsz, the two others only at periphery_imgsz, every periphery_every frames and for
+    the hazard classes only.
+    """
+    def __init__(self, weights: str = "yolo11x.pt", imgsz: int = 640, warmup: bool = True, backend: str = "torch",
+                 tracker: ObjectTracker = None, hazard_scorer: HazardScorer = None, gate: FrameGate = None,
+                 periphery_imgsz: int = 320, periphery_every: int = 2, periphery_classes: Tuple[str, ...] = None,
+                 dist_threshold: float | None = None):
+        """
+        :param weights: the path to the YOLO weights
+        :param imgsz: the square input size of the model
+        :param warmup: runs a dummy frame through the model so the first real frame is not slowed down
+        :param backend: the backend the model runs on, one of backends.BACKENDS. ONNX exports are cached on disk
+        :param tracker: tracks the objects across the frames passed to detect
+        :param hazard_scorer: scores the haptics intensities of the frames passed to detect
+        :param gate: decides which of the frames passed to detect are worth detecting on
+        :param periphery_imgsz: the input size of the sectors the user does not face, see detect_focused
+        :param periphery_every: the sectors the user does not face are detected every this many frames
+        :param periphery_classes: the object names detected in the sectors the user does not face, the hazard classes by default
+        :param dist_threshold: objects further away than this (in inches) are left out of the results, e.g.
+         DIST_THRESHOLD. None keeps everything. The hazards are scored on every object, see HazardScorer
+        """
+        self._model = load_model(weights, backend, imgsz=imgsz)
+        self._imgsz = imgsz
+        self._dist_threshold = dist_threshold
+        # letterbox buffers per input size, padded with the same grey ultralytics uses.
+        # Index 0 doubles as the single frame buffer
+        self._inputs = {imgsz: np.full((1, imgsz, imgsz, 3), 114, dtype=np.uint8)}
+        self._timings = {"preprocess": 0.0, "inference": 0.0, "postprocess": 0.0, "total": 0.0}
+
+        self._periphery_imgsz = periphery_imgsz
+        self._periphery_every = periphery_every
+        periphery_classes = tuple(HAZARD_CLASSES) if periphery_classes is None else periphery_classes
+        self._periphery_class_ids = [class_id for class_id, name in self._model.names.items()
+                                     if name in periphery_classes]
+        self._focus = None  # the sector detect_focused last focused on
+        self._periphery = None  # (xyxy, conf, cls) last detected outside the focused sector
+        self._periphery_age = 0  # frames since the periphery was detected
+
+        # the warmup frame is neither tracked nor gated, they are attached after it
+        self._tracker = None
+        self._gate = None
+        self._last_results = None
+        self._hazard_scorer = hazard_scorer
+        self._hazards = np.zeros(len(SECTORS), dtype=np.int64)
+        if warmup:
+            self.detect(np.zeros((imgsz, imgsz, 3), dtype=np.uint8))
+            if periphery_imgsz != imgsz:
+                dummy = self._letterbox(np.zeros((periphery_imgsz, periphery_imgsz, 3), dtype=np.uint8),
+                                        imgsz=periphery_imgsz)
+                self._model(dummy, imgsz=periphery_imgsz, verbose=False)
+        self._tracker = tracker
+        self._gate = gate
+        self._last_results = None
+        self._hazards = np.zeros(len(SECTORS), dtype=np.int64)
+
+    def _reserve(self, batch_size: int, imgsz: int = None) -> None:
+        """
+        Grows the letterbox buffers so they fit a batch, they are never shrunk
+        :param batch_size: the number of frames in the batch
+        :param imgsz: the input size of the buffers, the model's by default
+        :return: None
+        """
+        imgsz = self._imgsz if imgsz is None else imgsz
+        if imgsz not in self._inputs or batch_size > len(self._inputs[imgsz]):
+            self._inputs[imgsz] = np.full((batch_size, imgsz, imgsz, 3), 114, dtype=np.uint8)
+
+    def _letterbox(self, img: np.ndarray, index: int = 0, imgsz: int = None) -> np.ndarray:
+        """
+        Resizes the image into a preallocated letterbox buffer, keeping the aspect ratio
+        :param img: a (h, w, 3) image
+        :param index: the index of the letterbox buffer
+        :param imgsz: the input size of the buffer, the model's by default
+        :return: the letterbox buffer
+        """
+        imgsz = self._imgsz if imgsz is None else imgsz
+        self._reserve(index + 1, imgsz)
+        buffer = self._inputs[imgsz][index]
+        h, w = img.shape[:2]
+        gain = min(imgsz / h, imgsz / w)
+        new_w, new_h = round(w * gain), round(h * gain)
+        # same rounding as ultralytics.utils.ops.scale_boxes, _unletterbox relies on it to map the boxes back
+        left = round((imgsz - new_w) / 2 - 0.1)
+        top = round((imgsz - new_h) / 2 - 0.1)
+
+        buffer[:top] = 114
+        buffer[top + new_h:] = 114
+        buffer[top:top + new_h, :left] = 114
+        buffer[top:top + new_h, left + new_w:] = 114
+        cv2.resize(img, (new_w, new_h), dst=buffer[top:top + new_h, left:left + new_w],
+                   interpolation=cv2.INTER_LINEAR)
+        return buffer
+
+    def _unletterbox(self, result, shape: Tuple[int, ...],
+                     imgsz: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Maps the boxes from the letterbox buffer back onto the original image
+        :param result: Results object from YOLO model on a letterbox buffer
+        :param shape: the shape of the original image
+        :param imgsz: the input size of the buffer, the model's by default
+        :return: the (n, 4) boxes, (n,) confidences and (n,) class ids
+        """
+        imgsz = self._imgsz if imgsz is None else imgsz
+        data = result.boxes.data.cpu().numpy()
+        h, w = shape[:2]
+        gain = min(imgsz / h, imgsz / w)
+        left = round((imgsz - round(w * gain)) / 2 - 0.1)
+        top = round((imgsz - round(h * gain)) / 2 - 0.1)
+
+        xyxy = (data[:, :4] - np.array([left, top, left, top], dtype=np.float32)) / gain
+        return xyxy, data[:, 4], data[:, 5]
+
+    def _restore(self, result, img: np.ndarray, track: bool = False) -> Dict[str, Dict[str, List|Dict]]:
+        """
+        Maps the boxes from the letterbox buffer back onto the original image and sorts them by direction
+        :param result: Results object from YOLO model on a letterbox buffer
+        :param img: the original image
+        :param track: whether to pass the boxes through the tracker and the hazard scorer
+        :return: Dictionary of detected objects and their bounding boxes.
+        """
+        xyxy, conf, cls = self._unletterbox(result, img.shape)
+        return self._postprocess(xyxy, conf, cls, result.names, img.shape, track)
+
+    def _postprocess(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, names: Dict[int, str],
+                     shape: Tuple[int, ...], track: bool = False) -> Dict[str, Dict[str, List|Dict]]:
+        """
+        Sorts the boxes of the original image by direction
+        :param xyxy: (n, 4) array of bounding boxes in the original image
+        :param conf: (n,) array of confidences
+        :param cls: (n,) array of class ids
+        :param names: mapping of class id to object name
+        :param shape: the shape of the original image
+        :param track: whether to pass the boxes through the tracker and the hazard scorer
+        :return: Dictionary of detected objects and their bounding boxes.
+        """
+        h, w = shape[:2]
+        track_ids = None
+        if track and self._tracker is not None:
+            keep = conf >= CONF_THRESHOLD
+            xyxy, conf, cls, track_ids = self._tracker.update(xyxy[keep], conf[keep], cls[keep])
+
+        np.clip(xyxy[:, 0::2], 0, w, out=xyxy[:, 0::2])
+        np.clip(xyxy[:, 1::2], 0, h, out=xyxy[:, 1::2])
+
+        if track and self._hazard_scorer is not None:
+            confident = conf >= CONF_THRESHOLD
+            hazard_xyxy, hazard_cls = xyxy[confident], cls[confident]
+            self._hazards = self._hazard_scorer.score(hazard_xyxy, hazard_cls, box_distances(hazard_xyxy, h, w),
+                                                      box_sectors(hazard_xyxy, w), names, w, h)
+        return filter_boxes(xyxy, conf, cls, names, w, height=h, dist_threshold=self._dist_threshold,
+                            track_ids=track_ids)
+
+    def detect(self, img_rgb: np.ndarray | str) -> Dict[str, Dict[str, List|Dict]]:
+        """
+        Perform object detection on a single image.
+        :param img_rgb: RGB image as a numpy array (or a path to an image).
+        :return: Dictionary of detected objects and their bounding boxes.
+        """
+        if isinstance(img_rgb, str):
+            img_rgb = read_rgb(img_rgb)
+
+        start = time.perf_counter()
+        if self._skip(img_rgb, start):
+            return self._last_results
+
+        model_input = self._letterbox(img_rgb)
+        preprocessed = time.perf_counter()
+        # the predictor keeps the arguments of the previous call, classes=None undoes the periphery's class filter
+        results = self._model(model_input, imgsz=self._imgsz, classes=None, verbose=False)
+        inferred = time.perf_counter()
+        results_dict = self._restore(results[0], img_rgb, track=True)
+        self._last_results = results_dict
+        end = time.perf_counter()
+
+        self._timings = {
+            "preprocess": (preprocessed - start) * 1000,
+            "inference": (inferred - preprocessed) * 1000,
+            "postprocess": (end - inferred) * 1000,
+            "total": (end - start) * 1000
+        }
+        return results_dict
+
+    def _skip(self, img_rgb: np.ndarray, start: float) -> bool:
+        """
+        Asks the gate whether the frame is worth detecting on
+        :param img_rgb: the frame
+        :param start: when the call to detect started, for the timings
+        :return: True if the results of the last detected frame still hold
+        """
+        if self._gate is None:
+            return False
+        # tracks that are being confirmed or dropped need consecutive frames
+        unsettled = self._tracker is not None and not self._tracker.settled
+        if self._gate.should_detect(img_rgb, force=unsettled) or self._last_results is None:
+            return False
+        # nothing worth detecting changed, the previous objects and hazards still hold
+        end = time.perf_counter()
+        self._timings = {"preprocess": (end - start) * 1000, "inference": 0.0, "postprocess": 0.0,
+                         "total": (end - start) * 1000}
+        return True
+
+    def detect_focused(self, img_rgb: np.ndarray | str, sector: int = None) -> Dict[str, Dict[str, List|Dict]]:
+        """
+        Perform object detection on a single image, focused on the sector the user faces.
+
+        The faced sector (plus FOCUS_MARGIN on each side) is cropped out and detected at imgsz, so it
+        gets more pixels than in detect. The full frame is detected at periphery_imgsz for the hazard
+        classes every periphery_every frames, and the boxes it finds outside the faced sector are
+        reused in between.
+        :param img_rgb: RGB image as a numpy array (or a path to an image).
+        :param sector: the faced sector (an index into SECTORS), None detects the whole image like detect
+        :return: Dictionary of detected objects and their bounding boxes, in the same format as detect.
+        """
+        if sector is None or sector < 0:
+            self._focus = None
+            return self.detect(img_rgb)
+        if isinstance(img_rgb, str):
+            img_rgb = read_rgb(img_rgb)
+
+        start = time.perf_counter()
+        if sector != self._focus:
+            # the periphery boxes were picked for the previous sector, and the gate's reference was detected without this focus
+            self._focus = sector
+            self._periphery = None
+            if self._gate is not None:
+                self._gate.reset()
+        if self._skip(img_rgb, start):
+            return self._last_results
+
+        h, w = img_rgb.shape[:2]
+        bounds = (0.0, *SECTOR_BOUNDS, 1.0)
+        x0 = int(max(bounds[sector] - FOCUS_MARGIN, 0) * w)
+        x1 = int(min(bounds[sector + 1] + FOCUS_MARGIN, 1) * w)
+        crop = img_rgb[:, x0:x1]
+        refresh = self._periphery is None or self._periphery_age + 1 >= self._periphery_every
+
+        focus_input = self._letterbox(crop)
+        if refresh:
+            # at the same input size, the periphery gets the second buffer so it doesn't overwrite the focus
+            periphery_input = self._letterbox(img_rgb, int(self._periphery_imgsz == self._imgsz),
+                                              imgsz=self._periphery_imgsz)
+        preprocessed = time.perf_counter()
+        focus_result = self._model(focus_input, imgsz=self._imgsz, classes=None, verbose=False)[0]
+        if refresh:
+            periphery_result = self._model(periphery_input, imgsz=self._periphery_imgsz,
+                                           classes=self._periphery_class_ids, verbose=False)[0]
+        inferred = time.perf_counter()
+
+        xyxy, conf, cls = self._unletterbox(focus_result, crop.shape)
+        xyxy[:, 0::2] += x0
+        inside = box_sectors(xyxy, w) == sector
+        if refresh:
+            periphery = self._unletterbox(periphery_result, img_rgb.shape, self._periphery_imgsz)
+            outside = box_sectors(periphery[0], w) != sector
+            self._periphery = tuple(array[outside] for array in periphery)
+            self._periphery_age = 0
         else:
-            object_counts[obj] = 1
-    return object_counts
+            self._periphery_age += 1
+        periphery_xyxy, periphery_conf, periphery_cls = self._periphery
+        results_dict = self._postprocess(np.concatenate([xyxy[inside], periphery_xyxy]),
+                                         np.concatenate([conf[inside], periphery_conf]),
+                                         np.concatenate([cls[inside], periphery_cls]),
+                                         focus_result.names, img_rgb.shape, track=True)
+        self._last_results = results_dict
+        end = time.perf_counter()
+
+        self._timings = {
+            "preprocess": (preprocessed - start) * 1000,
+            "inference": (inferred - preprocessed) * 1000,
+            "postprocess": (end - inferred) * 1000,
+            "total": (end - start) * 1000
+        }
+        return results_dict
 
+    def detect_batch(self, frames: List[np.ndarray | str]) -> List[Dict[str, Dict[str, List|Dict]]]:
+        """
+        Perform object detection on several images with a single forward pass.
 
-def yolo_object_detection_v11(img_rgb: np.ndarray) -> Dict[str, Dict[str, List|Dict]]:
+        The timings are for the whole batch.
+        :param frames: list of RGB images as numpy arrays (or paths to images), they may have different sizes.
+        :return: list of dictionaries of detected objects and their bounding boxes, one per frame.
+        """
+        if len(frames) == 0:
+            return []
+        frames = [read_rgb(frame) if isinstance(frame, str) else frame for frame in frames]
+
+        start = time.perf_counter()
+        self._reserve(len(frames))
+        model_inputs = [self._letterbox(frame, i) for i, frame in enumerate(frames)]
+        preprocessed = time.perf_counter()
+        results = self._model(model_inputs, imgsz=self._imgsz, classes=None, verbose=False)
+        inferred = time.perf_counter()
+        results_dicts = [self._restore(result, frame) for result, frame in zip(results, frames)]
+        end = time.perf_counter()
+
+        self._timings = {
+            "preprocess": (preprocessed - start) * 1000,
+            "inference": (inferred - preprocessed) * 1000,
+            "postprocess": (end - inferred) * 1000,
+            "total": (end - start) * 1000
+        }
+        return results_dicts
+
+    @property
+    def hazards(self) -> np.ndarray:
+        """
+        The haptics intensity (0-255) of the left, forward and right directions in the last call to detect
+        """
+        return self._hazards
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """
+        The timings of the last call to detect, detect_focused or detect_batch in milliseconds
+        """
+        return self._timings
+
+    @property
+    def gate(self) -> FrameGate | None:
+        """
+        The gate of detect, see FrameGate.stats for its hit rate
+        """
+        return self._gate
+
+
+_DETECTOR = None
+
+
+def get_detector() -> Detector:
+    """
+    Returns the detector of the current process, loading it on the first call
+    """
+    global _DETECTOR
+    if _DETECTOR is None:
+        _DETECTOR = Detector()
+    return _DETECTOR
+
+
+def yolo_object_detection_v11(img_rgb: np.ndarray | str) -> Dict[str, Dict[str, List|Dict]]:
     """
     Perform object detection using YOLO11.
+
+    The model is only loaded once per process, see Detector.
     :param img_rgb: RGB image as a numpy array.
     :return: Dictionary of detected objects and their bounding boxes.
     """
-    # Load a pre-trained YOLO11 model (e.g., YOLO11n)
-    model = YOLO('yolo11x.pt')
-
-    # Perform inference on an image
-    results = model(img_rgb, verbose=False)
-    results_dict = filter_results(results)
-
-    return results_dict
+    return get_detector().detect(img_rgb)
 
 def object_description_generator(detected_objects:  Dict[str, int]) -> List[str]:
     """
@@ -103,6 +522,12 @@ if __name__ == "__main__":
     image_path = "chairs.jpg"  # Replace with your image path
     detected_objects = yolo_object_detection_v11(image_path)
     print("Detected objects:", detected_objects)
+    # Run batched inference on several images in one forward pass
+    detected_objects_batch = get_detector().detect_batch(["chairs.jpg", "hotdog.jpeg"])
+    print("Detected objects (batch):", detected_objects_batch)
+    # Detect the forward sector at full resolution, and only hazards on the left and right
+    detected_objects_focused = get_detector().detect_focused(image_path, SECTORS.index("forward"))
+    print("Detected objects (focused):", detected_objects_focused)
     object_descriptions = object_description_generator({"chair": "2", "table": "1"})
     print("Object descriptions:", object_descriptions)
 
@@ -0,0 +1,79 @@
+import os
+from ultralytics import YOLO
+
+# https://docs.ultralytics.com/models/yolo11/, from fastest (n) to most accurate (x)
+MODEL_TIERS = ("n", "s", "m", "x")
+# torch runs the .pt weights, onnx and onnx-int8 run an exported model with ONNX Runtime (CPU)
+BACKENDS = ("torch", "onnx", "onnx-int8")
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exports")
+
+
+def tier_weights(tier: str) -> str:
+    """
+    :param tier: one of MODEL_TIERS
+    :return: the weights of the YOLO11 model of that size
+    """
+    if tier not in MODEL_TIERS:
+        raise ValueError(f"Unknown model tier {tier}, expected one of {MODEL_TIERS}")
+    return f"yolo11{tier}.pt"
+
+
+def export_onnx(weights: str, export_dir: str = EXPORT_DIR, imgsz: int = 640) -> str:
+    """
+    Exports the weights to ONNX, unless an export is already cached in export_dir.
+
+    The export has dynamic axes, so it runs at any input size and batch size like the .pt weights.
+    :param weights: the path to the YOLO weights
+    :param export_dir: the directory exports are cached in
+    :param imgsz: the input size the model is traced at
+    :return: the path to the .onnx model
+    """
+    name = os.path.splitext(os.path.basename(weights))[0]
+    path = os.path.join(export_dir, f"{name}.onnx")
+    if not os.path.exists(path):
+        os.makedirs(export_dir, exist_ok=True)
+        exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        os.replace(exported, path)
+    return path
+
+
+def quantize_onnx(path: str) -> str:
+    """
+    Quantizes the weights of an ONNX model to INT8, unless the quantized model is already cached next to it.
+
+    Only the weights are quantized ahead of time, the activations are quantized on the fly, so no
+    calibration images are needed.
+    :param path: the path to the .onnx model
+    :return: the path to the quantized .onnx model
+    """
+    quantized = path.replace(".onnx", "-int8.onnx")
+    if not os.path.exists(quantized):
+        import onnx
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(path, quantized, weight_type=QuantType.QUInt8)
+        # ultralytics reads the class names, stride and input size from the metadata, which quantize_dynamic drops
+        model = onnx.load(quantized)
+        del model.metadata_props[:]
+        model.metadata_props.extend(onnx.load(path, load_external_data=False).metadata_props)
+        onnx.save(model, quantized)
+    return quantized
+
+
+def load_model(weights: str, backend: str = "torch", export_dir: str = EXPORT_DIR, imgsz: int = 640) -> YOLO:
+    """
+    Loads the weights on a backend, exporting them first if needed. Every backend returns the same
+    Results objects, so nothing downstream depends on the backend.
+    :param weights: the path to the YOLO .pt weights
+    :param backend: one of BACKENDS
+    :param export_dir: the directory exports are cached in
+    :param imgsz: the input size the ONNX export is traced at
+    :return: the model
+    """
+    if backend == "torch":
+        return YOLO(weights)
+    if backend == "onnx":
+        return YOLO(export_onnx(weights, export_dir, imgsz), task="detect")
+    if backend == "onnx-int8":
+        return YOLO(quantize_onnx(export_onnx(weights, export_dir, imgsz)), task="detect")
+    raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
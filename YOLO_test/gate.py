@@ -0,0 +1,156 @@
+import multiprocessing as mp
+import time
+from typing import Callable, Dict, Tuple
+import cv2
+import numpy as np
+
+CHANGE_THRESHOLD = 6.0  # mean absolute difference (0-255) to the last detected frame for the scene to count as changed
+BLUR_THRESHOLD = 60.0  # variance of the Laplacian below which a frame is too blurry to detect on
+MAX_STALENESS = 2.0  # seconds after which a frame is detected on whatever the gate says
+
+# the fields of the shared stats array, in order
+STATS_FIELDS = ("frames", "detected", "static", "blurry", "stale", "forced")
+
+
+class FrameGate:
+    """
+    Decides on a tiny grayscale copy of a frame whether it is worth running the detector on.
+
+    A frame is skipped when it barely differs from the last detected frame (the scene is static),
+    or when it is motion blurred, e.g. while the user turns their head. A frame is always detected
+    once the last detection is max_staleness seconds old, so the results never freeze, and whenever
+    the caller forces it, e.g. while a tracker is still confirming or dropping objects.
+
+    >>> gate = FrameGate(clock=lambda: 0.0)
+    >>> frame = np.random.default_rng(0).integers(0, 256, (360, 640, 3), dtype=np.uint8)
+    >>> gate.should_detect(frame), gate.reason
+    (True, 'detected')
+    >>> gate.should_detect(frame), gate.reason
+    (False, 'static')
+    >>> gate.should_detect(cv2.GaussianBlur(255 - frame, (31, 31), 10)), gate.reason
+    (False, 'blurry')
+    >>> gate.stats
+    {'frames': 3, 'detected': 1, 'static': 1, 'blurry': 1, 'stale': 0, 'forced': 0, 'hit_rate': 0.6666666666666666}
+    """
+    def __init__(self, size: Tuple[int, int] = (160, 90), change_threshold: float = CHANGE_THRESHOLD,
+                 blur_threshold: float = BLUR_THRESHOLD, max_staleness: float = MAX_STALENESS,
+                 stats: mp.Array = None, clock: Callable[[], float] = time.time):
+        """
+        :param size: the (w, h) the frames are downsampled to before comparing them
+        :param change_threshold: mean absolute difference (0-255) for the scene to count as changed
+        :param blur_threshold: variance of the Laplacian below which a frame counts as blurry
+        :param max_staleness: seconds after which a frame is detected anyway
+        :param stats: an array from shared_stats the stats are published in, for another process to read
+        :param clock: the clock the timestamps come from
+        """
+        self._size = size
+        self._change_threshold = change_threshold
+        self._blur_threshold = blur_threshold
+        self._max_staleness = max_staleness
+        self._stats = stats
+        self._clock = clock
+
+        self._tiny = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self._gray = np.empty((size[1], size[0]), dtype=np.uint8)
+        self._reference = None  # the gray copy of the last detected frame
+        self._detected_at = None
+        self._counts = dict.fromkeys(STATS_FIELDS, 0)
+        self._reason = None
+        self._change = 0.0
+        self._sharpness = 0.0
+
+    @staticmethod
+    def shared_stats() -> mp.Array:
+        """
+        :return: a shared array to pass to a FrameGate in a worker process, see read_stats
+        """
+        return mp.Array("d", len(STATS_FIELDS))
+
+    @staticmethod
+    def read_stats(stats: mp.Array) -> Dict[str, float]:
+        """
+        :param stats: an array from shared_stats
+        :return: the stats published in the array, with the fraction of frames skipped as hit_rate
+        """
+        with stats.get_lock():
+            counts = dict(zip(STATS_FIELDS, stats[:]))
+        counts["hit_rate"] = (counts["static"] + counts["blurry"]) / max(counts["frames"], 1)
+        return counts
+
+    def should_detect(self, img_rgb: np.ndarray, timestamp: float = None, force: bool = False) -> bool:
+        """
+        Scores the frame and decides whether to detect on it. A frame it returns True for becomes
+        the reference the next frames are compared to.
+        :param img_rgb: A (h, w, 3) array
+        :param timestamp: the capture time of the frame, defaults to now
+        :param force: detect on the frame whatever it looks like
+        :return: whether the detector should run on the frame
+        """
+        timestamp = self._clock() if timestamp is None else timestamp
+        cv2.resize(img_rgb, self._size, dst=self._tiny, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._tiny, cv2.COLOR_RGB2GRAY, dst=self._gray)
+
+        self._sharpness = cv2.Laplacian(self._gray, cv2.CV_32F).var()
+        if self._reference is None:
+            self._change = float("inf")
+            reason = "detected"
+        else:
+            self._change = cv2.absdiff(self._gray, self._reference).mean()
+            if force:
+                reason = "forced"
+            elif timestamp - self._detected_at >= self._max_staleness:
+                reason = "stale"
+            elif self._sharpness < self._blur_threshold:
+                reason = "blurry"
+            elif self._change < self._change_threshold:
+                reason = "static"
+            else:
+                reason = "detected"
+
+        detect = reason in ("detected", "stale", "forced")
+        if detect:
+            self._reference = self._gray.copy()
+            self._detected_at = timestamp
+            self._counts["detected"] += 1
+        if reason != "detected":
+            self._counts[reason] += 1
+        self._counts["frames"] += 1
+        self._reason = reason
+        self._publish()
+        return detect
+
+    def reset(self) -> None:
+        """
+        Forgets the reference frame, so the next frame is detected
+        """
+        self._reference = None
+        self._detected_at = None
+
+    def _publish(self) -> None:
+        if self._stats is None:
+            return
+        with self._stats.get_lock():
+            self._stats[:] = [self._counts[field] for field in STATS_FIELDS]
+
+    @property
+    def reason(self) -> str:
+        """
+        Why the last frame was detected or skipped: detected, stale, forced, static or blurry
+        """
+        return self._reason
+
+    @property
+    def scores(self) -> Dict[str, float]:
+        """
+        The change (mean absolute difference to the reference) and sharpness (variance of the Laplacian) of the last frame
+        """
+        return {"change": float(self._change), "sharpness": float(self._sharpness)}
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        The number of frames per outcome, and the fraction of frames skipped as hit_rate
+        """
+        stats = dict(self._counts)
+        stats["hit_rate"] = (stats["static"] + stats["blurry"]) / max(stats["frames"], 1)
+        return stats
@@ -0,0 +1,78 @@
+from typing import Dict
+import numpy as np
+
+# PWM (0-255) of a hazard right next to the user, per object name. Every other class is not a hazard
+HAZARD_CLASSES = {
+    "person": 200,
+    "sports ball": 50,
+}
+NEAR_DISTANCE = 36  # inches, hazards closer than this get their full intensity
+FAR_DISTANCE = 100  # inches, hazards further than this are ignored
+MIN_PROXIMITY = 0.25  # fraction of the intensity kept by a hazard at FAR_DISTANCE
+FULL_SIZE = 0.3  # sqrt of the fraction of the image a box has to cover to get its full intensity
+MIN_SIZE = 0.25  # fraction of the intensity kept by a tiny box
+
+
+class HazardScorer:
+    """
+    Scores how urgent the detections of a frame are with array operations, and reduces them to one
+    haptics intensity per direction (left, forward, right).
+
+    The intensity of a detection is the weight of its class, scaled down the further away and the
+    smaller it is. A direction gets the intensity of its most urgent detection.
+
+    >>> scorer = HazardScorer()
+    >>> xyxy = np.array([[100., 100., 300., 400.], [700., 300., 760., 360.]])
+    >>> scorer.score(xyxy, np.array([0, 32]), np.array([20., 80.]), np.array([0, 2]), {0: "person", 32: "sports ball"},
+    ...              width=800, height=600)
+    array([200,   0,   6])
+    """
+    def __init__(self, hazard_classes: Dict[str, int] = None, near_distance: float = NEAR_DISTANCE,
+                 far_distance: float = FAR_DISTANCE):
+        """
+        :param hazard_classes: PWM of a nearby hazard per object name
+        :param near_distance: hazards closer than this (in inches) get their full intensity
+        :param far_distance: hazards further than this (in inches) are ignored
+        """
+        self._hazard_classes = HAZARD_CLASSES if hazard_classes is None else hazard_classes
+        self._near_distance = near_distance
+        self._far_distance = far_distance
+        self._weights = None
+        self._weights_names = None
+
+    def _table(self, names: Dict[int, str]) -> np.ndarray:
+        """
+        The weight of every class id, built once per set of class names
+        """
+        if self._weights_names is not names:
+            weights = np.zeros(max(names, default=-1) + 1)
+            for class_id, name in names.items():
+                weights[class_id] = self._hazard_classes.get(name, 0)
+            self._weights = weights
+            self._weights_names = names
+        return self._weights
+
+    def score(self, xyxy: np.ndarray, cls: np.ndarray, distances: np.ndarray, sectors: np.ndarray,
+              names: Dict[int, str], width: float, height: float) -> np.ndarray:
+        """
+        :param xyxy: (n, 4) array of bounding boxes
+        :param cls: (n,) array of class ids
+        :param distances: (n,) array of ground plane distances in inches (see box_distances)
+        :param sectors: (n,) array of directions, 0 = left, 1 = forward, 2 = right
+        :param names: mapping of class id to object name
+        :param width: width of the image
+        :param height: height of the image
+        :return: (3,) array of PWM intensities for left, forward and right
+        """
+        weights = self._table(names)[cls.astype(np.int64)]
+
+        proximity = (self._far_distance - distances) / (self._far_distance - self._near_distance)
+        proximity = np.where(distances <= self._far_distance,
+                             MIN_PROXIMITY + (1 - MIN_PROXIMITY) * np.clip(proximity, 0, 1), 0)
+
+        area = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1]) / (width * height)
+        size = np.clip(np.sqrt(np.clip(area, 0, None)) / FULL_SIZE, MIN_SIZE, 1)
+
+        intensities = np.zeros(3)
+        np.maximum.at(intensities, sectors.astype(np.int64), weights * proximity * size)
+        return np.clip(intensities, 0, 255).astype(np.int64)
@@ -0,0 +1,168 @@
+from typing import Tuple
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# SORT: https://arxiv.org/abs/1602.00763
+# The state of a track is [x_center, y_center, area, aspect ratio, vx, vy, v_area] with a constant velocity model
+_F = np.eye(7)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1
+_H = np.eye(4, 7)
+_Q = np.diag([1, 1, 1, 1, 0.01, 0.01, 0.0001])
+_R = np.diag([1, 1, 10, 10])
+_P0 = np.diag([10, 10, 10, 10, 10000, 10000, 10000])
+
+
+def xyxy_to_z(xyxy: np.ndarray) -> np.ndarray:
+    """
+    Converts (n, 4) boxes to (n, 4) measurements [x_center, y_center, area, aspect ratio]
+    """
+    w = xyxy[:, 2] - xyxy[:, 0]
+    h = xyxy[:, 3] - xyxy[:, 1]
+    return np.stack([xyxy[:, 0] + w / 2, xyxy[:, 1] + h / 2, w * h, w / np.maximum(h, 1e-6)], axis=1)
+
+
+def z_to_xyxy(z: np.ndarray) -> np.ndarray:
+    """
+    Converts (n, >=4) states or measurements back to (n, 4) boxes
+    """
+    w = np.sqrt(np.maximum(z[:, 2] * z[:, 3], 0))
+    h = z[:, 2] / np.maximum(w, 1e-6)
+    return np.stack([z[:, 0] - w / 2, z[:, 1] - h / 2, z[:, 0] + w / 2, z[:, 1] + h / 2], axis=1)
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoU between (n, 4) and (m, 4) boxes
+    :return: a (n, m) array
+    """
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+class ObjectTracker:
+    """
+    A lightweight SORT tracker (IoU matching + Kalman filter) that gives detections persistent ids.
+
+    A track is only reported once it was matched in min_hits frames, and it keeps being reported
+    for up to max_age frames without a match, so a detection flickering for a frame neither adds
+    nor removes an object. All tracks are filtered together with array operations.
+
+    >>> tracker = ObjectTracker(min_hits=2, max_age=1)
+    >>> box = np.array([[10., 10., 50., 90.]])
+    >>> tracker.update(box, np.array([.9]), np.array([0]))[3]
+    array([], dtype=int64)
+    >>> tracker.update(box, np.array([.9]), np.array([0]))[3]
+    array([0])
+    >>> tracker.update(np.zeros((0, 4)), np.zeros(0), np.zeros(0))[3]  # missed one frame, still reported
+    array([0])
+    """
+    def __init__(self, min_hits: int = 3, max_age: int = 5, iou_threshold: float = 0.3):
+        """
+        :param min_hits: number of frames a track has to be matched in before it is reported (confirm window)
+        :param max_age: number of frames a track is kept (and reported) without a match (lost-frame window)
+        :param iou_threshold: minimum IoU between a detection and a track to match them
+        """
+        self._min_hits = min_hits
+        self._max_age = max_age
+        self._iou_threshold = iou_threshold
+        self._next_id = 0
+
+        self._x = np.zeros((0, 7))
+        self._p = np.zeros((0, 7, 7))
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._cls = np.zeros(0, dtype=np.int64)
+        self._conf = np.zeros(0)
+        self._hits = np.zeros(0, dtype=np.int64)
+        self._misses = np.zeros(0, dtype=np.int64)
+
+    def _predict(self) -> None:
+        # keep the area positive
+        shrinking = self._x[:, 2] + self._x[:, 6] <= 0
+        self._x[shrinking, 6] = 0
+        self._x = self._x @ _F.T
+        self._p = _F @ self._p @ _F.T + _Q
+
+    def _correct(self, tracks: np.ndarray, z: np.ndarray) -> None:
+        x = self._x[tracks]
+        p = self._p[tracks]
+        y = z - x @ _H.T
+        s = _H @ p @ _H.T + _R
+        k = p @ _H.T @ np.linalg.inv(s)
+        self._x[tracks] = x + np.einsum("nij,nj->ni", k, y)
+        self._p[tracks] = (np.eye(7) - k @ _H) @ p
+
+    def _match(self, xyxy: np.ndarray, cls: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the matched (detection, track) index pairs
+        """
+        if len(xyxy) == 0 or len(self._x) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        iou = iou_matrix(xyxy, z_to_xyxy(self._x))
+        iou[cls[:, None] != self._cls[None, :]] = 0  # never match across classes
+        detections, tracks = linear_sum_assignment(-iou)
+        matched = iou[detections, tracks] >= self._iou_threshold
+        return detections[matched], tracks[matched]
+
+    def update(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray
+               ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Updates the tracks with the detections of a new frame
+        :param xyxy: (n, 4) array of bounding boxes
+        :param conf: (n,) array of confidences
+        :param cls: (n,) array of class ids
+        :return: the xyxy, conf, cls and track ids of the confirmed tracks
+        """
+        cls = cls.astype(np.int64)
+        self._predict()
+        detections, tracks = self._match(xyxy, cls)
+
+        self._misses += 1
+        if len(tracks) > 0:
+            self._correct(tracks, xyxy_to_z(xyxy[detections]))
+            self._conf[tracks] = conf[detections]
+            self._hits[tracks] += 1
+            self._misses[tracks] = 0
+
+        # start a track for every unmatched detection
+        new = np.setdiff1d(np.arange(len(xyxy)), detections)
+        if len(new) > 0:
+            x = np.zeros((len(new), 7))
+            x[:, :4] = xyxy_to_z(xyxy[new])
+            self._x = np.concatenate([self._x, x])
+            self._p = np.concatenate([self._p, np.broadcast_to(_P0, (len(new), 7, 7))])
+            self._ids = np.concatenate([self._ids, np.arange(self._next_id, self._next_id + len(new))])
+            self._cls = np.concatenate([self._cls, cls[new]])
+            self._conf = np.concatenate([self._conf, conf[new]])
+            self._hits = np.concatenate([self._hits, np.ones(len(new), dtype=np.int64)])
+            self._misses = np.concatenate([self._misses, np.zeros(len(new), dtype=np.int64)])
+            self._next_id += len(new)
+
+        # drop the tracks that were lost for too long
+        alive = self._misses <= self._max_age
+        self._x, self._p, self._ids = self._x[alive], self._p[alive], self._ids[alive]
+        self._cls, self._conf = self._cls[alive], self._conf[alive]
+        self._hits, self._misses = self._hits[alive], self._misses[alive]
+
+        confirmed = self._hits >= self._min_hits
+        return z_to_xyxy(self._x[confirmed]), self._conf[confirmed], self._cls[confirmed], self._ids[confirmed]
+
+    @property
+    def settled(self) -> bool:
+        """
+        Whether every track is confirmed and was matched in the last update. Until then, the frames
+        that are not passed to update delay confirming a new object or dropping one that left
+        """
+        return bool(np.all(self._hits >= self._min_hits) and np.all(self._misses == 0))
+
+    def reset(self) -> None:
+        """
+        Drops all tracks
+        """
+        self.__init__(self._min_hits, self._max_age, self._iou_threshold)
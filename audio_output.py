@@ -1,5 +1,17 @@
 import pyttsx3 
-from typing import List
+import heapq
+import hashlib
+import multiprocessing as mp
+import os
+import queue
+import tempfile
+import time
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
+from collections import OrderedDict
+from enum import IntEnum
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 def text_to_speech(text: str | List[str], voice_id=None) -> None:
     """
@@ -24,6 +36,373 @@ def text_to_speech(text: str | List[str], voice_id=None) -> None:
     engine.runAndWait()
     engine.stop()
 
+
+# phrases spoken often enough that they are rendered as soon as the speech process starts
+COMMON_PHRASES = [
+    "No objects detected.",
+    "No changes detected.",
+    "Sorry I don't understand your query. Can you please try again?",
+]
+
+
+# seconds a phrase gets to render, a driver that never reports the end of the render would block speech
+RENDER_TIMEOUT = 10.0
+
+
+class PhraseCache:
+    """
+    An LRU cache of rendered phrases (text -> PCM samples), so recurring announcements are played
+    back directly instead of being synthesized again. Phrases are rendered with the engine's
+    save_to_file, and optionally persisted in cache_dir across runs.
+    """
+    def __init__(self, max_entries: int = 64, cache_dir: str = None, voice_id=None, max_phrase_chars: int = 80):
+        """
+        :param max_entries: the least recently played phrase is evicted past this size
+        :param cache_dir: directory the rendered phrases are kept in, None keeps them in memory only
+        :param voice_id: the voice the phrases are rendered with, part of the file names
+        :param max_phrase_chars: longer texts are never cached
+        """
+        self._entries = OrderedDict()  # text -> (pcm, sample rate)
+        self._max_entries = max_entries
+        self._cache_dir = cache_dir
+        self._render_dir = cache_dir if cache_dir is not None else tempfile.mkdtemp(prefix="phrases")
+        self._voice_id = voice_id
+        self._max_phrase_chars = max_phrase_chars
+        self._seen = {}  # text -> number of times it was requested
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(self._render_dir, exist_ok=True)
+
+    def render_path(self, text: str) -> str:
+        """
+        :return: the file the engine should render the phrase into
+        """
+        digest = hashlib.sha1(f"{self._voice_id}:{text}".encode("utf-8")).hexdigest()
+        return os.path.join(self._render_dir, f"{digest}.wav")
+
+    def get(self, text: str) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        :param text: the phrase
+        :return: the (pcm, sample rate) of the phrase, or None if it was never rendered
+        """
+        self._seen[text] = self._seen.get(text, 0) + 1
+        if text not in self._entries and self._cache_dir is not None and os.path.exists(self.render_path(text)):
+            self.load(text)
+        if text not in self._entries:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(text)
+        return self._entries[text]
+
+    def should_render(self, text: str) -> bool:
+        """
+        Whether a phrase that missed the cache is worth rendering: it is short and it recurs
+        """
+        return len(text) <= self._max_phrase_chars and self._seen.get(text, 0) >= 2 and text not in self._entries
+
+    def load(self, text: str) -> None:
+        """
+        Reads a rendered phrase into memory
+        :param text: the phrase, rendered into render_path(text)
+        :return: None
+        """
+        path = self.render_path(text)
+        if not os.path.exists(path):  # the engine failed to render it
+            return
+        pcm, sample_rate = sf.read(path, dtype="int16")
+        if self._cache_dir is None:
+            os.remove(path)
+        if len(pcm) == 0:
+            return
+        self._entries[text] = (pcm, sample_rate)
+        self._entries.move_to_end(text)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self._hits, "misses": self._misses, "size": len(self._entries)}
+
+
+class SPEECH_PRIORITY(IntEnum):
+    # lower is more urgent
+    USER_ANSWER = 0
+    HAZARD = 1
+    SCENE = 2
+
+
+class SpeechRequest(NamedTuple):
+    priority: int
+    text: str
+    key: Optional[str]  # a newer request with the same key supersedes this one
+    preempt: bool  # whether this request may interrupt a less urgent utterance
+    submitted_at: float
+
+
+def speech_process(requests: mp.Queue, queue_depth: mp.Value, first_audio_ms: mp.Value, started: mp.Queue,
+                   voice_id=None, phrase_cache_dir: str = None) -> None:
+    """
+    This function is run on a separate process forked from the main process
+
+    The engine is initialized once, then the requests are spoken in priority order.
+    A more urgent request interrupts the current utterance, and a request with the same key as a
+    queued or playing one replaces it. Recurring short phrases are rendered once and played back
+    from the PhraseCache, while there is nothing to say: a hazard or an answer stops the render.
+    :param requests: the queue of SpeechRequests, None stops the process
+    :param queue_depth: updated with the number of requests waiting to be spoken
+    :param first_audio_ms: updated with the time from submitting a request to its audio starting
+    :param started: gets (request, time its audio started) for every request that started playing
+    :param voice_id: index of the voice to use, see text_to_speech
+    :param phrase_cache_dir: directory the rendered phrases are persisted in, None keeps them in memory only
+    :return:
+    """
+    engine = pyttsx3.init()
+    if voice_id:
+        engine.setProperty('voice', engine.getProperty('voices')[voice_id].id)
+
+    phrases = PhraseCache(cache_dir=phrase_cache_dir, voice_id=voice_id)
+    to_render = [phrase for phrase in COMMON_PHRASES if phrases.get(phrase) is None]
+    for phrase in to_render:
+        engine.save_to_file(phrase, phrases.render_path(phrase))
+    if to_render:
+        engine.runAndWait()
+        for phrase in to_render:
+            phrases.load(phrase)
+
+    pending = []  # heap of (priority, order, request)
+    order = 0
+    current = None
+    current_name = None
+    playing_until = None  # end of the cached phrase being played back, None when the engine is speaking
+    rendering = None  # the phrase being rendered into the cache
+    render_deadline = None
+    render_queue = []
+    render_failed = set()  # phrases that timed out, not rendered again
+
+    # an interrupted utterance reports its end late, the names tell it apart from the current one
+    def on_start(name):
+        if current is not None and name == current_name:
+            first_audio_ms.value = (time.time() - current.submitted_at) * 1000
+            started.put((current, time.time()))
+
+    def on_finish(name, completed):
+        nonlocal current, rendering
+        if rendering is not None and name == f"render:{rendering}":
+            phrases.load(rendering)
+            rendering = None
+        elif name == current_name:
+            current = None
+
+    def discard_render(retry=True):
+        # the stopped render may have left a truncated file behind. On a retry, the phrase is rendered again
+        # once speech is idle
+        nonlocal rendering
+        try:
+            os.remove(phrases.render_path(rendering))
+        except OSError:
+            pass
+        if retry:
+            render_queue.append(rendering)
+        rendering = None
+
+    engine.connect('started-utterance', on_start)
+    engine.connect('finished-utterance', on_finish)
+    # drive the engine ourselves so we can keep reading requests while it speaks
+    engine.startLoop(False)
+
+    running = True
+    while running:
+        try:
+            # block while idle, while speaking just give the engine a moment before iterating again
+            idle = current is None and rendering is None and not pending and not render_queue
+            request = requests.get(timeout=None if idle else 0.01)
+        except queue.Empty:
+            request = False
+
+        if playing_until is not None and time.time() >= playing_until:
+            current = None
+            playing_until = None
+
+        while request is not False:
+            if request is None:
+                running = False
+                break
+            if request.key is not None:
+                pending = [entry for entry in pending if entry[2].key != request.key]
+                heapq.heapify(pending)
+            heapq.heappush(pending, (request.priority, order, request))
+            order += 1
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                request = False
+
+        if current is not None and pending:
+            newest = pending[0][2]
+            stale = current.key is not None and any(entry[2].key == current.key for entry in pending)
+            if stale or (newest.preempt and newest.priority < current.priority):
+                if playing_until is not None:
+                    sd.stop()
+                    playing_until = None
+                else:
+                    engine.stop()
+                current = None
+
+        if rendering is not None and time.time() >= render_deadline:
+            print(f"Rendering the phrase {rendering!r} did not finish in {RENDER_TIMEOUT} s, it is not cached")
+            engine.stop()
+            render_failed.add(rendering)
+            discard_render(retry=False)
+        elif rendering is not None and pending and pending[0][2].preempt and \
+                pending[0][2].priority < SPEECH_PRIORITY.SCENE:
+            # a phrase is only rendered while there is nothing to say, an urgent request doesn't wait for it
+            engine.stop()
+            discard_render()
+
+        if current is None and rendering is None and pending:
+            _, current_order, current = heapq.heappop(pending)
+            current_name = str(current_order)
+            cached = phrases.get(current.text)
+            if cached is not None:
+                pcm, sample_rate = cached
+                sd.play(pcm, sample_rate)
+                playing_until = time.time() + len(pcm) / sample_rate
+                first_audio_ms.value = (time.time() - current.submitted_at) * 1000
+                started.put((current, time.time()))
+            else:
+                engine.say(current.text, current_name)
+                if phrases.should_render(current.text) and current.text not in render_queue and \
+                        current.text not in render_failed:
+                    render_queue.append(current.text)
+        elif current is None and rendering is None and render_queue:
+            # nothing to say, render the recurring phrases for next time
+            rendering = render_queue.pop(0)
+            render_deadline = time.time() + RENDER_TIMEOUT
+            engine.save_to_file(rendering, phrases.render_path(rendering), f"render:{rendering}")
+        queue_depth.value = len(pending)
+
+        engine.iterate()
+
+    engine.endLoop()
+
+
+class SpeechWorker:
+    """
+    Speaks on a dedicated process so the caller never blocks on speech.
+
+    >>> speech = SpeechWorker()  # doctest: +SKIP
+    >>> speech.start()  # doctest: +SKIP
+    >>> speech.say("There is a chair in front of you.", SPEECH_PRIORITY.SCENE, key="scene")  # doctest: +SKIP
+    """
+    def __init__(self, voice_id=None, phrase_cache_dir: str = None):
+        """
+        :param voice_id: index of the voice to use, see text_to_speech
+        :param phrase_cache_dir: directory the rendered phrases are persisted in, None keeps them in memory only
+        """
+        self._requests = mp.Queue()
+        self._queue_depth = mp.Value('i', 0)
+        self._first_audio_ms = mp.Value('d', 0.0)
+        self._started = mp.Queue()
+        self._process = mp.Process(target=speech_process, daemon=True,
+                                   args=(self._requests, self._queue_depth, self._first_audio_ms, self._started,
+                                         voice_id, phrase_cache_dir))
+
+    def start(self) -> None:
+        self._process.start()
+
+    def say(self, text: str | List[str], priority: SPEECH_PRIORITY = SPEECH_PRIORITY.SCENE, key: str = None,
+            preempt: bool = True) -> SpeechRequest:
+        """
+        Queues an utterance
+        :param text: text to be spoken
+        :param priority: more urgent utterances are spoken first
+        :param key: a newer utterance with the same key replaces this one if it is still queued or playing
+        :param preempt: whether this utterance may interrupt a less urgent one
+        :return: the request queued, see started
+        """
+        if isinstance(text, list):
+            text = " ".join(text)
+        request = SpeechRequest(int(priority), text, key, preempt, time.time())
+        self._requests.put(request)
+        return request
+
+    def started(self) -> List[Tuple[SpeechRequest, float]]:
+        """
+        The utterances whose audio started since the last call, never blocks.
+        An utterance replaced or interrupted before it started never shows up
+        :return: (the request returned by say, the time its audio started) in the order they started
+        """
+        started = []
+        while True:
+            try:
+                started.append(self._started.get_nowait())
+            except queue.Empty:
+                return started
+
+    def stop(self) -> None:
+        self._requests.put(None)
+        self._process.join(timeout=1)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        The number of utterances waiting to be spoken
+        """
+        return self._queue_depth.value
+
+    @property
+    def time_to_first_audio(self) -> float:
+        """
+        The time from queueing the last utterance to its audio starting, in milliseconds
+        """
+        return self._first_audio_ms.value
+
+class NullSpeechWorker:
+    """
+    A stand-in for SpeechWorker that speaks nothing and only records what it was asked to say,
+    for running the pipeline without audio (e.g. in benchmark.py). Its audio "starts" immediately.
+
+    >>> speech = NullSpeechWorker()
+    >>> request = speech.say(["There is", "a cup."], SPEECH_PRIORITY.SCENE, key="scene")
+    >>> request.text, request.key
+    ('There is a cup.', 'scene')
+    >>> [request.text for request in speech.spoken]
+    ['There is a cup.']
+    """
+    def __init__(self):
+        self.spoken = []
+        self._started = []
+
+    def start(self) -> None:
+        pass
+
+    def say(self, text: str | List[str], priority: SPEECH_PRIORITY = SPEECH_PRIORITY.SCENE, key: str = None,
+            preempt: bool = True) -> SpeechRequest:
+        if isinstance(text, list):
+            text = " ".join(text)
+        request = SpeechRequest(int(priority), text, key, preempt, time.time())
+        self.spoken.append(request)
+        self._started.append((request, request.submitted_at))
+        return request
+
+    def started(self) -> List[Tuple[SpeechRequest, float]]:
+        started, self._started = self._started, []
+        return started
+
+    def stop(self) -> None:
+        pass
+
+    @property
+    def queue_depth(self) -> int:
+        return 0
+
+    @property
+    def time_to_first_audio(self) -> float:
+        return 0.0
+
 # text_to_speech("tôi muốn ăn", 73)
 # text_to_speech("Hello, how are you?",  108)
 # text_to_speech("Hello, how are you?", 14)
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List
+import cv2
+import numpy as np
+import speech_recognition as sr
+import face_tracker.tracking
+import main
+from audio_output import NullSpeechWorker
+from gemini_api import FakeGeminiClient
+from recording import FrameRecorder
+from YOLO_test.YOLO import Detector
+from transcription.speech_to_text import SpeechToText, StreamingRecognizer
+
+# the stages of an announcement, in pipeline order
+STAGES = ("capture", "detection", "ipc", "diffing", "llm", "speech", "end_to_end")
+PERCENTILES = (50, 95, 99)
+# the scene changes between these images in a synthetic recording
+SYNTHETIC_IMAGES = ("YOLO_test/chairs.jpg", "table.jpeg", "YOLO_test/hotdog.jpeg")
+
+
+class LatencyTrace:
+    """
+    Collects the latency samples of each stage, pass it to main as the trace.
+
+    >>> trace = LatencyTrace()
+    >>> for ms in (10, 20, 30, 40):
+    ...     trace("llm", ms)
+    >>> trace.summary()["llm"]
+    {'count': 4, 'mean': 25.0, 'p50': 25.0, 'p95': 38.5, 'p99': 39.7, 'max': 40.0}
+    """
+    def __init__(self):
+        self._samples = {stage: [] for stage in STAGES}
+
+    def __call__(self, stage: str, ms: float) -> None:
+        self._samples.setdefault(stage, []).append(float(ms))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: the count, mean, percentiles and max of each stage in milliseconds
+        """
+        summary = {}
+        for stage, samples in self._samples.items():
+            samples = np.array(samples)
+            stats = {"count": len(samples)}
+            if len(samples) > 0:
+                stats["mean"] = round(float(samples.mean()), 3)
+                for percentile in PERCENTILES:
+                    stats[f"p{percentile}"] = round(float(np.percentile(samples, percentile)), 3)
+                stats["max"] = round(float(samples.max()), 3)
+            summary[stage] = stats
+        return summary
+
+
+def synthetic_recording(path: str, seconds: float = 20.0, fps: float = 10.0, change_every: float = 4.0,
+                        shape: tuple = (360, 640)) -> str:
+    """
+    Writes a scene recording that cycles through SYNTHETIC_IMAGES, so the scene changes every change_every seconds
+    :param path: the directory of the recording
+    :param seconds: the length of the recording
+    :param fps: the frame rate of the recording
+    :param change_every: seconds between scene changes
+    :param shape: the (h, w) of the frames
+    :return: the path
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    images = [cv2.resize(cv2.imread(os.path.join(root, image)), shape[::-1]) for image in SYNTHETIC_IMAGES]
+    recorder = FrameRecorder(path, "scene")
+    start = time.time()
+    for i in range(int(seconds * fps)):
+        timestamp = i / fps
+        recorder.write(images[int(timestamp // change_every) % len(images)], start + timestamp)
+    recorder.close()
+    return path
+
+
+def git_version() -> str | None:
+    """
+    :return: the commit the benchmark ran on, to compare results between versions
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(recording: str = None, realtime: bool = True, llm_latency: float = 0.8, duration: float = None,
+        seconds: float = 20.0, make_detector: Callable[..., Detector] = main.scene_detector) -> Dict:
+    """
+    Runs main on a replayed recording with a fake Gemini client and a silent speech sink
+    :param recording: the directory of a recording (see recording), None replays a synthetic scene looking forward
+    :param realtime: replay at the recorded pace, or as fast as the pipeline reads
+    :param llm_latency: seconds each fake Gemini request takes
+    :param duration: seconds to run for at most, None runs until the recording ends
+    :param seconds: the length of the synthetic recording
+    :param make_detector: loads the detector of the scene worker, see main.scene_detector
+    :return: the results
+    """
+    face_direction = None
+    if recording is None:
+        recording = synthetic_recording(tempfile.mkdtemp(prefix="benchmark"), seconds)
+        # a synthetic recording has no user camera, the user faces the whole scene
+        face_direction = face_tracker.tracking.FACE_DIRECTION.FORWARD
+
+    trace = LatencyTrace()
+    speech = NullSpeechWorker()
+    client = FakeGeminiClient(lambda contents: "The scene in front of you changed.", latency=llm_latency)
+    started_at = time.time()
+    main.main(replay_dir=recording, replay_realtime=realtime, gemini_client=client, speech=speech,
+              use_haptics=False, interactive=False, face_direction=face_direction, duration=duration, trace=trace,
+              metrics_port=None, make_detector=make_detector)
+
+    return {
+        "version": git_version(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"recording": recording, "realtime": realtime, "llm_latency": llm_latency,
+                   "detector_tier": main.detector_tier, "detector_backend": main.detector_backend,
+                   "frames_per_sec": main.frames_per_sec},
+        "wall_time": round(time.time() - started_at, 3),
+        "announcements": len(speech.spoken),
+        "gemini_requests": client.requests,
+        "stages": trace.summary(),
+    }
+
+
+def transcription_latency(wav: str = "transcription/test.wav", model: str = "base", realtime: bool = True,
+                          pause_threshold: float = 0.8, partial_every: float = 0.5) -> Dict:
+    """
+    Replays a WAV file as a live microphone into a StreamingRecognizer, and times every hypothesis
+    against the audio it was decoded from
+    :param wav: the path to the WAV file, relative to the repository
+    :param model: the whisper model
+    :param realtime: feed the chunks at the pace they would be spoken, or as fast as they are decoded
+    :param pause_threshold: seconds of silence that end an utterance
+    :param partial_every: seconds of speech between two partial hypotheses
+    :return: the hypotheses, and per utterance the delay of the final one after the end of the speech, and of
+     the first stable partial with the same text
+    """
+    stt = SpeechToText(model, compute_type=main.whisper_compute_type, cpu_threads=main.whisper_cpu_threads,
+                       beam_size=main.whisper_beam_size)
+    hypotheses = []
+    with sr.AudioFile(os.path.join(os.path.dirname(os.path.abspath(__file__)), wav)) as source:
+        recognizer = sr.Recognizer()
+        recognizer.adjust_for_ambient_noise(source, duration=0.5)
+        stream = StreamingRecognizer(stt, source.SAMPLE_RATE, source.SAMPLE_WIDTH, recognizer.energy_threshold,
+                                     pause_threshold, partial_every)
+        bytes_per_second = source.SAMPLE_RATE * source.SAMPLE_WIDTH
+        chunks = list(iter(lambda: source.stream.read(source.CHUNK), b""))
+        # silence after the file, in case it ends while someone is still talking
+        silence = bytes(source.CHUNK * source.SAMPLE_WIDTH)
+        chunks += [silence] * int(2 * pause_threshold * source.SAMPLE_RATE / source.CHUNK)
+
+    started_at = time.perf_counter()
+    heard = 0.0
+    for chunk in chunks:
+        heard += len(chunk) / bytes_per_second
+        if realtime:
+            # a live chunk can't be read before it was spoken
+            time.sleep(max(0.0, started_at + heard - time.perf_counter()))
+        for hypothesis in stream.feed(chunk):
+            hypotheses.append({**hypothesis._asdict(), "heard": round(heard, 3),
+                               "at": round(time.perf_counter() - started_at, 3),
+                               "decode_ms": round(stt.timings["decode"], 1)})
+
+    utterances = []
+    partials = []
+    for hypothesis in hypotheses:
+        if not hypothesis["final"]:
+            partials.append(hypothesis)
+            continue
+        # the final hypothesis comes after pause_threshold seconds of silence
+        speech_ended_at = hypothesis["heard"] - pause_threshold
+        matching = [partial for partial in partials if partial["stable"] and partial["text"] == hypothesis["text"]]
+        utterances.append({
+            "text": hypothesis["text"],
+            "partials": len(partials),
+            "final_after_speech": round(hypothesis["at"] - speech_ended_at, 3),
+            "stable_partial_after_speech": round(matching[0]["at"] - speech_ended_at, 3) if matching else None,
+        })
+        partials = []
+    return {
+        "version": git_version(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"wav": wav, "model": model, "realtime": realtime, "pause_threshold": pause_threshold,
+                   "partial_every": partial_every, "compute_type": main.whisper_compute_type,
+                   "cpu_threads": main.whisper_cpu_threads, "beam_size": main.whisper_beam_size},
+        "utterances": utterances,
+        "hypotheses": hypotheses,
+    }
+
+
+def print_transcription(results: Dict) -> None:
+    for utterance in results["utterances"]:
+        partial = utterance["stable_partial_after_speech"]
+        partial = "none" if partial is None else f"{partial * 1000:.0f} ms"
+        print(f"final {utterance['final_after_speech'] * 1000:.0f} ms, stable partial {partial} after the speech "
+              f"ended: {utterance['text']}")
+
+
+def print_table(results: Dict) -> None:
+    columns = ["count", "mean"] + [f"p{percentile}" for percentile in PERCENTILES] + ["max"]
+    print(f"{'stage':<12}" + "".join(f"{column:>10}" for column in columns))
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<12}" + "".join(f"{stats.get(column, float('nan')):>10.1f}" for column in columns))
+
+
+def parse_args(args: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="End to end latency of the announcements, from a scene "
+                                                 "capture to the start of its announcement")
+    parser.add_argument("--recording", help="directory of a recording to replay, a synthetic scene by default")
+    parser.add_argument("--fast", action="store_true", help="replay as fast as possible instead of in real time")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="seconds each fake Gemini request takes")
+    parser.add_argument("--duration", type=float, help="seconds to run for at most")
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of the synthetic recording")
+    parser.add_argument("--transcription", metavar="WAV", nargs="?", const="transcription/test.wav",
+                        help="time the streaming transcription of a WAV file replayed as a live mic instead")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the results")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    if arguments.transcription is not None:
+        results = transcription_latency(arguments.transcription, realtime=not arguments.fast)
+        print_transcription(results)
+    else:
+        results = run(arguments.recording, not arguments.fast, arguments.llm_latency, arguments.duration,
+                      arguments.seconds)
+        print_table(results)
+    with open(arguments.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {arguments.output}")
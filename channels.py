@@ -0,0 +1,153 @@
+import multiprocessing as mp
+import pickle
+import time
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+
+class Message(NamedTuple):
+    seq: int
+    timestamp: float
+    data: Any
+
+
+class LatestChannel:
+    """
+    A "latest value wins" channel between processes.
+
+    The producer overwrites the current value instead of queueing it, so a slow consumer always
+    reads the newest state. Every value the consumer never got to read is counted as dropped.
+
+    >>> channel = LatestChannel("user")
+    >>> channel.put("left", timestamp=1.0)
+    >>> channel.put("right", timestamp=2.0)
+    >>> channel.get()
+    Message(seq=1, timestamp=2.0, data='right')
+    >>> channel.get() is None
+    True
+    >>> channel.dropped
+    1
+    """
+    def __init__(self, name: str, capacity: int = 1 << 16, notify: mp.Event = None):
+        """
+        :param name: the name of the channel
+        :param capacity: the maximum size of a pickled value in bytes
+        :param notify: an event set every time a value is put, shared by the channels of a ChannelSet
+        """
+        self._name = name
+        self._capacity = capacity
+        self._notify = notify
+        self._lock = mp.Lock()
+        self._buffer = mp.RawArray("c", capacity)
+        self._length = mp.RawValue("q", 0)
+        self._seq = mp.RawValue("q", -1)  # seq of the value in the buffer
+        self._read_seq = mp.RawValue("q", -1)  # seq of the last value the consumer read
+        self._timestamp = mp.RawValue("d", 0.0)
+        self._dropped = mp.RawValue("q", 0)
+
+    def put(self, data: Any, timestamp: float = None) -> None:
+        """
+        Overwrites the value of the channel
+        :param data: any picklable value
+        :param timestamp: the capture time of the value, defaults to now
+        :return: None
+        """
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self._capacity:
+            raise ValueError(f"The value for channel {self._name} is {len(payload)} bytes, "
+                             f"the capacity is {self._capacity}")
+
+        with self._lock:
+            if self._seq.value > self._read_seq.value:
+                self._dropped.value += 1
+            self._buffer[:len(payload)] = payload
+            self._length.value = len(payload)
+            self._seq.value += 1
+            self._timestamp.value = time.time() if timestamp is None else timestamp
+
+        if self._notify is not None:
+            self._notify.set()
+
+    def get(self) -> Optional[Message]:
+        """
+        Reads the newest value if it has not been read yet
+        :return: the newest message, or None if there is nothing new
+        """
+        with self._lock:
+            if self._seq.value == self._read_seq.value:
+                return None
+            payload = self._buffer[:self._length.value]
+            seq = self._seq.value
+            timestamp = self._timestamp.value
+            self._read_seq.value = seq
+        return Message(seq, timestamp, pickle.loads(payload))
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def dropped(self) -> int:
+        """
+        The number of values overwritten before the consumer read them
+        """
+        return self._dropped.value
+
+
+class ChannelSet:
+    """
+    A group of LatestChannels sharing one wake-up event, so a consumer can block until any of
+    them has a new value.
+
+    >>> channels = ChannelSet(["scene", "user", "whisper"])
+    >>> channels["user"].put("left")
+    >>> channels.wait(timeout=1)
+    True
+    >>> {name: message.data for name, message in channels.poll().items()}
+    {'user': 'left'}
+    """
+    def __init__(self, names: Iterable[str], capacity: int = 1 << 16):
+        """
+        :param names: the names of the channels, one per producer
+        :param capacity: the maximum size of a pickled value in bytes
+        """
+        self._event = mp.Event()
+        self._channels = {name: LatestChannel(name, capacity, self._event) for name in names}
+
+    def __getitem__(self, name: str) -> LatestChannel:
+        return self._channels[name]
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until any channel has a new value
+        :param timeout: the maximum time to wait in seconds
+        :return: False if the timeout expired
+        """
+        woken = self._event.wait(timeout)
+        # clear before polling, a put racing with the poll will just wake us up again
+        self._event.clear()
+        return woken
+
+    def wake(self) -> None:
+        """
+        Wakes up a consumer blocked in wait, e.g. when a background request finished
+        """
+        self._event.set()
+
+    def poll(self) -> Dict[str, Message]:
+        """
+        Reads the newest value of each channel
+        :return: a dict of channel name to message, for the channels that have something new
+        """
+        updates = {}
+        for name, channel in self._channels.items():
+            message = channel.get()
+            if message is not None:
+                updates[name] = message
+        return updates
+
+    @property
+    def dropped(self) -> Dict[str, int]:
+        """
+        The number of stale values dropped per channel
+        """
+        return {name: channel.dropped for name, channel in self._channels.items()}
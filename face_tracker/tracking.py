@@ -1,8 +1,9 @@
 import cv2
 import numpy as np
 import mediapipe as mp
+import time
 from enum import Enum
-from typing import Tuple
+from typing import Dict, Tuple
 
 
 class FACE(Enum):
@@ -51,7 +52,8 @@ class FACE_DIRECTION(Enum):
 
 
 class Tracker:
-    def __init__(self, left_yaw_threshold=-30, right_yaw_threshold=30, forward_pitch_min=140):
+    def __init__(self, left_yaw_threshold=-30, right_yaw_threshold=30, forward_pitch_min=140, fast=False,
+                 roi_margin=0.6, roi_size=192):
         """
         Initializes a tracker object
 
@@ -61,16 +63,126 @@ class Tracker:
         left_yaw_threshold < x < right_yaw_threshold
         forward_pitch_min <= abs(pitch) < 180
 
+        In fast mode the iris landmarks are skipped, only the region around the previous face is
+        processed (downscaled to roi_size) and solvePnP starts from the previous pose.
+        The camera matrix is cached per resolution in either mode.
+
         :param left_yaw_threshold: the threshold of yaw for left direction (expects negative threshold)
         :param right_yaw_threshold: the threshold of yaw for right direction (expects positive threshold)
         :param forward_pitch_min: the minimum absolute threshold for pitch to be considered as forward
+        :param fast: enables the fast mode
+        :param roi_margin: fraction of the face size added on each side of the previous face to get the region
+        :param roi_size: the region is downscaled so its longest side is at most this many pixels
         """
-        self._mp_face = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+        self._mp_face = mp.solutions.face_mesh.FaceMesh(refine_landmarks=not fast)
         self._mesh_spec = mp.solutions.drawing_utils.DrawingSpec(color=(0, 255, 0), thickness=1, circle_radius=1)
         self._left_yaw_threshold = left_yaw_threshold
         self._right_yaw_threshold = right_yaw_threshold
         self._forward_pitch_min = abs(forward_pitch_min)
         self._landmarks = []
+        self._landmarks_roi = None  # (x0, y0, x1, y1) of the region the landmarks are normalized to
+
+        self._fast = fast
+        self._roi_margin = roi_margin
+        self._roi_size = roi_size
+        self._roi = None  # region around the previous face, None searches the full frame
+        self._camera_matrices = {}  # (w, h) -> camera matrix
+        self._dist_coeffs = np.zeros((4, 1))  # assume no lens distortion
+        self._rotation_vector = None
+        self._translation_vector = None
+        self._timings = {"preprocess": 0.0, "landmarks": 0.0, "pose": 0.0, "total": 0.0}
+
+    def _camera_matrix(self, w: int, h: int) -> np.ndarray:
+        """
+        Camera internals, assuming the focal length is the image width
+        """
+        if (w, h) not in self._camera_matrices:
+            focal_length = w
+            center = (w / 2, h / 2)
+            self._camera_matrices[(w, h)] = np.array([
+                [focal_length, 0, center[0]],
+                [0, focal_length, center[1]],
+                [0, 0, 1]
+            ], dtype=np.float64)
+        return self._camera_matrices[(w, h)]
+
+    def _find_landmarks(self, img_rbg: np.ndarray):
+        """
+        Runs the face mesh on the full frame, or in fast mode on the region around the previous face
+        :return: the landmarks, normalized to the region given by self._landmarks_roi
+        """
+        h, w = img_rbg.shape[:2]
+        roi = self._roi if self._fast else None
+        if roi is None:
+            region = img_rbg
+            roi = (0, 0, w, h)
+        else:
+            x0, y0, x1, y1 = roi
+            region = img_rbg[y0:y1, x0:x1]
+            scale = self._roi_size / max(x1 - x0, y1 - y0)
+            if scale < 1:
+                region = cv2.resize(region, (round((x1 - x0) * scale), round((y1 - y0) * scale)),
+                                    interpolation=cv2.INTER_AREA)
+        preprocessed = time.perf_counter()
+
+        results = self._mp_face.process(np.ascontiguousarray(region))
+        self._timings["landmarks"] = (time.perf_counter() - preprocessed) * 1000
+        if results.multi_face_landmarks is None and roi != (0, 0, w, h):
+            # the face left the region, search the full frame again
+            self._roi = None
+            return self._find_landmarks(img_rbg)
+
+        self._landmarks_roi = roi
+        return results.multi_face_landmarks[0]
+
+    def classify(self, pitch: float, yaw: float, previous: FACE_DIRECTION = None,
+                 hysteresis: float = 0.0) -> FACE_DIRECTION:
+        """
+        Classifies the head angles into a face direction.
+
+        Given the previous direction, every threshold is moved by hysteresis degrees in its favour,
+        so angles jittering around a threshold do not flip the direction back and forth.
+        :param pitch: the pitch of the head
+        :param yaw: the yaw of the head
+        :param previous: the previous direction
+        :param hysteresis: degrees an angle has to cross a threshold by to leave the previous direction
+        :return: returns a FACE_DIRECTION
+        """
+        previous = previous.value if previous is not None else ""
+        left_yaw_threshold = self._left_yaw_threshold + (hysteresis if previous.startswith("left") else 0)
+        right_yaw_threshold = self._right_yaw_threshold - (hysteresis if previous.startswith("right") else 0)
+        forward_pitch_min = self._forward_pitch_min
+        if previous in (FACE_DIRECTION.FORWARD.value, FACE_DIRECTION.LEFT.value, FACE_DIRECTION.RIGHT.value):
+            forward_pitch_min -= hysteresis
+        elif previous.endswith("up") or previous.endswith("down"):
+            forward_pitch_min += hysteresis
+
+        direction = FACE_DIRECTION.INDETERMINATE
+        if yaw <= left_yaw_threshold:
+            # we need to know which of the three possible left direction it could be
+            if forward_pitch_min <= abs(pitch) < 180:
+                direction = FACE_DIRECTION.LEFT
+            elif pitch < 0:
+                direction = FACE_DIRECTION.LEFT_DOWN
+            else:
+                direction = FACE_DIRECTION.LEFT_UP
+        elif yaw >= right_yaw_threshold:
+            # we need to know which of the three possible right direction it could be
+            if forward_pitch_min <= abs(pitch) < 180:
+                direction = FACE_DIRECTION.RIGHT
+            elif pitch < 0:
+                direction = FACE_DIRECTION.RIGHT_DOWN
+            else:
+                direction = FACE_DIRECTION.RIGHT_UP
+        else:
+            # if we are here, then we know that we are not turning in either left or right
+            if forward_pitch_min <= abs(pitch) < 180:
+                direction = FACE_DIRECTION.FORWARD
+            elif pitch < 0:
+                direction = FACE_DIRECTION.DOWN
+            else:
+                direction = FACE_DIRECTION.UP
+        return direction
 
     def predict_face_direction(self, img_rbg: np.ndarray) -> Tuple[FACE_DIRECTION, int, int, int]:
         """
@@ -79,70 +191,61 @@ class Tracker:
         :return: returns a FACE_DIRECTION
         """
         try:
+            start = time.perf_counter()
             h, w, channels = img_rbg.shape
 
             if channels != 3:
                 raise ValueError("The channel does not equal to 3")
 
-            results = self._mp_face.process(img_rbg)
-            self._landmarks = results.multi_face_landmarks[0]
+            self._landmarks = self._find_landmarks(img_rbg)
             landmarks = self._landmarks.landmark
+            landmarks_found = time.perf_counter()
+            self._timings["preprocess"] = (landmarks_found - start) * 1000 - self._timings["landmarks"]
 
             # 2D image points
+            x0, y0, x1, y1 = self._landmarks_roi
             image_points = []
             for LANDMARK_ID in LANDMARK_IDS:
                 landmark_id = LANDMARK_ID.value
                 landmark = landmarks[landmark_id]
-                image_points.append((landmark.x * w, landmark.y * h))
+                image_points.append((x0 + landmark.x * (x1 - x0), y0 + landmark.y * (y1 - y0)))
 
             image_points = np.array(image_points, dtype=np.float64)
 
-            # Camera internals
-            focal_length = w
-            center = (w / 2, h / 2)
-            camera_matrix = np.array([
-                [focal_length, 0, center[0]],
-                [0, focal_length, center[1]],
-                [0, 0, 1]
-            ], dtype=np.float64)
-            dist_coeffs = np.zeros((4, 1))  # assume no lens distortion
+            if self._fast:
+                # the region of the next frame is the bounding box of these points, grown by the margin
+                (left, top), (right, bottom) = image_points.min(axis=0), image_points.max(axis=0)
+                margin = self._roi_margin * max(right - left, bottom - top)
+                self._roi = (max(int(left - margin), 0), max(int(top - margin), 0),
+                             min(int(right + margin), w), min(int(bottom + margin), h))
+                if self._roi[2] - self._roi[0] < 2 or self._roi[3] - self._roi[1] < 2:
+                    self._roi = None  # the face is (almost) out of the frame
 
             # Solve PnP
-            success, rotation_vector, translation_vector = cv2.solvePnP(
-                MODEL_POINTS, image_points, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE
-            )
+            camera_matrix = self._camera_matrix(w, h)
+            if self._fast and self._rotation_vector is not None:
+                # start from the previous pose, the head barely moves between frames
+                success, rotation_vector, translation_vector = cv2.solvePnP(
+                    MODEL_POINTS, image_points, camera_matrix, self._dist_coeffs,
+                    rvec=self._rotation_vector.copy(), tvec=self._translation_vector.copy(),
+                    useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE
+                )
+            else:
+                success, rotation_vector, translation_vector = cv2.solvePnP(
+                    MODEL_POINTS, image_points, camera_matrix, self._dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE
+                )
+            self._rotation_vector, self._translation_vector = rotation_vector, translation_vector
 
             # Convert to Euler angles
             rot_mat, _ = cv2.Rodrigues(rotation_vector)
             pose_mat = np.hstack((rot_mat, translation_vector))
             _, _, _, _, _, _, euler = cv2.decomposeProjectionMatrix(pose_mat)
             pitch, yaw, roll = euler.flatten()
+            end = time.perf_counter()
+            self._timings["pose"] = (end - landmarks_found) * 1000
+            self._timings["total"] = (end - start) * 1000
 
-            direction = FACE_DIRECTION.INDETERMINATE
-            if yaw <= self._left_yaw_threshold:
-                # we need to know which of the three possible left direction it could be
-                if self._forward_pitch_min <= abs(pitch) < 180:
-                    direction = FACE_DIRECTION.LEFT
-                elif pitch < 0:
-                    direction = FACE_DIRECTION.LEFT_DOWN
-                else:
-                    direction = FACE_DIRECTION.LEFT_UP
-            elif yaw >= self._right_yaw_threshold:
-                # we need to know which of the three possible right direction it could be
-                if self._forward_pitch_min <= abs(pitch) < 180:
-                    direction = FACE_DIRECTION.RIGHT
-                elif pitch < 0:
-                    direction = FACE_DIRECTION.RIGHT_DOWN
-                else:
-                    direction = FACE_DIRECTION.RIGHT_UP
-            else:
-                # if we are here, then we know that we are not turning in either left or right
-                if self._forward_pitch_min <= abs(pitch) < 180:
-                    direction = FACE_DIRECTION.FORWARD
-                elif pitch < 0:
-                    direction = FACE_DIRECTION.DOWN
-                else:
-                    direction = FACE_DIRECTION.UP
+            direction = self.classify(pitch, yaw)
 
             return direction, pitch, yaw, roll
         except ValueError as e:
@@ -150,8 +253,16 @@ class Tracker:
             return FACE_DIRECTION.INDETERMINATE, -1, -1, -1
         except TypeError as e:
             print(e)
+            self._rotation_vector = self._translation_vector = None
             return FACE_DIRECTION.INDETERMINATE, -1, -1, -1
 
+    @property
+    def timings(self) -> Dict[str, float]:
+        """
+        The timings of the last call to predict_face_direction in milliseconds
+        """
+        return self._timings
+
     def video_capture(self) -> None:
         """
         Calls this function to produce a live video overlay of what is being
@@ -168,8 +279,10 @@ class Tracker:
             img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
             direction, pitch, yaw, roll = self.predict_face_direction(img_rgb)
+            x0, y0, x1, y1 = self._landmarks_roi if self._landmarks_roi is not None else (0, 0, 0, 0)
             mp.solutions.drawing_utils.draw_landmarks(
-                image=frame,
+                # the landmarks are normalized to the region they were found in, drawing on a view of it
+                image=frame[y0:y1, x0:x1] if self._landmarks_roi is not None else frame,
                 landmark_list=self._landmarks,
                 connections=mp.solutions.face_mesh.FACEMESH_TESSELATION,
                 landmark_drawing_spec=None,
@@ -189,6 +302,152 @@ class Tracker:
         cv2.destroyAllWindows()
 
 
+class OneEuroFilter:
+    """
+    The 1 euro filter (https://gery.casiez.net/1euro/) on a vector of angles in degrees.
+    Slow movements are smoothed heavily to remove jitter, fast ones barely, to keep the lag low.
+    The angles are unwrapped so a jump from 179 to -179 is a 2 degree step.
+    """
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 0.05, d_cutoff: float = 1.0):
+        """
+        :param min_cutoff: the cutoff frequency (Hz) when the angles are still, lower smooths more
+        :param beta: how fast the cutoff frequency grows with the speed, higher lags less
+        :param d_cutoff: the cutoff frequency (Hz) of the speed estimate
+        """
+        self._min_cutoff = min_cutoff
+        self._beta = beta
+        self._d_cutoff = d_cutoff
+        self.reset()
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1 / (2 * np.pi * cutoff)
+        return 1 / (1 + tau / dt)
+
+    def reset(self) -> None:
+        self._x = None
+        self._dx = None
+        self._t = None
+
+    def __call__(self, x: np.ndarray, t: float) -> np.ndarray:
+        """
+        :param x: the angles in degrees
+        :param t: the time of the sample in seconds
+        :return: the filtered angles in degrees, in [-180, 180)
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if self._x is None or t <= self._t:
+            self._x, self._dx, self._t = x, np.zeros_like(x), t
+            return x
+
+        dt = t - self._t
+        x = self._x + (x - self._x + 180) % 360 - 180  # unwrap around the previous estimate
+        dx = (x - self._x) / dt
+        a_d = self._alpha(self._d_cutoff, dt)
+        self._dx = a_d * dx + (1 - a_d) * self._dx
+        cutoff = self._min_cutoff + self._beta * np.abs(self._dx)
+        a = self._alpha(cutoff, dt)
+        self._x = a * x + (1 - a) * self._x
+        self._t = t
+        return (self._x + 180) % 360 - 180
+
+
+class DirectionFilter:
+    """
+    A filtered stream of face directions for a Tracker.
+
+    The pitch, yaw and roll are smoothed with a OneEuroFilter and classified with hysteresis, and
+    update only returns a direction when it changed, or every heartbeat seconds so a consumer
+    that missed it catches up.
+
+    >>> direction_filter = DirectionFilter(Tracker(-30, 30, 165, fast=True))  # doctest: +SKIP
+    >>> direction = direction_filter.update(img_rgb, time.time())  # doctest: +SKIP
+    >>> if direction is not None: queue.put(direction)  # doctest: +SKIP
+    """
+    def __init__(self, tracker: Tracker, min_cutoff: float = 1.0, beta: float = 0.05, hysteresis: float = 5.0,
+                 heartbeat: float = 1.0, lost_frames: int = 3):
+        """
+        :param tracker: the tracker estimating the angles of every frame
+        :param min_cutoff: see OneEuroFilter
+        :param beta: see OneEuroFilter
+        :param hysteresis: degrees an angle has to cross a threshold by to change the direction
+        :param heartbeat: seconds after which the current direction is returned again even though it did not change
+        :param lost_frames: consecutive frames without a face before the direction becomes indeterminate
+        """
+        self._tracker = tracker
+        self._filter = OneEuroFilter(min_cutoff, beta)
+        self._hysteresis = hysteresis
+        self._heartbeat = heartbeat
+        self._lost_frames = lost_frames
+        self._missed = 0
+        self._direction = FACE_DIRECTION.INDETERMINATE
+        self._angles = (-1, -1, -1)
+        self._emitted_at = None
+        self._frames = 0
+        self._emitted = 0
+
+    def update(self, img_rgb: np.ndarray, timestamp: float = None) -> FACE_DIRECTION | None:
+        """
+        :param img_rgb: A (h, w, 3) array where w and h can be anything
+        :param timestamp: the capture time of the frame in seconds, defaults to now
+        :return: the direction if it changed or the heartbeat is due, None otherwise
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        self._frames += 1
+        direction, pitch, yaw, roll = self._tracker.predict_face_direction(img_rgb)
+
+        if direction == FACE_DIRECTION.INDETERMINATE:
+            self._missed += 1
+            if self._missed >= self._lost_frames:
+                self._filter.reset()
+                self._angles = (-1, -1, -1)
+                if self._direction != FACE_DIRECTION.INDETERMINATE:
+                    # the face is gone, the consumer has to know now rather than at the next heartbeat
+                    self._direction = FACE_DIRECTION.INDETERMINATE
+                    return self._emit(timestamp)
+        else:
+            self._missed = 0
+            pitch, yaw, roll = self._filter(np.array([pitch, yaw, roll]), timestamp)
+            self._angles = (pitch, yaw, roll)
+            previous = None if self._direction == FACE_DIRECTION.INDETERMINATE else self._direction
+            direction = self._tracker.classify(pitch, yaw, previous, self._hysteresis)
+            changed = direction != self._direction
+            self._direction = direction
+            if changed:
+                return self._emit(timestamp)
+
+        if self._emitted_at is None or timestamp - self._emitted_at >= self._heartbeat:
+            return self._emit(timestamp)
+        return None
+
+    def _emit(self, timestamp: float) -> FACE_DIRECTION:
+        self._emitted_at = timestamp
+        self._emitted += 1
+        return self._direction
+
+    @property
+    def direction(self) -> FACE_DIRECTION:
+        """
+        The current filtered direction
+        """
+        return self._direction
+
+    @property
+    def angles(self) -> Tuple[float, float, float]:
+        """
+        The current filtered pitch, yaw and roll
+        """
+        return self._angles
+
+    @property
+    def emission_ratio(self) -> float:
+        """
+        The fraction of frames a direction was returned for
+        """
+        return self._emitted / max(self._frames, 1)
+
+
 if __name__ == '__main__':
     tracker = Tracker(-30, 30, 165)
+    # tracker = Tracker(-30, 30, 165, fast=True)  # print(tracker.timings) to compare the stages
     tracker.video_capture()
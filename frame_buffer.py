@@ -0,0 +1,145 @@
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+
+class FrameRing:
+    """
+    A fixed-size ring of frame slots in shared memory.
+
+    The producer writes frames in place and only sends the (slot, seq) pair over the queue,
+    the consumer gets a zero-copy view of the slot. A slot is reused after `slots` writes, so
+    a consumer holding on to a view should check is_current before trusting it, or copy what it
+    keeps out with copy.
+
+    >>> ring = FrameRing((480, 640, 3), slots=4)
+    >>> slot, seq = ring.write(np.zeros((480, 640, 3), dtype=np.uint8))
+    >>> ring.view(slot).shape
+    (480, 640, 3)
+    >>> ring.is_current(slot, seq)
+    True
+    >>> ring.copy(slot, seq, slice(0, 160)).shape
+    (160, 640, 3)
+    >>> ring.close()
+    >>> ring.unlink()
+    """
+    def __init__(self, shape: Tuple[int, ...], slots: int = 4, dtype=np.uint8, name: str = None):
+        """
+        Creates the ring, or attaches to an existing one if a name is given
+        :param shape: the shape of a single frame
+        :param slots: the number of frame slots
+        :param dtype: the dtype of a frame
+        :param name: the name of an existing shared memory block to attach to
+        """
+        self._shape = tuple(shape)
+        self._slots = slots
+        self._dtype = np.dtype(dtype)
+
+        frame_bytes = int(np.prod(self._shape)) * self._dtype.itemsize
+        # the header stores the sequence number currently held by each slot
+        header_bytes = slots * np.dtype(np.int64).itemsize
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * frame_bytes)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+
+        self._seqs = np.ndarray((slots,), dtype=np.int64, buffer=self._shm.buf)
+        self._frames = np.ndarray((slots, *self._shape), dtype=self._dtype, buffer=self._shm.buf,
+                                  offset=header_bytes)
+        if name is None:
+            self._seqs[:] = -1
+        self._next_seq = 0
+
+    def __getstate__(self):
+        # only the name travels to a spawned process, the child attaches to the same block
+        return {"shape": self._shape, "slots": self._slots, "dtype": self._dtype.str, "name": self._shm.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["shape"], state["slots"], state["dtype"], state["name"])
+
+    def write(self, frame: np.ndarray) -> Tuple[int, int]:
+        """
+        Copies the frame into the next slot. Only one process should write to a ring.
+        :param frame: a frame of the ring's shape
+        :return: the (slot, seq) pair to send to the consumer
+        """
+        seq = self._next_seq
+        slot = seq % self._slots
+        # invalidate first so a reader never sees a half written frame as current
+        self._seqs[slot] = -1
+        self._frames[slot] = frame
+        self._seqs[slot] = seq
+        self._next_seq += 1
+        return slot, seq
+
+    def slot_view(self) -> Tuple[np.ndarray, int, int]:
+        """
+        Reserves the next slot for a producer that wants to write into it directly (e.g. cv2 dst=)
+        Call commit with the returned slot and seq once the frame is written.
+        :return: a writable view of the slot, the slot and the seq
+        """
+        seq = self._next_seq
+        slot = seq % self._slots
+        self._seqs[slot] = -1
+        self._next_seq += 1
+        return self._frames[slot], slot, seq
+
+    def commit(self, slot: int, seq: int) -> None:
+        """
+        Publishes a slot reserved with slot_view
+        :param slot: the slot
+        :param seq: the sequence number
+        :return: None
+        """
+        self._seqs[slot] = seq
+
+    def view(self, slot: int) -> np.ndarray:
+        """
+        Returns a zero-copy view of a slot
+        :param slot: the slot
+        :return: the frame stored in the slot
+        """
+        return self._frames[slot]
+
+    def is_current(self, slot: int, seq: int) -> bool:
+        """
+        Checks that the slot still holds the frame with the given sequence number
+        :param slot: the slot
+        :param seq: the sequence number
+        :return: whether the slot was not overwritten
+        """
+        return bool(self._seqs[slot] == seq)
+
+    def copy(self, slot: int, seq: int, index=slice(None)) -> Optional[np.ndarray]:
+        """
+        Copies a frame, or a part of it, out of a slot, for a consumer that keeps it longer than the slot lives
+        :param slot: the slot
+        :param seq: the sequence number
+        :param index: the part of the frame to copy, e.g. a slice of rows
+        :return: the copy, or None if the slot was overwritten before or while it was copied
+        """
+        frame = self._frames[slot][index].copy()
+        # checked after copying, a write that started during the copy invalidated the slot first
+        return frame if self.is_current(slot, seq) else None
+
+    def close(self) -> None:
+        """
+        Detaches from the shared memory. The views are unusable afterwards.
+        """
+        self._seqs = None
+        self._frames = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """
+        Frees the shared memory. Only the creator should call this.
+        """
+        self._shm.unlink()
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._shape
+
+    @property
+    def slots(self) -> int:
+        return self._slots
@@ -2,8 +2,13 @@ from google import genai
 from google.genai import types
 import os
 from dotenv import load_dotenv
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Callable, Any, Hashable
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
 import numpy as np
+import threading
+import time
 load_dotenv()
 
 import cv2
@@ -14,10 +19,14 @@ from PIL import Image
 client = genai.Client(api_key=os.getenv("GEMINI_KEY"))
 
 
-def gemini_image_description(img_array: np.ndarray, update_state: Dict[str, str]) -> str:
+def gemini_image_description(img_array: np.ndarray, update_state: Dict[str, str], gemini_client=None) -> str:
     """
     Generate a description of the image using Gemini API.
+    :param img_array: rgb image
+    :param update_state: the objects to describe, e.g. {"bottle": "added 2", "cup": "removed 1"}
+    :param gemini_client: the genai client to use, defaults to the module client (pass a fake one for testing)
     """
+    gemini_client = client if gemini_client is None else gemini_client
     
     img = Image.fromarray(img_array)
     prompt = """
@@ -44,12 +53,273 @@ def gemini_image_description(img_array: np.ndarray, update_state: Dict[str, str]
     """ + f"Now, for the given image, describe the objects in the current state based on the dictionary: {update_state}. Return only the description.\n" 
    
     model_name = "gemini-2.0-flash"
-    response = client.models.generate_content(
+    response = gemini_client.models.generate_content(
         model= model_name,
         contents = [prompt, img]
     )
     return response.text
 
+def image_hash(img_array: np.ndarray, hash_size: int = 8) -> int:
+    """
+    Perceptual (difference) hash of an image: the image is downscaled to a (hash_size, hash_size + 1)
+    grayscale thumbnail and each bit records whether a pixel is brighter than its right neighbour.
+    Similar images have hashes with a small hamming distance.
+    :param img_array: rgb image
+    :param hash_size: the hash has hash_size ** 2 bits
+    :return: the hash as an int
+    """
+    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    thumbnail = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def canonical_state(update_state: Optional[Dict[str, str]]) -> Optional[Tuple[Tuple[str, str], ...]]:
+    """
+    Turns an update state dict into a hashable value that does not depend on the key order
+    """
+    if update_state is None:
+        return None
+    return tuple(sorted((str(k), str(v)) for k, v in update_state.items()))
+
+
+class DescriptionCache:
+    """
+    An LRU + TTL cache of Gemini descriptions keyed on the direction, the update state and a
+    perceptual hash of the image. Two images whose hashes are at most hash_tolerance bits apart
+    are considered the same view.
+
+    >>> cache = DescriptionCache(max_entries=2, ttl=60)
+    >>> img = np.zeros((30, 40, 3), dtype=np.uint8)
+    >>> cache.get("left", {"cup": "1"}, img) is None
+    True
+    >>> cache.put("left", {"cup": "1"}, img, "There is a cup.")
+    >>> cache.get("left", {"cup": "1"}, img)
+    'There is a cup.'
+    >>> cache.stats
+    {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+    """
+    def __init__(self, max_entries: int = 64, ttl: float = 30.0, hash_tolerance: int = 6, clock=time.monotonic):
+        """
+        :param max_entries: the least recently used entry is evicted past this size
+        :param ttl: seconds after which an entry expires
+        :param hash_tolerance: maximum hamming distance between image hashes of the same view
+        :param clock: returns the current time in seconds
+        """
+        self._entries = OrderedDict()  # (direction, state, image hash) -> (description, time stored)
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._hash_tolerance = hash_tolerance
+        self._clock = clock
+        self._lock = threading.Lock()  # the cache is shared by the AsyncDescriber threads
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _find(self, direction: str, state, img_hash: int):
+        now = self._clock()
+        for key in list(self._entries):
+            description, stored_at = self._entries[key]
+            if now - stored_at > self._ttl:
+                del self._entries[key]
+                self._evictions += 1
+                continue
+            if key[0] == direction and key[1] == state and (key[2] ^ img_hash).bit_count() <= self._hash_tolerance:
+                return key
+        return None
+
+    def get(self, direction: str, update_state: Optional[Dict[str, str]], img_array: np.ndarray) -> Optional[str]:
+        """
+        :param direction: the direction the image was taken in
+        :param update_state: the update state sent to Gemini
+        :param img_array: rgb image
+        :return: the cached description, or None on a miss
+        """
+        img_hash = image_hash(img_array)
+        with self._lock:
+            key = self._find(direction, canonical_state(update_state), img_hash)
+            if key is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, direction: str, update_state: Optional[Dict[str, str]], img_array: np.ndarray, description: str) -> None:
+        """
+        :param direction: the direction the image was taken in
+        :param update_state: the update state sent to Gemini
+        :param img_array: rgb image
+        :param description: the description returned by Gemini
+        :return: None
+        """
+        key = (direction, canonical_state(update_state), image_hash(img_array))
+        with self._lock:
+            self._entries[key] = (description, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self._hits, "misses": self._misses, "evictions": self._evictions, "size": len(self._entries)}
+
+
+class CachedDescriber:
+    """
+    Describes images with gemini_image_description, reusing the description of an identical
+    request (same direction, same update state, similar image) from the cache.
+    """
+    def __init__(self, gemini_client=None, cache: DescriptionCache = None):
+        """
+        :param gemini_client: the genai client to use, defaults to the module client (pass a fake one for testing)
+        :param cache: the cache, defaults to a DescriptionCache with default settings
+        """
+        self._client = gemini_client
+        self._cache = DescriptionCache() if cache is None else cache
+
+    def describe(self, img_array: np.ndarray, update_state: Optional[Dict[str, str]], direction: str) -> str:
+        """
+        :param img_array: rgb image
+        :param update_state: the objects to describe
+        :param direction: the direction the image was taken in
+        :return: the description
+        """
+        description = self._cache.get(direction, update_state, img_array)
+        if description is None:
+            description = gemini_image_description(img_array, update_state, self._client)
+            self._cache.put(direction, update_state, img_array, description)
+        return description
+
+    @property
+    def cache(self) -> DescriptionCache:
+        return self._cache
+
+
+class AsyncDescriber:
+    """
+    Runs Gemini requests on a thread pool so the caller never blocks on the network.
+
+    Requests are grouped by a key (e.g. the direction). Submitting a newer request for a key makes
+    the previous one stale: it is cancelled if it has not started yet, otherwise its result is dropped.
+    The backend is any callable, so a fake one (or a CachedDescriber with a FakeGeminiClient) can be
+    used offline.
+
+    >>> describer = AsyncDescriber(max_workers=1)
+    >>> future = describer.submit("left", lambda objects: f"There is {objects}.", "a cup")
+    >>> _ = future.result()
+    >>> describer.poll()
+    [('left', 'There is a cup.')]
+    >>> describer.shutdown()
+    """
+    def __init__(self, max_workers: int = 2, on_done: Callable[[], None] = None):
+        """
+        :param max_workers: the number of requests running at the same time
+        :param on_done: called from the worker thread whenever a request finishes (e.g. to wake the main loop)
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+        self._on_done = on_done
+        self._latest = {}  # key -> future of the newest request
+        self._lock = threading.Lock()
+        self._cancelled = 0
+        self._dropped = 0
+
+    def submit(self, key: Hashable, backend: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Starts a request, superseding the previous request with the same key
+        :param key: the key of the request
+        :param backend: the function making the request, e.g. CachedDescriber.describe
+        :param args: the arguments passed to the backend. Copy arrays that may be overwritten before the request runs.
+        :param kwargs: the keyword arguments passed to the backend
+        :return: the future of the request
+        """
+        future = self._executor.submit(backend, *args, **kwargs)
+        with self._lock:
+            previous = self._latest.get(key)
+            self._latest[key] = future
+            if previous is not None:
+                if previous.cancel():
+                    self._cancelled += 1
+                else:
+                    self._dropped += 1
+        if self._on_done is not None:
+            future.add_done_callback(lambda _: self._on_done())
+        return future
+
+    def poll(self, return_exceptions: bool = False) -> List[Tuple[Hashable, Any]]:
+        """
+        Collects the finished requests that were not superseded. Never blocks.
+        :param return_exceptions: return the exception of a failed request as its result, instead of
+         printing and skipping it
+        :return: a list of (key, result) pairs
+        """
+        finished = []
+        with self._lock:
+            for key, future in list(self._latest.items()):
+                if future.done():
+                    del self._latest[key]
+                    finished.append((key, future))
+
+        results = []
+        for key, future in finished:
+            try:
+                results.append((key, future.result()))
+            except Exception as e:
+                if return_exceptions:
+                    results.append((key, e))
+                else:
+                    print(f"Request {key} failed: {e}")
+        return results
+
+    def pending(self, key: Hashable) -> bool:
+        """
+        :return: whether a request for the key has not been collected yet
+        """
+        with self._lock:
+            return key in self._latest
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        The number of stale requests that were cancelled before running, or whose result was dropped
+        """
+        return {"cancelled": self._cancelled, "dropped": self._dropped}
+
+
+class FakeGeminiClient:
+    """
+    A stand-in for genai.Client for running without network access.
+    Only client.models.generate_content(model=..., contents=...) is implemented.
+
+    >>> fake = FakeGeminiClient(lambda contents: "No changes detected.")
+    >>> fake.models.generate_content(model="gemini-2.0-flash", contents=["prompt"]).text
+    'No changes detected.'
+    """
+    def __init__(self, respond: Callable[[List[Any]], str] = None, latency: float = 0.0):
+        """
+        :param respond: returns the response text for the contents of a request
+        :param latency: seconds each request takes, to simulate the network round trip
+        """
+        self._respond = respond if respond is not None else (lambda contents: "No changes detected.")
+        self._latency = latency
+        self.requests = 0
+        self.models = SimpleNamespace(generate_content=self._generate_content)
+
+    def _generate_content(self, model: str, contents: List[Any]):
+        self.requests += 1
+        if self._latency > 0:
+            time.sleep(self._latency)
+        return SimpleNamespace(text=self._respond(contents))
+
+
 if __name__ == "__main__":
 
     # Load an image
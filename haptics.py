@@ -1,56 +1,136 @@
 import serial
+import threading
 import time
+from typing import Tuple
 
-# Set up the serial connection
-ser = serial.Serial('COM3', 9600, timeout=1)  # Change to your port (e.g., "/dev/ttyUSB0" for Linux)
-time.sleep(2)
-
-if ser.is_open:
-    print("Serial port opened successfully!")
-else:
-    print("Failed to open serial port!")
-ser.flush()
-
-# # ser.write(b'WARN: RIGHT 50\n')
-# # time.sleep(0.5)
-# # ser.write(b'WARN: FORWARD 50\n')
-# # time.sleep(0.5)
-# # ser.write(b'WARN: FORWARD OFF\n')
-# # time.sleep(0.5)
-ser.write(b'WARN: RIGHT 200\n')
-print("HERE")
-time.sleep(5)
-# ser.write(b'WARN: RIGHT OFF\n')
-# time.sleep(0.5)
-ser.write(b'WARN: RIGHT 0\n')
-# time.sleep(1)
-# ser.write(b'WARN: RIGHT 200\n')
-# time.sleep(2)
-# ser.write(b'WARN: LEFT 200\n')
-# time.sleep(2)
-# ser.write(b'WARN: LEFT 0\n')
-# time.sleep(1)
-# ser.write(b'WARN: RIGHT 0\n')
-# time.sleep(1)
-
-# power = 0
-
-# while True:
-#     # Read the line from the serial port (each line is sent by Arduino)
-#     if ser.in_waiting > 0:
-#         button_state = ser.readline().decode('utf-8').strip()  # Read the serial data
-        
-#         print(f"Button State: {button_state}")
-        
-#         # Control motor PWM based on button state
-#         if "STRONG" in button_state and not power == 2:
-#             power = 2
-#             ser.write(b'WARN: LEFT 100\n')  # Send PWM value to Arduino to turn the motor at full speed
-#         elif "WEAK" in button_state and not power == 1:
-#             power = 1
-#             ser.write(b'WARN: LEFT 50\n')  # Send PWM value to Arduino to turn the motor at lower speed
-#         elif "NONE" in button_state and not power == 0:
-#             power = 0
-#             ser.write(b'WARN: LEFT 0\n')
-    
-#     time.sleep(0.1)  # Delay to avoid constantly querying the serial port
+# the channels of the haptics hardware, in the order of the PWM tuples (see Haptics/Haptics.ino)
+CHANNELS = ("LEFT", "FORWARD", "RIGHT")
+
+
+class HapticsController:
+    """
+    Drives the haptics Arduino (see Haptics/Haptics.ino) from a background thread.
+
+    set() never blocks. The writer thread only sends the channels whose PWM changed since the last
+    write, and everything set while it was busy is coalesced into the next write, so a slow 9600 baud
+    link never backs up.
+
+    >>> haptics = HapticsController(serial.serial_for_url("loop://", timeout=1))
+    >>> haptics.flush()  # every channel is turned off when the controller starts
+    True
+    >>> haptics.serial.read(haptics.serial.in_waiting)
+    b'WARN: LEFT 0\\nWARN: FORWARD 0\\nWARN: RIGHT 0\\n'
+    >>> haptics.set(200, 0, 50)
+    >>> haptics.flush()
+    True
+    >>> haptics.serial.read(haptics.serial.in_waiting)
+    b'WARN: LEFT 200\\nWARN: RIGHT 50\\n'
+    >>> haptics.close()
+    """
+    def __init__(self, port: str | serial.Serial = 'COM3', baudrate: int = 9600, multi_channel_frames: bool = False,
+                 settle_time: float = 2.0):
+        """
+        :param port: the serial port (e.g. "COM3", "/dev/ttyUSB0", a pyserial URL such as "loop://") or an open port
+        :param baudrate: the baudrate of the port
+        :param multi_channel_frames: send all changed channels in a single "WARN: L200 F0 R50" line
+        :param settle_time: seconds to wait after opening the port, the Arduino resets when it is opened
+        """
+        if isinstance(port, str):
+            self._serial = serial.serial_for_url(port, baudrate, timeout=1)
+            time.sleep(settle_time)
+            if self._serial.is_open:
+                print("Serial port opened successfully!")
+            else:
+                print("Failed to open serial port!")
+            self._serial.flush()
+        else:
+            self._serial = port
+
+        self._multi_channel_frames = multi_channel_frames
+        self._target = [0] * len(CHANNELS)
+        self._sent = [None] * len(CHANNELS)  # nothing was sent yet, so the first write sends every channel
+        self._condition = threading.Condition()
+        self._running = True
+        self._writes = 0
+        self._thread = threading.Thread(target=self._writer, name="haptics", daemon=True)
+        self._thread.start()
+
+    def set(self, left: int, forward: int, right: int) -> None:
+        """
+        Sets the PWM (0-255) of each channel
+        :return: None
+        """
+        with self._condition:
+            self._target = [int(left), int(forward), int(right)]
+            self._condition.notify()
+
+    def _encode(self, changes: dict) -> bytes:
+        if self._multi_channel_frames:
+            return ("WARN: " + " ".join(f"{CHANNELS[i][0]}{pwm}" for i, pwm in changes.items()) + "\n").encode()
+        return "".join(f"WARN: {CHANNELS[i]} {pwm}\n" for i, pwm in changes.items()).encode()
+
+    def _writer(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: not self._running or self._target != self._sent)
+                if not self._running:
+                    return
+                target = list(self._target)
+                changes = {i: pwm for i, pwm in enumerate(target) if pwm != self._sent[i]}
+
+            self._serial.write(self._encode(changes))
+
+            with self._condition:
+                self._sent = target
+                self._writes += 1
+                self._condition.notify_all()
+
+    def flush(self, timeout: float = 1.0) -> bool:
+        """
+        Waits until the last PWM set was written
+        :param timeout: the maximum time to wait in seconds
+        :return: False if the timeout expired
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._target == self._sent, timeout)
+
+    def close(self) -> None:
+        """
+        Turns every channel off, stops the writer thread and closes the port
+        """
+        self.set(0, 0, 0)
+        self.flush()
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join(timeout=1)
+        self._serial.close()
+
+    @property
+    def serial(self) -> serial.Serial:
+        return self._serial
+
+    @property
+    def last_sent(self) -> Tuple[int, ...]:
+        """
+        The PWM of each channel as last written to the port
+        """
+        return tuple(self._sent)
+
+    @property
+    def writes(self) -> int:
+        """
+        The number of writes to the port
+        """
+        return self._writes
+
+
+if __name__ == "__main__":
+    # Set up the serial connection
+    haptics = HapticsController('COM3', 9600)  # Change to your port (e.g., "/dev/ttyUSB0" for Linux)
+
+    haptics.set(0, 0, 200)
+    print("HERE")
+    time.sleep(5)
+    haptics.set(0, 0, 0)
+    haptics.close()
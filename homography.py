@@ -49,6 +49,12 @@ class Homog():
         np_pts_image = np.float32(np_pts_image[:, np.newaxis, :])
 
         self.h, err = cv2.findHomography(np_pts_image, np_pts_ground)
+        # a homography is only defined up to scale, findHomography may return one where the ground has w < 0.
+        # Flipping its sign leaves every xy unchanged, and lets transform_many tell the ground (w > 0) from
+        # the sky above the horizon (w <= 0)
+        if (self.h @ np.array([*PTS_IMAGE_PLANE[0], 1.0]))[2] < 0:
+            self.h = -self.h
+        self._row_luts = {}
 
     def transformUvToXy(self, u, v):
         """
@@ -69,4 +75,45 @@ class Homog():
         homogeneous_xy = xy * scaling_factor
         x = homogeneous_xy[0, 0]
         y = homogeneous_xy[1, 0]
-        return x, y
\ No newline at end of file
+        return x, y
+
+    def transform_many(self, uv: np.ndarray) -> np.ndarray:
+        """
+        Vectorized transformUvToXy.
+
+        uv is a (n, 2) array of pixel coordinates (u, v).
+        Returns a (n, 2) array of xy displacement vectors in inches. Points on or above the
+        horizon have no ground plane location and are returned as inf.
+        """
+        uv = np.asarray(uv, dtype=np.float64).reshape(-1, 2)
+        xyw = uv @ self.h[:, :2].T + self.h[:, 2]
+        w = xyw[:, 2:3]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xy = np.where(w > 0, xyw[:, :2] / w, np.inf)
+        return xy
+
+    def distances(self, uv: np.ndarray) -> np.ndarray:
+        """
+        uv is a (n, 2) array of pixel coordinates of points on the ground (e.g. the
+        bottom center of bounding boxes).
+
+        Returns a (n,) array of ground plane distances from the camera in inches,
+        inf for points on or above the horizon.
+        """
+        xy = self.transform_many(uv)
+        return np.hypot(xy[:, 0], xy[:, 1])
+
+    def row_distance_lut(self, height: int, u: float) -> np.ndarray:
+        """
+        Precomputes the distance of every pixel row of an image of the given height,
+        taken at column u (usually the image center). Rows are cached per (height, u).
+
+        Looking distances up by row (lut[v]) ignores how far the point is from column u,
+        so it is an approximation that is cheapest when many boxes are filtered per frame.
+        """
+        key = (height, u)
+        if key not in self._row_luts:
+            rows = np.arange(height, dtype=np.float64)
+            uv = np.stack([np.full(height, u, dtype=np.float64), rows], axis=1)
+            self._row_luts[key] = self.distances(uv)
+        return self._row_luts[key]
@@ -1,142 +1,421 @@
 import face_tracker.tracking
-from face_tracker.tracking import Tracker
-from YOLO_test.YOLO import yolo_object_detection_v11, object_description_generator
-from audio_output import text_to_speech
+from face_tracker.tracking import Tracker, DirectionFilter
+from YOLO_test.YOLO import DIST_THRESHOLD, Detector, object_description_generator
+from YOLO_test.tracker import ObjectTracker
+from YOLO_test.hazards import HazardScorer
+from YOLO_test.gate import FrameGate
+from YOLO_test.backends import tier_weights
+from audio_output import SpeechWorker, SPEECH_PRIORITY
 from transcription.transcriber import whisper_process, Transcriber
 import cv2
-import serial
 import multiprocessing as mp
+import os
+from typing import Callable
 import time
 import keyboard
-from gemini_api import gemini_image_description
+from gemini_api import CachedDescriber, AsyncDescriber
+from haptics import HapticsController
+from frame_buffer import FrameRing
+from channels import ChannelSet, LatestChannel
+from scheduler import FrameScheduler
+from metrics import Metrics, MetricsServer, SharedMetrics, current, install
+from recording import AudioRecorder, FrameRecorder, ReplayCapture, ReplayClock, ReplayMicrophone
 
 # Global variables
 scene_camera_i = 1  # Index 1 is typically the Camo webcam, but this may vary
 user_camera_i = 0  # Index 0 is typically the built-in webcam
 frames_per_sec = 10
+detector_tier = "x"  # size of the YOLO11 model, one of n, s, m, x (smaller is faster and less accurate)
+detector_backend = "onnx"  # torch, onnx or onnx-int8. The ONNX backends run on CPU, the export is cached in YOLO_test/exports
+user_frames_per_sec = 15  # the face direction is cheap, but there's no point in running it faster than this
+scene_frame_shape = (1080, 1920, 3)  # (h, w, c) of the frames shared between the scene process and main
+scene_frame_slots = 8  # number of scene frames kept in shared memory before a slot is reused
+track_confirm_frames = 3  # frames an object has to be seen in before it is counted
+track_lost_frames = 5  # frames an object is still counted after it was last seen
+dist_threshold = DIST_THRESHOLD  # inches, objects further away are not announced. None announces everything
+whisper_compute_type = "int8"  # precision of the whisper weights, int8 is the fastest on a CPU
+whisper_cpu_threads = 4
+whisper_beam_size = 1  # 1 decodes greedily, more beams are slightly more accurate and proportionally slower
+whisper_pre_roll = 0.5  # seconds of audio from before the push to talk key was noticed that are transcribed too
+STREAM_TRANSCRIPTION = True  # transcribe while the user talks, and ask Gemini as soon as the partial transcription is stable
 USE_HAPTICS = True # Set to true only if the haptics system is hooked up - otherwise, it will throw an error
+RECORD_DIR = None  # directory to record both cameras and the mic into, see recording
+REPLAY_DIR = None  # directory of a recording to replay instead of the cameras and the mic
+REPLAY_REALTIME = True  # replay at the recorded pace, or as fast as the workers read when False
+METRICS_PORT = 9100  # the Prometheus metrics are served on http://127.0.0.1:9100/metrics, None turns it off
+STATS_INTERVAL = 5  # seconds between the stats lines printed by main
+USE_GAZE_FOCUS = True  # detect the sector the user faces at full resolution, the others at low resolution for hazards only
+USER_REQUEST_FAILED = "Sorry I don't understand your query. Can you please try again?"  # one of the cached phrases
 
-def scene_camera_process(cam_index, queue):
+
+def user_request_failed(error: Exception, speech, talk_event) -> None:
+    """
+    Tells the user their question could not be answered, e.g. Gemini was unreachable, and stops
+    listening like an answer would
+    :param error: what the request failed with
+    :param speech: a SpeechWorker
+    :param talk_event: set while the user may talk
+    """
+    print(f"Answering the user failed: {error}")
+    speech.say(USER_REQUEST_FAILED, SPEECH_PRIORITY.USER_ANSWER, key="user")
+    talk_event.clear()
+
+
+def gaze_sector(direction: face_tracker.tracking.FACE_DIRECTION) -> int:
+    """
+    The scene sector the user faces
+    :param direction: the direction of the user's face
+    :return: 0 = left, 1 = forward, 2 = right (the indices of YOLO_test.YOLO.SECTORS), -1 if the face was not found
+    """
+    if direction == face_tracker.tracking.FACE_DIRECTION.INDETERMINATE:
+        return -1
+    if direction.value.startswith("left"):
+        return 0
+    if direction.value.startswith("right"):
+        return 2
+    return 1
+
+
+def open_camera(cam_index: int | ReplayCapture):
+    """
+    :param cam_index: the cam index, or a ReplayCapture to replay a recorded camera instead
+    :return: the capture to read the frames from
+    """
+    return cam_index if isinstance(cam_index, ReplayCapture) else cv2.VideoCapture(cam_index)
+
+
+def scene_detector(gate_stats=None) -> Detector:
+    """
+    The detector of the scene worker, with the tier, backend and tracking configured above
+    :param gate_stats: a FrameGate.shared_stats array the number of detected and skipped frames are published in
+    """
+    return Detector(tier_weights(detector_tier), backend=detector_backend,
+                    tracker=ObjectTracker(min_hits=track_confirm_frames, max_age=track_lost_frames),
+                    hazard_scorer=HazardScorer(), gate=FrameGate(stats=gate_stats), dist_threshold=dist_threshold)
+
+
+def scene_camera_process(cam_index, channel: LatestChannel, frame_ring: FrameRing, stats=None, gate_stats=None,
+                         gaze=None, recorder: FrameRecorder = None, show: bool = True, metrics: Metrics = None,
+                         make_detector: Callable[..., Detector] = scene_detector):
     """
     This function is run on a separate process forked from the main process
 
-    The intent is to capture the scene and returned the objects from yolo
+    The intent is to capture the scene and returned the objects from yolo.
+    The rgb frame is written into the shared frame ring, only its slot and sequence number go on the channel.
     :param cam_index: the cam index
-    :param queue: the queue object
+    :param channel: the scene channel
+    :param frame_ring: the shared memory ring the rgb frames are written into
+    :param stats: a FrameScheduler.shared_stats array the achieved fps and deadline misses are published in
+    :param gate_stats: a FrameGate.shared_stats array the number of detected and skipped frames are published in
+    :param gaze: the sector the user faces, see gaze_sector. Detection focuses on it when given
+    :param recorder: records the captured frames
+    :param show: shows the frames in a window
+    :param metrics: the metrics of the process, see metrics.SharedMetrics
+    :param make_detector: called with gate_stats to load the detector, a module level function so it can be pickled
     :return:
     """
-    capture = cv2.VideoCapture(cam_index)
+    metrics = metrics if metrics is not None else current()
+    install(metrics)
+    capture = open_camera(cam_index)
+    frame_h, frame_w = frame_ring.shape[:2]
+    capture.set(cv2.CAP_PROP_FRAME_WIDTH, frame_w)
+    capture.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_h)
     window_name = "Scene"
+    # loaded and warmed up once for the lifetime of the process. Static and motion blurred frames reuse
+    # the previous results instead of going through the model
+    detector = make_detector(gate_stats)
+    scheduler = FrameScheduler(frames_per_sec, stats=stats)
 
     while True:
         ret, frame = capture.read()
+        captured_at = time.time()
 
         if not ret:
             print("Failed to capture")
             break
-
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        objs = yolo_object_detection_v11(img_rgb)
-        queue.put(("scene", (objs, img_rgb)))
-
-        cv2.imshow(window_name, frame)
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-        time.sleep(1 / frames_per_sec)
+        if recorder is not None:
+            recorder.write(frame, captured_at)
+
+        if frame.shape[:2] != (frame_h, frame_w):
+            frame = cv2.resize(frame, (frame_w, frame_h))
+        img_rgb, slot, seq = frame_ring.slot_view()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=img_rgb)
+        frame_ring.commit(slot, seq)
+        metrics.inc("frames_total")
+        with metrics.span("detection_seconds"):
+            if gaze is not None:
+                objs = detector.detect_focused(img_rgb, gaze.value)
+            else:
+                objs = detector.detect(img_rgb)
+        if detector.timings["inference"] > 0:
+            metrics.observe("inference_seconds", detector.timings["inference"] / 1000)
+        else:
+            metrics.inc("detection_skipped_total")
+        # how late the frame was read (only known for a replay) and how long detection took, in milliseconds
+        timings = {"capture": getattr(capture, "late", 0.0) * 1000, "detection": detector.timings["total"],
+                   "sent_at": time.time()}
+        channel.put((objs, detector.hazards.tolist(), slot, seq, timings), timestamp=captured_at)
+
+        if show:
+            cv2.imshow(window_name, frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+        scheduler.wait(captured_at, dropped=channel.dropped)
+        metrics.set("fps", scheduler.fps)
+        metrics.set("deadline_misses_total", scheduler.misses)
+        metrics.set("dropped_total", channel.dropped)
 
     capture.release()
-    cv2.destroyWindow(window_name)
+    frame_ring.close()
+    if show:
+        cv2.destroyWindow(window_name)
 
 
-def user_camera_process(cam_index, queue):
+def user_camera_process(cam_index, channel: LatestChannel, stats=None, gaze=None, recorder: FrameRecorder = None,
+                        show: bool = True, metrics: Metrics = None):
     """
     This function is run on a separate process forked from the main process
 
     The intent is to capture the user's face direction
     :param cam_index: the cam index
-    :param queue: the queue object
+    :param channel: the user direction channel
+    :param stats: a FrameScheduler.shared_stats array the achieved fps and deadline misses are published in
+    :param gaze: set to the sector the user faces on every frame, for the scene worker to focus on
+    :param recorder: records the captured frames
+    :param show: shows the frames in a window
+    :param metrics: the metrics of the process, see metrics.SharedMetrics
     :return:
     """
-    capture = cv2.VideoCapture(cam_index)
+    metrics = metrics if metrics is not None else current()
+    install(metrics)
+    capture = open_camera(cam_index)
     window_name = "User"
-    face_tracker = Tracker(-30, 30, 165)
+    # only changes of the smoothed direction (and a heartbeat) are sent, not every frame
+    face_tracker = DirectionFilter(Tracker(-30, 30, 165, fast=True), hysteresis=5, heartbeat=1.0)
+    scheduler = FrameScheduler(user_frames_per_sec, stats=stats)
 
     while True:
         ret, frame = capture.read()
+        captured_at = time.time()
 
         if not ret:
             print("Failed to capture")
             break
+        if recorder is not None:
+            recorder.write(frame, captured_at)
 
         img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
-        direction, pitch, yaw, roll = face_tracker.predict_face_direction(img_rgb)
-        queue.put(("user", direction))
-
-        cv2.imshow(window_name, frame)
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+        metrics.inc("frames_total")
+        with metrics.span("face_seconds"):
+            direction = face_tracker.update(img_rgb, captured_at)
+        if direction is not None:
+            channel.put(direction, timestamp=captured_at)
+        if gaze is not None:
+            gaze.value = gaze_sector(face_tracker.direction)
+
+        if show:
+            cv2.imshow(window_name, frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+        scheduler.wait(captured_at, dropped=channel.dropped)
+        metrics.set("fps", scheduler.fps)
+        metrics.set("deadline_misses_total", scheduler.misses)
+        metrics.set("dropped_total", channel.dropped)
 
     capture.release()
-    cv2.destroyWindow(window_name)
+    if show:
+        cv2.destroyWindow(window_name)
 
 
-def main():
+def main(replay_dir: str = REPLAY_DIR, replay_realtime: bool = REPLAY_REALTIME, gemini_client=None, speech=None,
+         use_haptics: bool = USE_HAPTICS, interactive: bool = True,
+         face_direction: face_tracker.tracking.FACE_DIRECTION = None, duration: float = None,
+         trace: Callable[[str, float], None] = None, metrics_port: int | None = METRICS_PORT,
+         make_detector: Callable[..., Detector] = scene_detector):
+    """
+    Runs the whole pipeline until the duration is up, the replayed recording ends or it is interrupted.
+    The defaults run it live, benchmark.py replaces the services with local stand-ins.
+    :param replay_dir: directory of a recording to replay instead of the devices, see recording
+    :param replay_realtime: replay at the recorded pace, or as fast as the workers read
+    :param gemini_client: the genai client, see gemini_api.FakeGeminiClient to run without the network
+    :param speech: what to speak with, a started SpeechWorker by default (see audio_output.NullSpeechWorker)
+    :param use_haptics: drives the haptics hardware
+    :param interactive: shows the camera windows and listens to the keyboard
+    :param face_direction: a fixed face direction to use instead of the user camera
+    :param duration: seconds to run for, None runs until interrupted
+    :param trace: called with (stage, milliseconds) for the latency of every stage of an announcement
+    :param metrics_port: the port the Prometheus metrics are served on, None doesn't serve them
+    :param make_detector: loads the detector of the scene worker, see scene_detector
+    """
     # Initialize the face tracker
     current_objects = None
     history_objects = {"left": None, "forward": None, "right": None}
-    transcriber = Transcriber()
+    transcriber = Transcriber(gemini_client=gemini_client)
+    # reuses descriptions when we look back at a view we already described
+    describer = CachedDescriber(gemini_client)
+    trace = trace if trace is not None else (lambda stage, ms: None)
     ## Until the system announces any object, the direciton is None: after the first announcement, the direction is set to a dictionary
 
     # Initialize the serial port (haptics)
-    if USE_HAPTICS:
-        # ser = serial.Serial('/dev/tty.usbmodem1101', 9600,
-        #                     timeout=1)  # Change to your port (e.g., "/dev/ttyUSB0" for Linux)
-        ser = serial.Serial('COM3', 9600, timeout=1)  # Change to your port (e.g., "/dev/ttyUSB0" for Linux)
-        time.sleep(2)
-        
-        if ser.is_open:
-            print("Serial port opened successfully!")
-        else:
-            print("Failed to open serial port!")
-        ser.flush()
-
-    mp.set_start_method("spawn")
-    result_q = mp.Queue()
-
-    p1 = mp.Process(target=user_camera_process, args=(user_camera_i, result_q))
-    p2 = mp.Process(target=scene_camera_process, args=(scene_camera_i, result_q))
+    if use_haptics:
+        # haptics = HapticsController('/dev/tty.usbmodem1101', 9600)
+        haptics = HapticsController('COM3', 9600)  # Change to your port (e.g., "/dev/ttyUSB0" for Linux)
+
+    mp.set_start_method("spawn", force=True)
+    # one latest-value channel per producer, main always acts on the newest state
+    channels = ChannelSet(["scene", "user", "whisper"])
+    # gemini requests run in the background, a finished request wakes the loop up like a new message
+    gemini_requests = AsyncDescriber(on_done=channels.wake)
+    # speech runs on its own process, user answers interrupt scene descriptions
+    if speech is None:
+        speech = SpeechWorker()
+        speech.start()
+    scene_ring = FrameRing(scene_frame_shape, slots=scene_frame_slots)
+    # the rows of the scene frame each direction is described from
+    third = scene_frame_shape[0] // 3
+    scene_rows = {"left": slice(0, third), "forward": slice(third, 2 * third), "right": slice(2 * third, None)}
+
+    # each camera worker paces itself and publishes its achieved fps and deadline misses here
+    camera_stats = {"user": FrameScheduler.shared_stats(), "scene": FrameScheduler.shared_stats()}
+    gate_stats = FrameGate.shared_stats()  # how often the scene worker skipped detection
+    # the sector the user faces, written by the user worker and read by the scene worker on every frame
+    gaze = mp.Value("i", -1, lock=False) if USE_GAZE_FOCUS else None
 
     model = "base"
     mic_index = 1
     pause_threshold = 0.8
-    pause_event = mp.Event()
-    p3 = mp.Process(target=whisper_process, args=(result_q, pause_event, model, mic_index, pause_threshold))
-
-    p1.start()
-    p2.start()
-    p3.start()
+    talk_event = mp.Event()  # set while the user may talk, starts cleared
+
+    # every process writes its counters and timings into its own row, main aggregates them
+    shared_metrics = SharedMetrics(["main", "scene", "user", "whisper"])
+    main_metrics = shared_metrics.process("main")
+    install(main_metrics)
+    metrics_server = MetricsServer(shared_metrics, port=metrics_port) if metrics_port is not None else None
+
+    # the replay sources stand in for the devices, and the recorders record whatever the workers capture
+    user_source, scene_source, mic_source = user_camera_i, scene_camera_i, mic_index
+    if replay_dir is not None:
+        replay_clock = ReplayClock(replay_dir) if replay_realtime else None
+        scene_source = ReplayCapture(replay_dir, "scene", replay_clock)
+        # a recording without a user camera or a mic is replayed without those workers
+        has_stream = lambda name: os.path.exists(os.path.join(replay_dir, f"{name}.json"))
+        user_source = ReplayCapture(replay_dir, "user", replay_clock) if has_stream("user") else None
+        mic_source = ReplayMicrophone(replay_dir, "audio", replay_clock) if has_stream("audio") else None
+    if face_direction is not None:
+        user_source = None
+    recorders = {}
+    if RECORD_DIR is not None:
+        recorders = {"user": FrameRecorder(RECORD_DIR, "user"), "scene": FrameRecorder(RECORD_DIR, "scene"),
+                     "audio": AudioRecorder(RECORD_DIR, "audio")}
+
+    workers = []
+    if user_source is not None:
+        workers.append(mp.Process(target=user_camera_process,
+                                  args=(user_source, channels["user"], camera_stats["user"], gaze),
+                                  kwargs={"recorder": recorders.get("user"), "show": interactive,
+                                          "metrics": shared_metrics.process("user")}))
+    scene_worker = mp.Process(target=scene_camera_process,
+                              args=(scene_source, channels["scene"], scene_ring, camera_stats["scene"], gate_stats,
+                                    gaze),
+                              kwargs={"recorder": recorders.get("scene"), "show": interactive,
+                                      "metrics": shared_metrics.process("scene"), "make_detector": make_detector})
+    workers.append(scene_worker)
+    if mic_source is not None:
+        workers.append(mp.Process(target=whisper_process,
+                                  args=(channels["whisper"], talk_event, model, mic_source, pause_threshold),
+                                  kwargs={"recorder": recorders.get("audio"),
+                                          "metrics": shared_metrics.process("whisper"),
+                                          "compute_type": whisper_compute_type, "cpu_threads": whisper_cpu_threads,
+                                          "beam_size": whisper_beam_size, "streaming": STREAM_TRANSCRIPTION,
+                                          "pre_roll": whisper_pre_roll}))
+
+    for worker in workers:
+        worker.start()
     # Open the webcam feed from Camo (adjust the index if needed)
     # user_camera = cv2.VideoCapture(user_camera_i) # Index 0 is typically the built-in webcam
     # scene_camera = cv2.VideoCapture(scene_camera_i) # Index 1 is typically the Camo webcam, but this may vary
-    pause_event.set()
     flag = False
-    direction = face_tracker.tracking.FACE_DIRECTION.INDETERMINATE
+    direction = face_tracker.tracking.FACE_DIRECTION.INDETERMINATE if face_direction is None else face_direction
+    detected_objects_dict = None
+    detected_objects = None
+    hypothesis = None  # the newest transcription of what the user said
+    user_request = None  # (query, objects) of the newest user request
+    user_answer = None  # the answer to user_request, when it came back before the final transcription
+    user_query = None  # the final transcription, waiting for its answer
+    announced = {}  # speech key -> (request, capture time of its frame) of the newest announcement, until it starts
+    scene_requests = {}  # direction -> (capture time of the frame, submit time) of the pending description
+    started_at = time.time()
+    stats_printed_at = started_at
     while True:
-        if keyboard.is_pressed("a"):
+        if duration is not None and time.time() - started_at >= duration:
+            break
+        if replay_dir is not None and not scene_worker.is_alive() and \
+                not any(gemini_requests.pending(key) for key in scene_requests):
+            break  # the replay ended and everything it triggered was announced
+        if interactive and keyboard.is_pressed("a"):
             flag = True
-            pause_event.clear()
-        who, data = result_q.get()
-        # print(who)
-        if who == "scene":
-            detected_objects_dict, scene_image_rgb = data
-        elif who == "whisper":
-            text = data
-        else:
-            direction = data
-        if "detected_objects_dict" in locals() and "direction" in locals():
+            talk_event.set()
+        # the timeout keeps the keyboard responsive when no producer has anything new
+        channels.wait(timeout=0.1)
+        updates = channels.poll()
+        polled_at = time.time()
+        main_metrics.set("speech_queue_depth", speech.queue_depth)
+        main_metrics.set("speech_first_audio_seconds", speech.time_to_first_audio / 1000)
+        if polled_at - stats_printed_at >= STATS_INTERVAL:
+            print(shared_metrics.stats_line())
+            stats_printed_at = polled_at
+        if "scene" in updates:
+            # the frame stays in its ring slot, only what is handed to gemini is copied out, see FrameRing.copy
+            detected_objects_dict, hazards, scene_slot, scene_seq, scene_timings = updates["scene"].data
+            scene_captured_at = updates["scene"].timestamp
+            trace("capture", scene_timings["capture"])
+            trace("detection", scene_timings["detection"])
+            trace("ipc", (polled_at - scene_timings["sent_at"]) * 1000)
+        if "user" in updates:
+            direction = updates["user"].data
+        if "whisper" in updates:
+            hypothesis = updates["whisper"].data
+
+        # announce the gemini responses that came back since the last iteration
+        for request, response in gemini_requests.poll(return_exceptions=True):
+            if request == "user":
+                if user_request is None:
+                    continue  # the user said nothing in the end
+                if isinstance(response, Exception):
+                    if user_query != user_request[0]:
+                        user_request = user_answer = None  # a partial failed, the final transcription is asked anew
+                        continue
+                    user_request_failed(response, speech, talk_event)
+                    user_request = user_answer = user_query = None
+                    continue
+                if user_query != user_request[0]:
+                    user_answer = response  # answered a partial transcription, kept until the final one confirms it
+                    continue
+                speech.say(response, SPEECH_PRIORITY.USER_ANSWER, key="user")
+                transcriber.push_user_query(*user_request)
+                transcriber.push_system_response(response)
+                talk_event.clear()
+                user_request = user_answer = user_query = None
+                continue
+            if isinstance(response, Exception):
+                print(f"Request {request} failed: {response}")
+                continue
+            captured_at, submitted_at = scene_requests[request]
+            trace("llm", (time.time() - submitted_at) * 1000)
+            main_metrics.observe("gemini_seconds", time.time() - submitted_at)
+            if response.lower().strip() != "no changes detected." and not flag:
+                # a newer scene description replaces one that is still waiting to be spoken
+                announced["scene"] = (speech.say(response, SPEECH_PRIORITY.SCENE, key="scene"), captured_at)
+
+        # the speech stages are only known once the audio started, a few iterations after the say
+        for request, started_at in speech.started():
+            if request.key in announced and announced[request.key][0] == request:
+                _, captured_at = announced.pop(request.key)
+                trace("speech", (started_at - request.submitted_at) * 1000)
+                trace("end_to_end", (started_at - captured_at) * 1000)
+
+        if detected_objects_dict is not None and ("scene" in updates or "user" in updates or hypothesis is not None):
             # print(detected_objects_dict)
             # print(direction)
             # Perform object detection on the scene camera frame
@@ -164,7 +443,12 @@ def main():
             ##### CHECK FOR OBJECTS DETECTED and GENERATE THE CORRECT DESCRIPTION #####
             # 1st announcement for each direction: the objects are announced or "no objects detected"
             # 2nd announcement for each direction: the objects are announced or "no changes detected"
-            if detected_objects != current_objects:  # detected objects have changed
+            current_img = None
+            if current_direction is not None and detected_objects != current_objects:  # detected objects have changed
+                # img of the direction, copied as the frame slot is reused while the request runs. None when
+                # the worker lapped the ring while main was busy, a newer frame is then already on the channel
+                current_img = scene_ring.copy(scene_slot, scene_seq, scene_rows[current_direction])
+            if current_img is not None:
                 current_objects = detected_objects  # dict of objects with their frequency
                 objects_to_announce = detected_objects.copy()
 
@@ -197,64 +481,71 @@ def main():
                             objects_to_announce[obj] = f"{count}"
 
                 # print(f"Detected objects: {objects_to_announce}")
-                if current_direction == "left":
-                    current_img = scene_image_rgb[:scene_image_rgb.shape[0]//3, :, :]
-                elif current_direction == "right":
-                    current_img = scene_image_rgb[2 * scene_image_rgb.shape[0]//3:, :, :]
-                else:
-                    current_img = scene_image_rgb[scene_image_rgb.shape[0]//3:2*scene_image_rgb.shape[0]//3, :, :]
-
-                # img of the direction, dict of objects with their frequency but as strings
-                object_descriptions = gemini_image_description(current_img, objects_to_announce)
+                # img of the direction, dict of objects with their frequency but as strings.
+                # A newer request for the same direction supersedes this one
+                gemini_requests.submit(current_direction, describer.describe,
+                                       current_img, objects_to_announce, current_direction)
+                scene_requests[current_direction] = (scene_captured_at, time.time())
+                trace("diffing", (time.time() - polled_at) * 1000)
                 ## draw bounding boxes and labels on the scene camera frame
                 # for box in bounding_boxes:
                 #     x1, y1, x2, y2 = map(int, box)
                 #     # Draw a rectangle (bounding box)
                 #     cv2.rectangle(scene_camera_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
-                if object_descriptions.lower().strip() == "no changes detected.":
-                    continue
-                if not flag:
-                    text_to_speech(object_descriptions)
-
-            # Haptics object warning loop
-            if USE_HAPTICS:
-                if direction.value not in left_dir and "person" in detected_objects_left:
-                    ser.write(b'WARN: LEFT 200\n')
-                elif direction.value not in left_dir and "sports ball" in detected_objects_left:
-                    ser.write(b'WARN: LEFT 50\n')
-                elif direction.value in left_dir or ("person" not in detected_objects_left and 'sports ball' not in detected_objects_left):
-                    ser.write(b'WARN: LEFT 0\n')
-
-                if direction.value not in forward_dir and "person" in detected_objects_forward:
-                    ser.write(b'WARN: FORWARD 200\n')
-                elif direction.value not in forward_dir and "sports ball" in detected_objects_forward:
-                    ser.write(b'WARN: FORWARD 50\n')
-                elif direction.value in forward_dir or ("person" not in detected_objects_forward and 'sports ball' not in detected_objects_forward):
-                    ser.write(b'WARN: FORWARD 0\n')
-
-                if direction.value not in right_dir and "person" in detected_objects_right:
-                    ser.write(b'WARN: RIGHT 200\n')
-                elif direction.value not in right_dir and "sports ball" in detected_objects_right:
-                    ser.write(b'WARN: RIGHT 50\n')
-                elif direction.value in right_dir or ("person" not in detected_objects_right and 'sports ball' not in detected_objects_right):
-                    ser.write(b'WARN: RIGHT 0\n')
-            if "text" in locals() and flag:
-                flag = False
-                if not text:
+            # Haptics object warning loop, the intensities were scored in the scene process.
+            # The direction the user is facing is announced instead
+            if use_haptics:
+                pwm = [0 if direction.value in sector_dir else int(intensity)
+                       for sector_dir, intensity in zip((left_dir, forward_dir, right_dir), hazards)]
+                # only the channels that changed are written, on the controller's own thread
+                haptics.set(*pwm)
+            main_metrics.observe("loop_seconds", time.time() - polled_at)
+            if hypothesis is not None and flag:
+                query, final, stable = heard = hypothesis
+                hypothesis = None
+                if final:
+                    flag = False
+                    if not query:
+                        user_request = user_answer = None
+                        continue
+                    user_query = query
+                    if user_request is not None and user_request[0] == query and user_answer is not None:
+                        # the speculative answer was right, it is announced without waiting on Gemini again
+                        speech.say(user_answer, SPEECH_PRIORITY.USER_ANSWER, key="user")
+                        transcriber.push_user_query(*user_request)
+                        transcriber.push_system_response(user_answer)
+                        talk_event.clear()
+                        user_request = user_answer = user_query = None
+                        continue
+                elif not stable:
                     continue
-                transcriber.push_user_query(text, detected_objects_dict)
-                result = transcriber.get_gemini_user_response(scene_image_rgb)
-                text_to_speech(result)
-                pause_event.set()
-                del text
-
-            del direction, detected_objects_dict
-
-    p1.terminate()
-    p2.terminate()
-    p3.terminate()
-    # ser.close()
+                # a stable partial is answered speculatively, a final one only if it differs from that partial
+                if user_request is None or user_request[0] != query:
+                    scene_image_rgb = scene_ring.copy(scene_slot, scene_seq)
+                    if scene_image_rgb is None:
+                        # the slot was reused, the query is asked again with the newer frame on the channel
+                        hypothesis, flag = heard, True
+                        continue
+                    user_request = (query, detected_objects_dict)
+                    user_answer = None
+                    gemini_requests.submit("user", transcriber.answer, query, detected_objects_dict,
+                                           scene_image_rgb)
+
+    for name, stats in camera_stats.items():
+        print(name, FrameScheduler.read_stats(stats))
+    print("gate", FrameGate.read_stats(gate_stats))
+    print(shared_metrics.stats_line())
+    if metrics_server is not None:
+        metrics_server.close()
+    for worker in workers:
+        worker.terminate()
+    gemini_requests.shutdown()
+    speech.stop()
+    scene_ring.close()
+    scene_ring.unlink()
+    if use_haptics:
+        haptics.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,246 @@
+import multiprocessing as mp
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable
+import numpy as np
+
+PREFIX = "seeforme"
+# name -> (type, help). Every process shares this schema, a process only writes the metrics it knows about.
+# Spans are Prometheus summaries in seconds (count, sum) plus the slowest one as <name>_max
+METRICS = {
+    "frames_total": ("counter", "Frames captured"),
+    "fps": ("gauge", "Frames per second achieved by the worker"),
+    "deadline_misses_total": ("counter", "Frames that took longer than their budget"),
+    "dropped_total": ("counter", "Values overwritten on the worker's channel before main read them"),
+    "detection_skipped_total": ("counter", "Frames the gate skipped detection on"),
+    "detection_seconds": ("summary", "Time to detect the objects of a frame, including pre and post processing"),
+    "inference_seconds": ("summary", "Time spent in the detection model"),
+    "face_seconds": ("summary", "Time to estimate the face direction of a frame"),
+    "listen_seconds": ("summary", "Time spent listening for a phrase"),
+    "transcription_seconds": ("summary", "Time to transcribe a phrase"),
+    "loop_seconds": ("summary", "Time main spends handling an update"),
+    "gemini_seconds": ("summary", "Time from submitting a Gemini request to collecting its response"),
+    "speech_queue_depth": ("gauge", "Utterances waiting to be spoken"),
+    "speech_first_audio_seconds": ("gauge", "Time from queueing the last utterance to its audio starting"),
+}
+_NAMES = list(METRICS)
+_INDEX = {name: i for i, name in enumerate(_NAMES)}
+_FIELDS = 3  # value (or count), sum, max
+
+
+class _Span:
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._metrics.observe(self._name, time.perf_counter() - self._start)
+
+
+class Metrics:
+    """
+    The metrics written by one process, a row of a SharedMetrics. Each process is the only writer of
+    its row, so the writes take no lock and cost about as much as a dict lookup.
+
+    >>> metrics = SharedMetrics(["scene"]).process("scene")
+    >>> metrics.inc("frames_total")
+    >>> with metrics.span("detection_seconds"):
+    ...     pass
+    >>> metrics.get("frames_total")[0], metrics.get("detection_seconds")[0]
+    (1.0, 1.0)
+    """
+    def __init__(self, array, row: int):
+        """
+        :param array: the shared array of a SharedMetrics
+        :param row: the row of the process
+        """
+        self._array = array
+        self._row = row
+        self._values = np.frombuffer(array, dtype=np.float64).reshape(-1, len(_NAMES), _FIELDS)[row]
+
+    def __getstate__(self):
+        # the array is inherited by a spawned process, the view into it is rebuilt there
+        return {"array": self._array, "row": self._row}
+
+    def __setstate__(self, state):
+        self.__init__(state["array"], state["row"])
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """
+        Adds to a counter
+        """
+        self._values[_INDEX[name], 0] += value
+
+    def set(self, name: str, value: float) -> None:
+        """
+        Sets a gauge, or a counter that is kept somewhere else (e.g. LatestChannel.dropped)
+        """
+        self._values[_INDEX[name], 0] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Records the duration of a span
+        """
+        values = self._values[_INDEX[name]]
+        values[0] += 1
+        values[1] += seconds
+        if seconds > values[2]:
+            values[2] = seconds
+
+    def span(self, name: str) -> _Span:
+        """
+        Times the block of a with statement
+        """
+        return _Span(self, name)
+
+    def get(self, name: str) -> tuple:
+        """
+        :return: the (value or count, sum, max) of a metric
+        """
+        return tuple(float(value) for value in self._values[_INDEX[name]])
+
+
+class SharedMetrics:
+    """
+    Metrics in shared memory with one row per process. Pass process(name) to the worker of that
+    name, and read them all from main with snapshot, stats_line or prometheus.
+    """
+    def __init__(self, processes: Iterable[str]):
+        """
+        :param processes: the names of the processes writing metrics
+        """
+        self._processes = list(processes)
+        self._array = mp.RawArray("d", len(self._processes) * len(_NAMES) * _FIELDS)
+        self._values = np.frombuffer(self._array, dtype=np.float64).reshape(len(self._processes), len(_NAMES), _FIELDS)
+
+    def process(self, name: str) -> Metrics:
+        """
+        :param name: the name of a process
+        :return: the metrics of that process
+        """
+        return Metrics(self._array, self._processes.index(name))
+
+    def snapshot(self) -> Dict[str, Dict[str, tuple]]:
+        """
+        :return: process -> metric -> (value or count, sum, max), for the metrics the process wrote
+        """
+        values = self._values.copy()
+        return {process: {name: tuple(float(value) for value in values[row, i])
+                          for i, name in enumerate(_NAMES) if values[row, i].any()}
+                for row, process in enumerate(self._processes)}
+
+    def stats_line(self, snapshot: Dict[str, Dict[str, tuple]] = None) -> str:
+        """
+        :return: a one line summary: the fps and dropped values of each worker, and the mean of each span in ms
+        """
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        parts = []
+        for process, metrics in snapshot.items():
+            fields = []
+            for name, (value, total, _) in metrics.items():
+                kind = METRICS[name][0]
+                short = name.replace("_seconds", "").replace("_total", "")
+                if kind == "summary":
+                    fields.append(f"{short} {total / value * 1000:.0f}ms")
+                elif name in ("fps", "speech_queue_depth", "dropped_total", "deadline_misses_total",
+                              "detection_skipped_total"):
+                    fields.append(f"{short} {value:.3g}")
+            if fields:
+                parts.append(f"{process}: " + " ".join(fields))
+        return " | ".join(parts)
+
+    def prometheus(self) -> str:
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            samples = [(process, metrics[name]) for process, metrics in snapshot.items() if name in metrics]
+            if not samples:
+                continue
+            lines.append(f"# HELP {PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for process, (value, total, maximum) in samples:
+                label = f'{{process="{process}"}}'
+                if kind == "summary":
+                    lines.append(f"{PREFIX}_{name}_count{label} {value:g}")
+                    lines.append(f"{PREFIX}_{name}_sum{label} {total:g}")
+                else:
+                    lines.append(f"{PREFIX}_{name}{label} {value:g}")
+            if kind == "summary":
+                lines.append(f"# TYPE {PREFIX}_{name}_max gauge")
+                lines.extend(f'{PREFIX}_{name}_max{{process="{process}"}} {maximum:g}'
+                             for process, (_, _, maximum) in samples)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves SharedMetrics.prometheus on http://host:port/metrics from a background thread.
+
+    >>> server = MetricsServer(SharedMetrics(["main"]), port=0)
+    >>> server.port > 0
+    True
+    >>> server.close()
+    """
+    def __init__(self, metrics: SharedMetrics, host: str = "127.0.0.1", port: int = 9100):
+        """
+        :param metrics: the metrics to serve
+        :param host: the address to listen on, local only by default
+        :param port: the port to listen on, 0 picks a free one
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # a scrape every few seconds would flood the console
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_current = None
+
+
+def install(metrics: Metrics) -> None:
+    """
+    Makes the metrics the ones current() returns in this process
+    """
+    global _current
+    _current = metrics
+
+
+def current() -> Metrics:
+    """
+    :return: the metrics installed in this process, or metrics nobody reads if none were installed
+    """
+    global _current
+    if _current is None:
+        _current = SharedMetrics(["local"]).process("local")
+    return _current
@@ -0,0 +1,410 @@
+import glob
+import json
+import multiprocessing as mp
+import os
+import time
+from typing import Tuple
+import cv2
+import numpy as np
+import speech_recognition as sr
+
+# A recording is a directory with, per stream (e.g. "scene", "user", "audio"):
+#   <name>.json   the format of the stream, written with the first frame or chunk
+#   <name>.raw    the frames (or PCM samples) back to back, memory-mapped on replay
+#   <name>.ts     float64 index, one capture timestamp per frame. For audio, one (timestamp, end sample) pair per chunk
+# Every write is flushed, so a worker that is terminated leaves a readable recording behind.
+
+
+def _paths(path: str, name: str) -> Tuple[str, str, str]:
+    return tuple(os.path.join(path, f"{name}.{extension}") for extension in ("json", "raw", "ts"))
+
+
+class FrameRecorder:
+    """
+    Appends the frames of one camera to a recording, see ReplayCapture.
+
+    The file is only opened on the first write, so a recorder can be created in main and passed to
+    the worker process that captures the frames.
+    """
+    def __init__(self, path: str, name: str):
+        """
+        :param path: the directory of the recording
+        :param name: the name of the stream, e.g. "scene"
+        """
+        self._path = path
+        self._name = name
+        self._shape = None
+        self._raw = None
+        self._index = None
+
+    def __getstate__(self):
+        return {"path": self._path, "name": self._name}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["name"])
+
+    def write(self, frame: np.ndarray, timestamp: float = None) -> None:
+        """
+        :param frame: the frame as captured, every frame of a stream must have the same shape
+        :param timestamp: the capture time of the frame, defaults to now
+        :return: None
+        """
+        if self._raw is None:
+            os.makedirs(self._path, exist_ok=True)
+            meta, raw, index = _paths(self._path, self._name)
+            with open(meta, "w") as f:
+                json.dump({"kind": "video", "shape": list(frame.shape), "dtype": frame.dtype.str}, f)
+            self._shape = frame.shape
+            self._raw = open(raw, "wb")
+            self._index = open(index, "wb")
+        if frame.shape != self._shape:
+            raise ValueError(f"The frame is {frame.shape}, the frames of stream {self._name} are {self._shape}")
+
+        self._raw.write(np.ascontiguousarray(frame).data)
+        self._raw.flush()
+        self._index.write(np.float64(time.time() if timestamp is None else timestamp).tobytes())
+        self._index.flush()
+
+    def close(self) -> None:
+        if self._raw is not None:
+            self._raw.close()
+            self._index.close()
+
+
+class AudioRecorder:
+    """
+    Appends the PCM chunks of one microphone to a recording, see ReplayMicrophone.
+    """
+    def __init__(self, path: str, name: str = "audio"):
+        """
+        :param path: the directory of the recording
+        :param name: the name of the stream
+        """
+        self._path = path
+        self._name = name
+        self._raw = None
+        self._index = None
+        self._frame_bytes = None
+        self._samples = 0
+
+    def __getstate__(self):
+        return {"path": self._path, "name": self._name}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["name"])
+
+    def write(self, pcm: bytes, sample_rate: int, sample_width: int, channels: int = 1, timestamp: float = None) -> None:
+        """
+        :param pcm: the interleaved samples of the chunk
+        :param sample_rate: samples per second
+        :param sample_width: bytes per sample
+        :param channels: the number of channels
+        :param timestamp: the time the chunk was read, defaults to now
+        :return: None
+        """
+        if self._raw is None:
+            os.makedirs(self._path, exist_ok=True)
+            meta, raw, index = _paths(self._path, self._name)
+            with open(meta, "w") as f:
+                json.dump({"kind": "audio", "sample_rate": sample_rate, "sample_width": sample_width,
+                           "channels": channels}, f)
+            self._frame_bytes = sample_width * channels
+            self._raw = open(raw, "wb")
+            self._index = open(index, "wb")
+
+        self._raw.write(pcm)
+        self._raw.flush()
+        self._samples += len(pcm) // self._frame_bytes
+        timestamp = time.time() if timestamp is None else timestamp
+        self._index.write(np.array([timestamp, self._samples], dtype=np.float64).tobytes())
+        self._index.flush()
+
+    def close(self) -> None:
+        if self._raw is not None:
+            self._raw.close()
+            self._index.close()
+
+
+class _RecordingStream:
+    def __init__(self, stream, recorder: AudioRecorder, source: sr.AudioSource):
+        self._stream = stream
+        self._recorder = recorder
+        self._source = source
+
+    def read(self, size: int) -> bytes:
+        pcm = self._stream.read(size)
+        if len(pcm) > 0:
+            self._recorder.write(pcm, self._source.SAMPLE_RATE, self._source.SAMPLE_WIDTH)
+        return pcm
+
+
+class RecordingSource(sr.AudioSource):
+    """
+    Wraps an audio source (e.g. a sr.Microphone) and records everything read from it.
+
+    >>> with RecordingSource(sr.Microphone(), AudioRecorder("recordings/kitchen")) as source:  # doctest: +SKIP
+    ...     audio = sr.Recognizer().listen(source)
+    """
+    def __init__(self, source: sr.AudioSource, recorder: AudioRecorder):
+        """
+        :param source: the source to record
+        :param recorder: the recorder the chunks are written to
+        """
+        self._source = source
+        self._recorder = recorder
+        self.SAMPLE_RATE = source.SAMPLE_RATE
+        self.SAMPLE_WIDTH = source.SAMPLE_WIDTH
+        self.CHUNK = source.CHUNK
+        self.stream = None
+
+    def __enter__(self):
+        self._source.__enter__()
+        self.stream = _RecordingStream(self._source.stream, self._recorder, self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+        return self._source.__exit__(exc_type, exc_value, traceback)
+
+
+class ReplayClock:
+    """
+    The pace of a real time replay, shared by the replay sources of a recording across processes.
+
+    The replay starts when the first source reads from it, and from then on every source returns
+    what was recorded at the same time, so the streams stay in sync like live devices would.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: the directory of the recording
+        """
+        origins = []
+        for meta in glob.glob(os.path.join(path, "*.json")):
+            index = np.fromfile(meta[:-len(".json")] + ".ts", dtype=np.float64, count=1)
+            origins.extend(index)
+        if len(origins) == 0:
+            raise FileNotFoundError(f"There is no recording in {path}")
+        self._origin = min(origins)
+        self._start = mp.Value("d", 0.0)
+
+    def start(self) -> None:
+        """
+        Starts the replay, if no source started it yet
+        """
+        with self._start.get_lock():
+            if self._start.value == 0.0:
+                self._start.value = time.time()
+
+    def now(self) -> float:
+        """
+        :return: the recorded time being replayed right now
+        """
+        self.start()
+        return self._origin + time.time() - self._start.value
+
+    def wait_until(self, timestamp: float) -> None:
+        """
+        Sleeps until the recorded time is replayed
+        :param timestamp: a recorded time
+        :return: None
+        """
+        remaining = timestamp - self.now()
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+class ReplayCapture:
+    """
+    Replays a recorded camera with the interface of cv2.VideoCapture, so it can be passed to the
+    camera workers instead of a device index. The frames are read-only views into the memory-mapped
+    recording.
+
+    With a ReplayClock the frames are replayed at the recorded pace, and like a live camera read
+    returns the newest frame, skipping the ones a slow reader missed. Without one every frame is
+    returned in order, as fast as it is read.
+
+    >>> capture = ReplayCapture("recordings/kitchen", "scene", ReplayClock("recordings/kitchen"))  # doctest: +SKIP
+    >>> ret, frame = capture.read()  # doctest: +SKIP
+    """
+    def __init__(self, path: str, name: str, clock: ReplayClock = None):
+        """
+        :param path: the directory of the recording
+        :param name: the name of the stream, e.g. "scene"
+        :param clock: the pace to replay at, None replays as fast as possible
+        """
+        self._path = path
+        self._name = name
+        self._clock = clock
+        meta, raw, index = _paths(path, name)
+        with open(meta) as f:
+            meta = json.load(f)
+        shape = tuple(meta["shape"])
+        dtype = np.dtype(meta["dtype"])
+        self._timestamps = np.fromfile(index, dtype=np.float64)
+        frames = min(len(self._timestamps), os.path.getsize(raw) // (int(np.prod(shape)) * dtype.itemsize))
+        self._timestamps = self._timestamps[:frames]
+        self._frames = np.memmap(raw, dtype=dtype, mode="r", shape=(frames, *shape)) if frames > 0 else None
+        self._next = 0
+        self._position = -1
+        self._skipped = 0
+        self._late = 0.0
+
+    def __getstate__(self):
+        # the memory map is reopened by the worker process
+        return {"path": self._path, "name": self._name, "clock": self._clock}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["name"], state["clock"])
+
+    def read(self) -> Tuple[bool, np.ndarray | None]:
+        """
+        :return: (True, the next frame), or (False, None) at the end of the recording
+        """
+        if self._next >= len(self._timestamps):
+            return False, None
+
+        position = self._next
+        if self._clock is not None:
+            # the newest frame recorded by now, waiting for the next one if it was already read
+            position = max(position, int(np.searchsorted(self._timestamps, self._clock.now(), side="right")) - 1)
+            self._clock.wait_until(self._timestamps[position])
+            self._late = max(self._clock.now() - self._timestamps[position], 0.0)
+        self._skipped += position - self._next
+        self._position = position
+        self._next = position + 1
+        return True, np.asarray(self._frames[position])
+
+    def isOpened(self) -> bool:
+        return self._frames is not None
+
+    def set(self, prop: int, value: float) -> bool:
+        # the recorded frames can't be changed
+        return False
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self._frames.shape[2]) if self._frames is not None else 0.0
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self._frames.shape[1]) if self._frames is not None else 0.0
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self._timestamps))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._next)
+        if prop == cv2.CAP_PROP_FPS and len(self._timestamps) > 1:
+            return (len(self._timestamps) - 1) / (self._timestamps[-1] - self._timestamps[0])
+        return 0.0
+
+    def release(self) -> None:
+        self._frames = None
+        self._timestamps = self._timestamps[:0]
+
+    @property
+    def timestamp(self) -> float:
+        """
+        The recorded capture time of the last frame read
+        """
+        return float(self._timestamps[self._position]) if self._position >= 0 else 0.0
+
+    @property
+    def late(self) -> float:
+        """
+        Seconds the last frame was read after it was replayed, always 0 without a clock
+        """
+        return self._late
+
+    @property
+    def skipped(self) -> int:
+        """
+        The number of frames skipped because they were read too late
+        """
+        return self._skipped
+
+
+class _ReplayStream:
+    def __init__(self, microphone: "ReplayMicrophone"):
+        self._microphone = microphone
+
+    def read(self, size: int) -> bytes:
+        return self._microphone.read(size)
+
+
+class ReplayMicrophone(sr.AudioSource):
+    """
+    Replays a recorded microphone as a speech_recognition audio source, so it can be passed to
+    whisper_process instead of a microphone index. Reads return b"" at the end of the recording,
+    which ends sr.Recognizer.listen like the end of an audio file.
+
+    With a ReplayClock a chunk is only returned once it was recorded, so listening takes as long as
+    it did live. Without one the chunks are returned as fast as they are read.
+    """
+    def __init__(self, path: str, name: str = "audio", clock: ReplayClock = None, chunk_size: int = 1024):
+        """
+        :param path: the directory of the recording
+        :param name: the name of the stream
+        :param clock: the pace to replay at, None replays as fast as possible
+        :param chunk_size: the number of samples per read of sr.Recognizer
+        """
+        self._path = path
+        self._name = name
+        self._clock = clock
+        meta, raw, index = _paths(path, name)
+        with open(meta) as f:
+            meta = json.load(f)
+        self.SAMPLE_RATE = meta["sample_rate"]
+        self.SAMPLE_WIDTH = meta["sample_width"]
+        self.CHUNK = chunk_size
+        self.stream = None
+        self._frame_bytes = meta["sample_width"] * meta["channels"]
+
+        index = np.fromfile(index, dtype=np.float64).reshape(-1, 2)
+        self._timestamps, self._ends = index[:, 0], index[:, 1]
+        self._pcm = np.memmap(raw, dtype=np.uint8, mode="r") if os.path.getsize(raw) > 0 else np.zeros(0, np.uint8)
+        self._samples = min(len(self._pcm) // self._frame_bytes, int(self._ends[-1]) if len(self._ends) else 0)
+        self._position = 0
+
+    def __getstate__(self):
+        return {"path": self._path, "name": self._name, "clock": self._clock, "chunk_size": self.CHUNK}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["name"], state["clock"], state["chunk_size"])
+
+    def __enter__(self):
+        self.stream = _ReplayStream(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+
+    def read(self, size: int) -> bytes:
+        """
+        :param size: the number of samples to read
+        :return: the interleaved samples, b"" at the end of the recording
+        """
+        end = min(self._position + size, self._samples)
+        if end <= self._position:
+            return b""
+        if self._clock is not None:
+            # the time the chunk holding the last sample was read while recording
+            self._clock.wait_until(np.interp(end, self._ends, self._timestamps))
+        pcm = self._pcm[self._position * self._frame_bytes:end * self._frame_bytes].tobytes()
+        self._position = end
+        return pcm
+
+    def rewind(self, seconds: float) -> None:
+        """
+        Continues reading from seconds before the audio being replayed right now, like
+        capture.MicrophoneCapture.rewind. Without a ReplayClock there is no now to go back from, and
+        the reading just continues
+        :param seconds: the pre-roll
+        """
+        if self._clock is None or len(self._ends) == 0:
+            return
+        position = np.interp(self._clock.now() - seconds, self._timestamps, self._ends, left=0)
+        self._position = int(min(position, self._samples))
+
+    @property
+    def finished(self) -> bool:
+        """
+        Whether the whole recording was read
+        """
+        return self._position >= self._samples
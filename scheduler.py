@@ -0,0 +1,135 @@
+import multiprocessing as mp
+import time
+from typing import Callable, Dict
+
+# the fields of the shared stats array, in order
+STATS_FIELDS = ("fps", "target_fps", "frames", "misses")
+
+
+class FrameScheduler:
+    """
+    Paces a camera worker to a frame budget measured from the capture timestamps.
+
+    The next frame is due 1 / fps after the capture of the current one, so the time spent processing
+    the frame is part of the budget. A frame that is already late does not sleep at all and counts as
+    a deadline miss. When the consumer is behind (the channel dropped values since the last frame)
+    the rate is lowered, and it recovers towards the target once the consumer keeps up again.
+
+    >>> now = [0.0]
+    >>> scheduler = FrameScheduler(10, clock=lambda: now[0], sleep=lambda s: now.__setitem__(0, now[0] + s))
+    >>> now[0] = 0.03  # processing the frame captured at 0.0 took 30 ms
+    >>> scheduler.wait(captured_at=0.0)
+    >>> now[0]
+    0.1
+    >>> now[0] = 0.25  # this one took 150 ms, so the next frame is captured right away
+    >>> scheduler.wait(captured_at=0.1)
+    >>> now[0], scheduler.misses
+    (0.25, 1)
+    >>> scheduler.wait(captured_at=0.25, dropped=1)  # the consumer missed a frame
+    >>> scheduler.target_fps
+    8.0
+    """
+    def __init__(self, fps: float, min_fps: float = 1.0, backoff: float = 0.8, recovery: float = 1.05,
+                 recovery_frames: int = 10, stats: mp.Array = None, clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        :param fps: the target frame rate
+        :param min_fps: the rate is never lowered below this
+        :param backoff: the rate is multiplied by this when the consumer is behind
+        :param recovery: the rate is multiplied by this (up to fps) after recovery_frames frames without drops
+        :param recovery_frames: frames the consumer has to keep up for before the rate goes up again
+        :param stats: an array from shared_stats the stats are published in, for another process to read
+        :param clock: the clock the capture timestamps come from
+        :param sleep: the sleep function
+        """
+        self._fps = fps
+        self._min_fps = min(min_fps, fps)
+        self._backoff = backoff
+        self._recovery = recovery
+        self._recovery_frames = recovery_frames
+        self._stats = stats
+        self._clock = clock
+        self._sleep = sleep
+
+        self._target_fps = fps
+        self._dropped = 0
+        self._keeping_up = 0
+        self._last_capture = None
+        self._achieved_fps = 0.0
+        self._frames = 0
+        self._misses = 0
+
+    @staticmethod
+    def shared_stats() -> mp.Array:
+        """
+        :return: a shared array to pass to a FrameScheduler in a worker process, see read_stats
+        """
+        return mp.Array("d", len(STATS_FIELDS))
+
+    @staticmethod
+    def read_stats(stats: mp.Array) -> Dict[str, float]:
+        """
+        :param stats: an array from shared_stats
+        :return: the stats published in the array
+        """
+        with stats.get_lock():
+            return dict(zip(STATS_FIELDS, stats[:]))
+
+    def wait(self, captured_at: float, dropped: int = None) -> None:
+        """
+        Sleeps until the next frame is due, call it once the frame captured at captured_at is processed
+        :param captured_at: the capture time of the frame that was just processed
+        :param dropped: the total number of values the consumer dropped so far, e.g. LatestChannel.dropped
+        :return: None
+        """
+        self._frames += 1
+        if self._last_capture is not None and captured_at > self._last_capture:
+            # exponential moving average of the rate the frames were actually captured at
+            fps = 1 / (captured_at - self._last_capture)
+            self._achieved_fps = fps if self._frames == 2 else 0.9 * self._achieved_fps + 0.1 * fps
+        self._last_capture = captured_at
+
+        if dropped is not None:
+            if dropped > self._dropped:
+                self._target_fps = max(self._min_fps, self._target_fps * self._backoff)
+                self._keeping_up = 0
+            else:
+                self._keeping_up += 1
+                if self._keeping_up >= self._recovery_frames and self._target_fps < self._fps:
+                    self._target_fps = min(self._fps, self._target_fps * self._recovery)
+                    self._keeping_up = 0
+            self._dropped = dropped
+
+        remaining = captured_at + 1 / self._target_fps - self._clock()
+        if remaining > 0:
+            self._sleep(remaining)
+        else:
+            self._misses += 1
+        self._publish()
+
+    def _publish(self) -> None:
+        if self._stats is None:
+            return
+        with self._stats.get_lock():
+            self._stats[:] = [self._achieved_fps, self._target_fps, self._frames, self._misses]
+
+    @property
+    def fps(self) -> float:
+        """
+        The rate the frames were actually captured at
+        """
+        return self._achieved_fps
+
+    @property
+    def target_fps(self) -> float:
+        """
+        The rate currently aimed for, lower than the configured one while the consumer is behind
+        """
+        return self._target_fps
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of frames that took longer than their budget
+        """
+        return self._misses
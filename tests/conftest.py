@@ -0,0 +1,45 @@
+import os
+import sys
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the gemini modules create a client when they are imported, the tests pass fake ones instead
+os.environ.setdefault("GEMINI_KEY", "unused")
+
+
+class StubModel:
+    """
+    Stands in for an ultralytics YOLO model: returns the same boxes (in letterbox coordinates) for every input.
+    Like the predictor of ultralytics 8.3, the keyword arguments of a call stick for the next calls
+    """
+    names = {0: "person", 56: "chair", 60: "dining table"}
+
+    def __init__(self, boxes=()):
+        """
+        :param boxes: (x1, y1, x2, y2, conf, class id) rows returned for every input
+        """
+        self.boxes = np.array(boxes, dtype=np.float32).reshape(-1, 6)
+        self.calls = []
+        self.args = {}  # the arguments merged over all the calls, see ultralytics.engine.model.Model.predict
+
+    def __call__(self, inputs, **kwargs):
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        self.calls.append([np.array(model_input) for model_input in inputs])
+        self.args.update(kwargs)
+        classes = self.args.get("classes")
+        boxes = self.boxes if classes is None else self.boxes[np.isin(self.boxes[:, 5], classes)]
+        data = SimpleNamespace(cpu=lambda: SimpleNamespace(numpy=lambda: boxes.copy()))
+        return [SimpleNamespace(boxes=SimpleNamespace(data=data), names=self.names) for _ in inputs]
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    """
+    Makes Detector load a StubModel without boxes, set its boxes attribute to detect something
+    """
+    from YOLO_test import YOLO
+    model = StubModel()
+    monkeypatch.setattr(YOLO, "load_model", lambda weights, backend="torch", imgsz=640: model)
+    return model
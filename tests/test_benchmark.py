@@ -0,0 +1,30 @@
+from unittest import mock
+import pytest
+from conftest import StubModel
+from YOLO_test import YOLO
+from YOLO_test.gate import FrameGate
+from YOLO_test.hazards import HazardScorer
+from YOLO_test.tracker import ObjectTracker
+
+try:
+    import benchmark
+except (ImportError, OSError) as e:  # the audio stack isn't installed, or the PortAudio library is not
+    pytest.skip(f"the audio stack can't load: {e}", allow_module_level=True)
+
+
+def stub_detector(gate_stats=None) -> YOLO.Detector:
+    """
+    Loaded in the scene worker in place of main.scene_detector. The worker is spawned, so the model is
+    stubbed in there rather than with the stub_model fixture
+    """
+    # a chair in the forward sector of the 640 letterbox
+    model = StubModel([[280, 300, 360, 420, 0.9, 56]])
+    with mock.patch.object(YOLO, "load_model", lambda weights, backend="torch", imgsz=640: model):
+        return YOLO.Detector(tracker=ObjectTracker(), hazard_scorer=HazardScorer(), gate=FrameGate(stats=gate_stats))
+
+
+def test_run_announces_the_scene():
+    results = benchmark.run(llm_latency=0.05, duration=8.0, seconds=8.0, make_detector=stub_detector)
+    assert results["announcements"] > 0
+    assert results["gemini_requests"] > 0
+    assert results["stages"]["end_to_end"]["count"] > 0
@@ -0,0 +1,50 @@
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+try:
+    from transcription.capture import AudioRing
+except OSError as e:  # sounddevice is installed but the PortAudio library is not
+    pytest.skip(f"sounddevice can't load: {e}", allow_module_level=True)
+
+
+def test_ring_read_skips_overwritten_samples():
+    ring = AudioRing(4)
+    ring.write(np.arange(6, dtype=np.int16))
+    samples, position = ring.read(0, 2)
+    assert samples.tolist() == [2, 3] and position == 4
+
+
+def test_ring_reads_are_never_torn_by_a_concurrent_write():
+    # every sample is its own position, so a sample overwritten while it was copied shows up as a gap
+    ring = AudioRing(1024, dtype=np.int64)
+    chunks = 2000
+    writer = threading.Thread(target=lambda: [ring.write(np.arange(i * 256, (i + 1) * 256)) for i in range(chunks)])
+    writer.start()
+    while writer.is_alive():
+        # the oldest samples kept are the ones the writer overwrites next
+        samples, end = ring.read(max(ring.written - 1024, 0), 1024, timeout=0.01)
+        assert np.array_equal(samples, np.arange(end - len(samples), end))
+    writer.join()
+
+
+def test_capture_records_every_chunk_with_its_capture_time(tmp_path, monkeypatch):
+    from transcription import capture
+    from recording import AudioRecorder, ReplayMicrophone
+
+    monkeypatch.setattr(capture.time, "time", lambda: 1000.0)
+    mic = capture.MicrophoneCapture(chunk_size=4, recorder=AudioRecorder(str(tmp_path)))
+    mic._recording = threading.Thread(target=mic._record)
+    mic._recording.start()
+    # 0.25 s of input latency, the last sample of the 4 sample chunk was captured 0.25 s - 4 / 16000 s ago
+    time_info = SimpleNamespace(currentTime=10.25, inputBufferAdcTime=10.0)
+    for i in range(3):
+        mic._callback(np.arange(i * 4, (i + 1) * 4, dtype=np.int16).reshape(-1, 1), 4, time_info, None)
+    mic._recorded.put(None)
+    mic._recording.join()
+
+    with ReplayMicrophone(str(tmp_path)) as source:
+        assert np.frombuffer(source.stream.read(12), dtype=np.int16).tolist() == list(range(12))
+    timestamps = np.fromfile(tmp_path / "audio.ts", dtype=np.float64).reshape(-1, 2)[:, 0]
+    np.testing.assert_allclose(timestamps, 1000.0 - (0.25 - 4 / 16000))
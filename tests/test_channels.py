@@ -0,0 +1,61 @@
+import multiprocessing as mp
+import pytest
+from channels import ChannelSet, LatestChannel
+
+
+def produce(channel: LatestChannel, count: int) -> None:
+    for i in range(count):
+        channel.put(i, timestamp=float(i))
+
+
+def test_latest_value_wins_across_processes():
+    channel = LatestChannel("scene")
+    producer = mp.Process(target=produce, args=(channel, 100))
+    producer.start()
+    producer.join(timeout=30)
+    message = channel.get()
+    assert message.data == 99 and message.seq == 99 and message.timestamp == 99.0
+    assert channel.get() is None
+    assert channel.dropped == 99  # none of the others were read
+
+
+def test_dropped_counts_only_unread_values():
+    channel = LatestChannel("user")
+    channel.put("left")
+    assert channel.get().data == "left"
+    channel.put("forward")  # read before the next put, not dropped
+    assert channel.get().data == "forward"
+    channel.put("right")
+    channel.put("left")
+    assert channel.dropped == 1
+    assert channel.get().data == "left"
+
+
+def test_values_larger_than_the_capacity_are_refused():
+    channel = LatestChannel("scene", capacity=64)
+    with pytest.raises(ValueError):
+        channel.put(b"x" * 100)
+    assert channel.get() is None
+
+
+def test_wait_wakes_on_put_and_on_wake():
+    channels = ChannelSet(["scene", "user"])
+    assert not channels.wait(timeout=0.01)
+    channels["scene"].put({"forward": {}})
+    assert channels.wait(timeout=1)
+    assert not channels.wait(timeout=0.01)  # the event was cleared
+    assert list(channels.poll()) == ["scene"]
+    assert channels.poll() == {}
+    channels.wake()
+    assert channels.wait(timeout=1)
+    assert channels.poll() == {}  # woken without anything new, e.g. by a finished gemini request
+
+
+def test_wait_wakes_up_a_blocked_consumer():
+    channels = ChannelSet(["user"])
+    producer = mp.Process(target=produce, args=(channels["user"], 1))
+    producer.start()
+    assert channels.wait(timeout=30)
+    producer.join(timeout=30)
+    assert channels.poll()["user"].data == 0
+    assert channels.dropped == {"user": 0}
@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+import pytest
+from conftest import StubModel
+from YOLO_test.YOLO import DIST_THRESHOLD, Detector, filter_boxes
+from YOLO_test.gate import FrameGate
+from YOLO_test.hazards import FAR_DISTANCE, HazardScorer
+from YOLO_test.tracker import ObjectTracker
+
+
+def test_construct_with_warmup(stub_model):
+    gate = FrameGate()
+    detector = Detector(gate=gate)
+    assert len(stub_model.calls) == 2  # the warmup at imgsz and at periphery_imgsz
+    assert gate.stats["frames"] == 0  # the warmup frame did not become the gate's reference
+    assert detector.gate is gate
+
+
+def test_filter_boxes_keeps_everything_by_default():
+    xyxy = np.array([[0, 0, 100, 50], [900, 900, 1000, 1079], [1500, 100, 1700, 300]], dtype=np.float32)
+    results = filter_boxes(xyxy, np.full(3, 0.9), np.array([56, 56, 0]), StubModel.names, 1920, height=1080)
+    assert results["left"]["objects"] == {"chair": 1}
+    assert results["forward"]["objects"] == {"chair": 1}
+    assert results["right"]["objects"] == {"person": 1}
+
+
+def test_filter_boxes_drops_far_boxes_and_keeps_unknown_ones():
+    # the bottom of a 1080p frame is about 63 inches away, row 700 about 136 and row 100 is above the horizon
+    xyxy = np.array([[900, 900, 1000, 1079], [900, 500, 1000, 700], [900, 0, 1000, 100]], dtype=np.float32)
+    results = filter_boxes(xyxy, np.full(3, 0.9), np.array([56, 60, 0]), StubModel.names, 1920, height=1080,
+                           dist_threshold=DIST_THRESHOLD)
+    assert results["forward"]["objects"] == {"chair": 1, "person": 1}
+
+
+def test_person_near_the_bottom_of_the_frame_is_a_hazard(stub_model):
+    detector = Detector(hazard_scorer=HazardScorer())
+    # a person standing in the forward sector of a 1920x1080 frame, its feet on the bottom row. The 640
+    # letterbox scales the frame by 1/3 and pads 140 rows on top
+    left, top, right, bottom = 800, 600, 1100, 1079
+    stub_model.boxes = np.array([[left / 3, top / 3 + 140, right / 3, bottom / 3 + 140, 0.9, 0]], dtype=np.float32)
+    results = detector.detect(np.zeros((1080, 1920, 3), dtype=np.uint8))
+    assert results["forward"]["objects"] == {"person": 1}
+    assert results["forward"]["distances"][0] < FAR_DISTANCE
+    left_level, forward_level, right_level = detector.hazards
+    assert forward_level > 0
+    assert left_level == right_level == 0
+
+
+def test_detect_focused_keeps_the_focus_input_when_the_periphery_has_the_same_size(stub_model):
+    detector = Detector(periphery_imgsz=640, warmup=False)
+    img = np.zeros((480, 640, 3), dtype=np.uint8)
+    img[:, :200] = 255  # only the left sector is white
+    detector.detect_focused(img, 2)
+    focus_input, periphery_input = stub_model.calls[-2][0], stub_model.calls[-1][0]
+    assert focus_input.max() < 255  # the crop of the right sector
+    assert periphery_input.max() == 255  # the whole frame
+
+
+def test_detect_reads_paths_as_rgb(stub_model, tmp_path):
+    detector = Detector(warmup=False)
+    bgr = np.zeros((640, 640, 3), dtype=np.uint8)
+    bgr[..., 0] = 255  # blue
+    cv2.imwrite(str(tmp_path / "blue.png"), bgr)
+    detector.detect(str(tmp_path / "blue.png"))
+    assert stub_model.calls[-1][0][320, 320].tolist() == [0, 0, 255]
+    with pytest.raises(FileNotFoundError):
+        detector.detect(str(tmp_path / "missing.png"))
+    with pytest.raises(FileNotFoundError):
+        detector.detect_batch([str(tmp_path / "blue.png"), str(tmp_path / "missing.png")])
+
+
+def test_gate_does_not_delay_the_tracker(stub_model):
+    now = [0.0]
+    detector = Detector(tracker=ObjectTracker(min_hits=3, max_age=5), gate=FrameGate(clock=lambda: now[0]),
+                        warmup=False)
+    rng = np.random.default_rng(0)
+    empty, occupied = (rng.integers(0, 256, (360, 640, 3), dtype=np.uint8) for _ in range(2))
+    chair = np.array([[280, 300, 360, 420, 0.9, 56]], dtype=np.float32)
+    reported = []
+    # 10 fps on a fake clock: a chair shows up at 1 s and leaves at 5 s, the scene is static in between
+    for frame in range(80):
+        now[0] = frame / 10
+        present = 1.0 <= now[0] < 5.0
+        stub_model.boxes = chair if present else np.zeros((0, 6), dtype=np.float32)
+        results = detector.detect(occupied if present else empty)
+        if results["forward"]["objects"]:
+            reported.append(now[0])
+    assert reported[0] <= 1.3  # confirmed on 3 consecutive frames, not 3 staleness periods
+    assert reported[-1] <= 5.6  # dropped after 5 missed frames
+    assert detector.gate.stats["static"] > 0  # and the gate still skips the static frames in between
+
+
+def test_periphery_class_filter_does_not_stick(stub_model):
+    detector = Detector(periphery_every=2)
+    stub_model.boxes = np.array([[280, 300, 360, 420, 0.9, 56]], dtype=np.float32)  # a chair, not a hazard class
+    img = np.zeros((480, 640, 3), dtype=np.uint8)
+    assert detector.detect_focused(img, 1)["forward"]["objects"] == {"chair": 1}  # focus, then periphery
+    assert stub_model.args["classes"] is not None
+    assert detector.detect_focused(img, 1)["forward"]["objects"] == {"chair": 1}  # focus only
+    assert detector.detect(img)["forward"]["objects"] == {"chair": 1}
+    assert detector.detect_batch([img])[0]["forward"]["objects"] == {"chair": 1}
+
+
+def test_detector_drops_far_objects_with_a_threshold(stub_model):
+    # a 1920x1080 frame letterboxed by 1/3 with 140 rows on top: a chair on the bottom row (about 63 inches)
+    # and one ending on row 700 (about 136 inches)
+    stub_model.boxes = np.array([[300, 300 + 140, 330, 1079 / 3 + 140, 0.9, 56],
+                                 [300, 150 + 140, 330, 700 / 3 + 140, 0.9, 56]], dtype=np.float32)
+    img = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    assert Detector(warmup=False).detect(img)["forward"]["objects"] == {"chair": 2}
+    results = Detector(warmup=False, dist_threshold=DIST_THRESHOLD).detect(img)
+    assert results["forward"]["objects"] == {"chair": 1}
+    assert results["forward"]["distances"][0] <= DIST_THRESHOLD
@@ -0,0 +1,18 @@
+import numpy as np
+from frame_buffer import FrameRing
+
+
+def test_copy_of_a_reused_slot_is_none():
+    ring = FrameRing((4, 4, 3), slots=2)
+    try:
+        slot, seq = ring.write(np.full((4, 4, 3), 1, dtype=np.uint8))
+        crop = ring.copy(slot, seq, slice(0, 2))
+        assert crop.shape == (2, 4, 3) and (crop == 1).all()
+        ring.write(np.full((4, 4, 3), 2, dtype=np.uint8))
+        ring.write(np.full((4, 4, 3), 3, dtype=np.uint8))  # laps the ring, the first slot is reused
+        assert ring.copy(slot, seq) is None
+        assert not ring.is_current(slot, seq)
+        assert (crop == 1).all()  # the copy outlives the slot
+    finally:
+        ring.close()
+        ring.unlink()
@@ -0,0 +1,93 @@
+import threading
+import numpy as np
+from gemini_api import AsyncDescriber, CachedDescriber, DescriptionCache, FakeGeminiClient, image_hash
+
+
+def view(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (90, 160, 3), dtype=np.uint8)
+
+
+def test_similar_views_hit_the_cache():
+    client = FakeGeminiClient(lambda contents: "There is a cup.")
+    describer = CachedDescriber(client, DescriptionCache(hash_tolerance=6))
+    img = view(0)
+    noisy = np.clip(img.astype(np.int16) + np.random.default_rng(1).integers(-3, 4, img.shape), 0, 255)
+    noisy = noisy.astype(np.uint8)
+    assert 0 < (image_hash(img) ^ image_hash(noisy)).bit_count() <= 6
+    assert describer.describe(img, {"cup": "1"}, "left") == "There is a cup."
+    assert describer.describe(noisy, {"cup": "1"}, "left") == "There is a cup."
+    assert client.requests == 1
+    assert describer.cache.stats["hits"] == 1
+
+
+def test_other_views_states_and_directions_miss_the_cache():
+    client = FakeGeminiClient()
+    describer = CachedDescriber(client)
+    describer.describe(view(0), {"cup": "1"}, "left")
+    describer.describe(view(2), {"cup": "1"}, "left")
+    describer.describe(view(0), {"cup": "2"}, "left")
+    describer.describe(view(0), {"cup": "1"}, "right")
+    assert client.requests == 4
+    # the key order of the state doesn't matter
+    describer.describe(view(0), {"cup": "1", "bowl": "1"}, "left")
+    describer.describe(view(0), {"bowl": "1", "cup": "1"}, "left")
+    assert client.requests == 5
+
+
+def test_entries_expire_after_the_ttl():
+    now = [0.0]
+    cache = DescriptionCache(ttl=30, clock=lambda: now[0])
+    cache.put("left", None, view(0), "No objects detected.")
+    now[0] = 29.0
+    assert cache.get("left", None, view(0)) == "No objects detected."
+    now[0] = 31.0
+    assert cache.get("left", None, view(0)) is None
+    assert cache.stats == {"hits": 1, "misses": 1, "evictions": 1, "size": 0}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = DescriptionCache(max_entries=2)
+    cache.put("left", {}, view(0), "a")
+    cache.put("left", {}, view(2), "b")
+    assert cache.get("left", {}, view(0)) == "a"  # b is now the least recently used
+    cache.put("left", {}, view(3), "c")
+    assert cache.get("left", {}, view(2)) is None
+    assert cache.get("left", {}, view(0)) == "a"
+    assert cache.get("left", {}, view(3)) == "c"
+    assert cache.stats["evictions"] == 1
+
+
+def test_newest_request_per_key_wins():
+    release = threading.Event()
+    describer = AsyncDescriber(max_workers=1)
+    try:
+        blocked = describer.submit("left", lambda: release.wait() and "old left")
+        left = describer.submit("left", lambda: "new left")  # the old one is running, its result is dropped
+        describer.submit("right", lambda: "old right")
+        right = describer.submit("right", lambda: "new right")  # the old one never started, it is cancelled
+        assert describer.stats == {"cancelled": 1, "dropped": 1}
+        assert describer.pending("left") and describer.pending("right")
+        release.set()
+        for future in (blocked, left, right):
+            future.result(timeout=5)
+        assert sorted(describer.poll()) == [("left", "new left"), ("right", "new right")]
+        assert describer.poll() == []
+        assert not describer.pending("left")
+    finally:
+        describer.shutdown()
+
+
+def test_failed_requests_are_skipped_or_returned(capsys):
+    def fail():
+        raise ConnectionError("unreachable")
+
+    describer = AsyncDescriber(max_workers=1)
+    try:
+        describer.submit("user", fail).exception(timeout=5)
+        assert describer.poll() == []
+        assert "Request user failed: unreachable" in capsys.readouterr().out
+        describer.submit("user", fail).exception(timeout=5)
+        [(key, error)] = describer.poll(return_exceptions=True)
+        assert key == "user" and isinstance(error, ConnectionError)
+    finally:
+        describer.shutdown()
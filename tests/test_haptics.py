@@ -0,0 +1,80 @@
+import threading
+import serial
+from haptics import HapticsController
+
+
+def loop_port() -> serial.Serial:
+    return serial.serial_for_url("loop://", timeout=1)
+
+
+def written(haptics: HapticsController) -> bytes:
+    assert haptics.flush()
+    return haptics.serial.read(haptics.serial.in_waiting)
+
+
+def test_only_changed_channels_are_sent():
+    haptics = HapticsController(loop_port())
+    try:
+        assert written(haptics) == b"WARN: LEFT 0\nWARN: FORWARD 0\nWARN: RIGHT 0\n"
+        haptics.set(0, 120, 0)
+        assert written(haptics) == b"WARN: FORWARD 120\n"
+        writes = haptics.writes
+        haptics.set(0, 120, 0)  # nothing changed, nothing is written
+        assert written(haptics) == b""
+        assert haptics.writes == writes
+        assert haptics.last_sent == (0, 120, 0)
+    finally:
+        haptics.close()
+
+
+def test_multi_channel_frames_send_one_line():
+    haptics = HapticsController(loop_port(), multi_channel_frames=True)
+    try:
+        assert written(haptics) == b"WARN: L0 F0 R0\n"
+        haptics.set(200, 0, 50)
+        assert written(haptics) == b"WARN: L200 R50\n"
+    finally:
+        haptics.close()
+
+
+class SlowPort:
+    """
+    A port whose writes block until released, like a backed up 9600 baud link
+    """
+    def __init__(self):
+        self.lines = []
+        self.release = threading.Event()
+        self.closed = False
+
+    def write(self, data: bytes) -> None:
+        self.release.wait()
+        self.lines.append(data)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_values_set_while_writing_are_coalesced():
+    port = SlowPort()
+    haptics = HapticsController(port)
+    try:
+        for pwm in range(1, 50):
+            haptics.set(pwm, 0, 0)  # never blocks, the writer is stuck on the first write
+        port.release.set()
+        assert haptics.flush()
+        assert port.lines[-1] == b"WARN: LEFT 49\n"
+        assert haptics.writes <= 3  # the initial write, and at most two with the newest values
+    finally:
+        haptics.close()
+
+
+def test_close_turns_off_and_stops_the_writer():
+    port = SlowPort()
+    port.release.set()
+    haptics = HapticsController(port)
+    haptics.set(255, 255, 255)
+    haptics.close()
+    assert port.lines[-1] == b"WARN: LEFT 0\nWARN: FORWARD 0\nWARN: RIGHT 0\n"
+    assert haptics.last_sent == (0, 0, 0)
+    assert not haptics._thread.is_alive()
+    assert port.closed
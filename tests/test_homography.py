@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from homography import Homog, PTS_GROUND_PLANE, PTS_IMAGE_PLANE
+
+
+def test_calibration_points_map_to_their_distances():
+    measured = np.hypot(*np.array(PTS_GROUND_PLANE).T)
+    distances = Homog().distances(np.array(PTS_IMAGE_PLANE))
+    # the homography is a least squares fit of the calibration points, a couple of inches off at most
+    np.testing.assert_allclose(distances, measured, atol=2.0)
+
+
+def test_transform_many_matches_transform_uv_to_xy():
+    homog = Homog()
+    u, v = PTS_IMAGE_PLANE[0]
+    np.testing.assert_allclose(homog.transform_many(np.array([[u, v]]))[0], homog.transformUvToXy(u, v))
+
+
+def test_rows_above_the_horizon_are_inf():
+    lut = Homog().row_distance_lut(1080, 960)
+    assert np.isinf(lut[0])
+    assert lut[1079] == pytest.approx(63, abs=2)
+    # the bottom of the frame is the closest ground
+    finite = lut[np.isfinite(lut)]
+    assert np.all(np.diff(finite) <= 0)
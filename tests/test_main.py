@@ -0,0 +1,17 @@
+import multiprocessing as mp
+import pytest
+
+try:
+    import main
+    from audio_output import NullSpeechWorker
+except (ImportError, OSError) as e:  # the audio stack isn't installed, or the PortAudio library is not
+    pytest.skip(f"the audio stack can't load: {e}", allow_module_level=True)
+
+
+def test_failed_user_request_stops_listening():
+    speech = NullSpeechWorker()
+    talk_event = mp.Event()
+    talk_event.set()
+    main.user_request_failed(ConnectionError("unreachable"), speech, talk_event)
+    assert not talk_event.is_set()
+    assert [request.text for request in speech.spoken] == [main.USER_REQUEST_FAILED]
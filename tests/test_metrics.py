@@ -0,0 +1,62 @@
+import multiprocessing as mp
+import urllib.error
+import urllib.request
+import pytest
+from metrics import MetricsServer, SharedMetrics
+
+
+def scene_worker(metrics) -> None:
+    metrics.inc("frames_total", 3)
+    metrics.set("fps", 9.5)
+    for seconds in (0.02, 0.04):
+        metrics.observe("detection_seconds", seconds)
+
+
+@pytest.fixture
+def shared():
+    shared = SharedMetrics(["main", "scene"])
+    worker = mp.Process(target=scene_worker, args=(shared.process("scene"),))
+    worker.start()
+    worker.join(timeout=30)
+    shared.process("main").observe("loop_seconds", 0.001)
+    return shared
+
+
+def test_prometheus_text_format(shared):
+    assert shared.prometheus() == "\n".join([
+        "# HELP seeforme_frames_total Frames captured",
+        "# TYPE seeforme_frames_total counter",
+        'seeforme_frames_total{process="scene"} 3',
+        "# HELP seeforme_fps Frames per second achieved by the worker",
+        "# TYPE seeforme_fps gauge",
+        'seeforme_fps{process="scene"} 9.5',
+        "# HELP seeforme_detection_seconds Time to detect the objects of a frame, including pre and post processing",
+        "# TYPE seeforme_detection_seconds summary",
+        'seeforme_detection_seconds_count{process="scene"} 2',
+        'seeforme_detection_seconds_sum{process="scene"} 0.06',
+        "# TYPE seeforme_detection_seconds_max gauge",
+        'seeforme_detection_seconds_max{process="scene"} 0.04',
+        "# HELP seeforme_loop_seconds Time main spends handling an update",
+        "# TYPE seeforme_loop_seconds summary",
+        'seeforme_loop_seconds_count{process="main"} 1',
+        'seeforme_loop_seconds_sum{process="main"} 0.001',
+        "# TYPE seeforme_loop_seconds_max gauge",
+        'seeforme_loop_seconds_max{process="main"} 0.001',
+    ]) + "\n"
+
+
+def test_stats_line(shared):
+    assert shared.stats_line() == "main: loop 1ms | scene: fps 9.5 detection 30ms"
+
+
+def test_server_serves_the_metrics(shared):
+    server = MetricsServer(shared, port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode("utf-8") == shared.prometheus()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/other", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.close()
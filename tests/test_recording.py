@@ -0,0 +1,28 @@
+import numpy as np
+from recording import AudioRecorder, ReplayClock, ReplayMicrophone
+
+
+def record_audio(path, chunks=10, chunk_size=1600, sample_rate=16000, start=1000.0):
+    recorder = AudioRecorder(str(path))
+    for i in range(chunks):
+        pcm = np.arange(i * chunk_size, (i + 1) * chunk_size, dtype=np.int16).tobytes()
+        recorder.write(pcm, sample_rate, 2, timestamp=start + (i + 1) * chunk_size / sample_rate)
+    recorder.close()
+
+
+def test_replay_rewinds_to_the_audio_before_now(tmp_path, monkeypatch):
+    record_audio(tmp_path)
+    clock = ReplayClock(str(tmp_path))
+    monkeypatch.setattr(clock, "now", lambda: 1000.0 + 0.8)  # 12800 samples into the recording
+    with ReplayMicrophone(str(tmp_path), clock=clock) as source:
+        source.rewind(0.5)
+        first = np.frombuffer(source.stream.read(1), dtype=np.int16)[0]
+    assert first == 12800 - 8000
+
+
+def test_replay_without_a_clock_ignores_rewind(tmp_path):
+    record_audio(tmp_path)
+    with ReplayMicrophone(str(tmp_path)) as source:
+        source.stream.read(100)
+        source.rewind(0.5)
+        assert np.frombuffer(source.stream.read(1), dtype=np.int16)[0] == 100
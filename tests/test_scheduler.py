@@ -0,0 +1,66 @@
+import pytest
+from scheduler import FrameScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_scheduler(fps: float = 10, **kwargs):
+    clock = FakeClock()
+    return FrameScheduler(fps, clock=clock, sleep=clock.sleep, **kwargs), clock
+
+
+def run(scheduler, clock, frames: int, processing: float, dropped=lambda frame: None):
+    for frame in range(frames):
+        captured_at = clock.now
+        clock.now += processing
+        scheduler.wait(captured_at, dropped(frame))
+
+
+def test_processing_time_is_part_of_the_budget():
+    scheduler, clock = make_scheduler(10)
+    run(scheduler, clock, 20, processing=0.03)
+    assert clock.sleeps == pytest.approx([0.07] * 20)
+    assert clock.now == pytest.approx(2.0)
+    assert scheduler.fps == pytest.approx(10)
+    assert scheduler.misses == 0
+
+
+def test_late_frames_do_not_sleep_and_count_as_misses():
+    scheduler, clock = make_scheduler(10)
+    run(scheduler, clock, 5, processing=0.15)
+    assert clock.sleeps == []
+    assert scheduler.misses == 5
+    assert scheduler.fps == pytest.approx(1 / 0.15)
+
+
+def test_backs_off_while_the_consumer_drops_and_recovers():
+    scheduler, clock = make_scheduler(10, min_fps=5, backoff=0.5, recovery=2.0, recovery_frames=3)
+    # the consumer drops a value on each of the first 3 frames
+    run(scheduler, clock, 3, processing=0.01, dropped=lambda frame: frame + 1)
+    assert scheduler.target_fps == 5  # 10 -> 5, never below min_fps
+    assert clock.sleeps[-1] == pytest.approx(1 / 5 - 0.01)
+    # then keeps up: the rate only goes back up after recovery_frames frames without drops
+    run(scheduler, clock, 2, processing=0.01, dropped=lambda frame: 3)
+    assert scheduler.target_fps == 5
+    run(scheduler, clock, 1, processing=0.01, dropped=lambda frame: 3)
+    assert scheduler.target_fps == 10
+    run(scheduler, clock, 10, processing=0.01, dropped=lambda frame: 3)
+    assert scheduler.target_fps == 10  # never above the configured rate
+
+
+def test_stats_are_shared():
+    stats = FrameScheduler.shared_stats()
+    scheduler, clock = make_scheduler(10, stats=stats)
+    run(scheduler, clock, 3, processing=0.2)
+    assert FrameScheduler.read_stats(stats) == {"fps": pytest.approx(5), "target_fps": 10, "frames": 3, "misses": 3}
@@ -0,0 +1,139 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import speech_recognition as sr
+from transcription import speech_to_text
+from transcription.speech_to_text import SAMPLE_RATE, Hypothesis, SpeechToText, StreamingRecognizer
+
+
+class StubWhisperModel:
+    """
+    Stands in for faster_whisper.WhisperModel: records how it was created and called, and answers
+    with respond(audio)
+    """
+    def __init__(self, model, **kwargs):
+        self.model = model
+        self.options = kwargs
+        self.calls = []
+        self.respond = lambda audio: "hello"
+
+    def transcribe(self, audio, **kwargs):
+        self.calls.append((audio, kwargs))
+        text = self.respond(audio)
+        return iter([SimpleNamespace(text=f" {text}")] if text else []), SimpleNamespace(language="en")
+
+
+@pytest.fixture
+def whisper(monkeypatch):
+    """
+    Makes SpeechToText load a StubWhisperModel, the model is the fixture's value once one was created
+    """
+    models = []
+
+    def load(model, **kwargs):
+        models.append(StubWhisperModel(model, **kwargs))
+        return models[-1]
+
+    monkeypatch.setattr(speech_to_text, "WhisperModel", load)
+    return models
+
+
+def test_options_reach_the_model(whisper):
+    stt = SpeechToText("tiny", device="cpu", compute_type="int8", cpu_threads=2, beam_size=3, language="de",
+                       warmup=False)
+    [model] = whisper
+    assert model.model == "tiny"
+    assert model.options == {"device": "cpu", "compute_type": "int8", "cpu_threads": 2}
+    assert model.calls == []  # no warmup
+    assert stt.transcribe(np.zeros(SAMPLE_RATE, dtype=np.int16)) == "hello"
+    _, options = model.calls[0]
+    assert options["beam_size"] == 3 and options["language"] == "de"
+    assert options["condition_on_previous_text"] is False
+
+
+def test_warmup_decodes_a_second_of_silence(whisper):
+    SpeechToText()
+    [model] = whisper
+    [(audio, _)] = model.calls
+    assert audio.dtype == np.float32 and len(audio) == SAMPLE_RATE and not audio.any()
+
+
+def test_audio_is_converted_to_float(whisper):
+    stt = SpeechToText(warmup=False)
+    pcm = np.array([0, 16384, -32768], dtype=np.int16)
+    stt.transcribe(pcm)
+    stt.transcribe(pcm.tobytes())
+    stt.transcribe(np.array([128, 255, 0], dtype=np.uint8))
+    calls = [audio.tolist() for audio, _ in whisper[0].calls]
+    assert calls == [[0.0, 0.5, -1.0], [0.0, 0.5, -1.0], [0.0, 127 / 128, -1.0]]
+
+
+def test_audio_data_is_resampled_in_memory(whisper):
+    stt = SpeechToText(warmup=False)
+    whisper[0].respond = lambda audio: ""
+    # a second of 8 bit audio at 8 kHz
+    assert stt.transcribe_audio(sr.AudioData(bytes([128]) * 8000, 8000, 1)) == ""
+    audio, _ = whisper[0].calls[0]
+    assert abs(len(audio) - SAMPLE_RATE) <= 1 and audio.dtype == np.float32  # audioop may drop a sample
+    assert stt.timings["audio"] == pytest.approx(1.0, abs=1e-3) and stt.timings["decode"] >= 0
+
+
+# chunks of 1/8 s, so the silence and partial timers add up exactly
+CHUNK = SAMPLE_RATE // 8
+SPEECH = np.full(CHUNK, 1000, dtype=np.int16).tobytes()  # an RMS of 1000, above the energy threshold
+SILENCE = np.zeros(CHUNK, dtype=np.int16).tobytes()
+
+
+def feed(stream: StreamingRecognizer, *chunks: bytes):
+    return [hypothesis for chunk in chunks for hypothesis in stream.feed(chunk)]
+
+
+@pytest.fixture
+def stream(whisper):
+    stt = SpeechToText(warmup=False)
+    return StreamingRecognizer(stt, SAMPLE_RATE, 2, pause_threshold=0.75, partial_every=0.5, pre_roll=0.25)
+
+
+def test_silence_is_never_decoded(stream, whisper):
+    assert feed(stream, *[SILENCE] * 20) == []
+    assert not stream.speaking
+    assert whisper[0].calls == []
+
+
+def test_partials_then_a_final_hypothesis(stream, whisper):
+    texts = iter(["where", "where is", "where is", "where is the", "where is the door"])
+    whisper[0].respond = lambda audio: next(texts)
+    assert feed(stream, *[SILENCE] * 4) == []
+    hypotheses = feed(stream, *[SPEECH] * 12)
+    assert stream.speaking
+    assert hypotheses == [Hypothesis("where", False, False), Hypothesis("where is", False, False),
+                          Hypothesis("where is", False, True)]  # stable once two partials in a row agree
+    # the partials go on through the pause, the final one comes once it is long enough
+    assert feed(stream, *[SILENCE] * 6) == [Hypothesis("where is the", False, False),
+                                            Hypothesis("where is the door", True, True)]
+    assert not stream.speaking
+    # the final one decodes the whole utterance: the pre-roll, the speech and the pause
+    audio, _ = whisper[0].calls[-1]
+    assert len(audio) == (2 + 12 + 6) * CHUNK
+
+
+def test_partials_only_decode_the_window(whisper):
+    stream = StreamingRecognizer(SpeechToText(warmup=False), SAMPLE_RATE, 2, partial_every=0.5, window=1.0)
+    feed(stream, *[SPEECH] * 24)
+    assert [len(audio) for audio, _ in whisper[0].calls] == [4 * CHUNK, 8 * CHUNK, 8 * CHUNK, 8 * CHUNK, 8 * CHUNK,
+                                                             8 * CHUNK]
+
+
+def test_long_utterances_are_finalised(whisper):
+    stream = StreamingRecognizer(SpeechToText(warmup=False), SAMPLE_RATE, 2, partial_every=10, max_seconds=1.0)
+    assert feed(stream, *[SPEECH] * 7) == []
+    assert feed(stream, SPEECH) == [Hypothesis("hello", True, True)]
+    assert not stream.speaking
+
+
+def test_reset_drops_the_utterance(stream, whisper):
+    feed(stream, *[SPEECH] * 3)
+    stream.reset()
+    assert not stream.speaking
+    whisper[0].respond = lambda audio: str(len(audio))
+    assert feed(stream, *[SPEECH] * 4) == [Hypothesis(str(4 * CHUNK), False, False)]
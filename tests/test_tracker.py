@@ -0,0 +1,57 @@
+import numpy as np
+from YOLO_test.tracker import ObjectTracker
+
+NOTHING = (np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+
+
+def boxes(*xyxy, cls=0):
+    xyxy = np.array(xyxy, dtype=np.float64).reshape(-1, 4)
+    return xyxy, np.full(len(xyxy), 0.9), np.full(len(xyxy), cls)
+
+
+def test_a_track_is_confirmed_after_min_hits():
+    tracker = ObjectTracker(min_hits=3, max_age=5)
+    reported = [len(tracker.update(*boxes([100, 100, 200, 300]))[3]) for _ in range(4)]
+    assert reported == [0, 0, 1, 1]
+    assert tracker.settled
+
+
+def test_a_track_is_kept_for_max_age_missed_frames():
+    tracker = ObjectTracker(min_hits=1, max_age=2)
+    assert tracker.update(*boxes([100, 100, 200, 300]))[3].tolist() == [0]
+    assert tracker.update(*NOTHING)[3].tolist() == [0]
+    assert not tracker.settled  # missed a frame
+    assert tracker.update(*NOTHING)[3].tolist() == [0]
+    assert tracker.update(*NOTHING)[3].tolist() == []
+    assert tracker.settled  # no tracks left
+
+
+def test_a_flicker_neither_adds_nor_removes_an_object():
+    tracker = ObjectTracker(min_hits=3, max_age=5)
+    person = [100, 100, 200, 300]
+    for _ in range(3):
+        tracker.update(*boxes(person))
+    # missed for one frame, then back: same id, still reported throughout
+    assert tracker.update(*NOTHING)[3].tolist() == [0]
+    assert tracker.update(*boxes(person))[3].tolist() == [0]
+    # a false positive for one frame is never reported
+    assert tracker.update(*boxes(person, [400, 100, 500, 300]))[3].tolist() == [0]
+
+
+def test_ids_follow_moving_objects():
+    tracker = ObjectTracker(min_hits=1, max_age=5)
+    for step in range(20):
+        xyxy, conf, cls = boxes([100 + 5 * step, 100, 200 + 5 * step, 300], [600 - 5 * step, 100, 700 - 5 * step, 300])
+        order = np.array([1, 0]) if step % 2 else np.array([0, 1])  # the detector's order doesn't matter
+        tracked, _, _, ids = tracker.update(xyxy[order], conf[order], cls[order])
+        left_id = ids[np.argmin(tracked[:, 0])]
+        right_id = ids[np.argmax(tracked[:, 0])]
+        assert (left_id, right_id) == (0, 1)
+
+
+def test_tracks_never_match_across_classes():
+    tracker = ObjectTracker(min_hits=1, max_age=0)
+    box = [100, 100, 200, 300]
+    assert tracker.update(*boxes(box, cls=0))[3].tolist() == [0]
+    _, _, cls, ids = tracker.update(*boxes(box, cls=56))
+    assert ids.tolist() == [1] and cls.tolist() == [56]
@@ -0,0 +1,29 @@
+import numpy as np
+from face_tracker.tracking import DirectionFilter, FACE_DIRECTION
+
+
+class ScriptedTracker:
+    """
+    Stands in for a Tracker: returns the next scripted direction for every frame
+    """
+    def __init__(self, directions):
+        self._directions = iter(directions)
+
+    def predict_face_direction(self, img_rgb):
+        direction = next(self._directions)
+        if direction == FACE_DIRECTION.INDETERMINATE:
+            return direction, -1, -1, -1
+        return direction, 170.0, 0.0, 0.0
+
+    def classify(self, pitch, yaw, previous=None, hysteresis=0.0):
+        return FACE_DIRECTION.FORWARD
+
+
+def test_lost_face_is_emitted_after_lost_frames_without_waiting_for_the_heartbeat():
+    lost = FACE_DIRECTION.INDETERMINATE
+    tracker = ScriptedTracker([FACE_DIRECTION.FORWARD, lost, lost, lost, lost])
+    direction_filter = DirectionFilter(tracker, heartbeat=10.0, lost_frames=3)
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    emitted = [direction_filter.update(frame, t * 0.1) for t in range(5)]
+    # the face is missing from the second frame on, it counts as lost on the third missed frame (0.3 s in)
+    assert emitted == [FACE_DIRECTION.FORWARD, None, None, lost, None]
@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+from typing import Tuple
+import numpy as np
+import sounddevice as sd
+import speech_recognition as sr
+from recording import AudioRecorder
+
+
+class AudioRing:
+    """
+    A preallocated ring of samples, written by an audio callback and read by any number of readers,
+    each keeping its own position. Readers block on a condition until the samples they ask for were
+    written, so nothing polls.
+
+    >>> ring = AudioRing(4)
+    >>> ring.write(np.arange(6, dtype=np.int16))
+    >>> ring.read(0, 2)  # the oldest samples were overwritten, the reader skips ahead
+    (array([2, 3], dtype=int16), 4)
+    >>> ring.written
+    6
+    """
+    def __init__(self, size: int, dtype=np.int16):
+        """
+        :param size: the number of samples kept
+        :param dtype: the type of the samples
+        """
+        self._buffer = np.zeros(size, dtype=dtype)
+        self._written = 0  # samples written since the start, the position of the next one
+        self._condition = threading.Condition()
+
+    def write(self, samples: np.ndarray) -> None:
+        """
+        Appends samples, overwriting the oldest ones. Called from the audio callback, so it never blocks for long.
+        :param samples: a 1d array of samples
+        """
+        size = len(self._buffer)
+        count = len(samples)
+        samples = samples[-size:]
+        # the copies are under the lock too, so a reader never gets samples that are being overwritten.
+        # A chunk is a few kB, the lock is held for microseconds
+        with self._condition:
+            start = (self._written + count - len(samples)) % size
+            first = min(len(samples), size - start)
+            self._buffer[start:start + first] = samples[:first]
+            self._buffer[:len(samples) - first] = samples[first:]
+            self._written += count
+            self._condition.notify_all()
+
+    def read(self, position: int, count: int, timeout: float = None) -> Tuple[np.ndarray, int]:
+        """
+        Waits until count samples from position were written and copies them out. A reader that fell
+        more than the size of the ring behind skips to the oldest sample still kept.
+        :param position: the position of the first sample, see written
+        :param count: the number of samples
+        :param timeout: seconds to wait at most, fewer samples are returned when it runs out
+        :return: the samples, and the position after them
+        """
+        size = len(self._buffer)
+        count = min(count, size)
+        with self._condition:
+            self._condition.wait_for(lambda: self._written >= position + count, timeout)
+            position = max(position, self._written - size)
+            end = min(position + count, self._written)
+            # fancy indexing copies, while the callback can't write
+            return self._buffer[np.arange(position, end) % size], end
+
+    @property
+    def written(self) -> int:
+        """
+        The number of samples written since the start, the position a reader starts at to only get new samples
+        """
+        return self._written
+
+
+class _CaptureStream:
+    def __init__(self, capture: "MicrophoneCapture"):
+        self._capture = capture
+
+    def read(self, size: int) -> bytes:
+        return self._capture.read(size)
+
+
+class MicrophoneCapture(sr.AudioSource):
+    """
+    A microphone that captures continuously from a sounddevice callback into an AudioRing, used like
+    an sr.Microphone. Reading blocks until the audio arrives, and rewind goes back to audio captured
+    before the reader asked for it, e.g. the first words said while the push to talk key was pressed.
+
+    With a recorder, everything captured is recorded with its capture time, whether it is read or
+    not, so a replay can rewind to the same audio. The chunks are written on a thread of their own,
+    the callback only hands them over.
+
+    >>> with MicrophoneCapture() as source:  # doctest: +SKIP
+    ...     source.rewind(0.5)
+    ...     audio = sr.Recognizer().listen(source)
+    """
+    def __init__(self, device: int = None, sample_rate: int = 16000, chunk_size: int = 1024, seconds: float = 30.0,
+                 recorder: AudioRecorder = None):
+        """
+        :param device: the index of the input device, None for the default one
+        :param sample_rate: the sample rate captured at, whisper's own 16 kHz saves resampling
+        :param chunk_size: the samples per callback, and per read of the recognizers
+        :param seconds: the audio kept in the ring, the most a slow reader can fall behind
+        :param recorder: records all the audio captured, see recording.ReplayMicrophone
+        """
+        self._device = device
+        self.SAMPLE_RATE = sample_rate
+        self.SAMPLE_WIDTH = 2
+        self.CHUNK = chunk_size
+        self._ring = AudioRing(int(seconds * sample_rate))
+        self._position = 0
+        self._input = None
+        self.stream = None
+        self._recorder = recorder
+        self._recorded = queue.SimpleQueue()  # (pcm, capture time) handed from the callback to the recording thread
+        self._recording = None
+
+    def _callback(self, indata: np.ndarray, frames: int, time_info, status: sd.CallbackFlags) -> None:
+        self._ring.write(indata[:, 0])
+        if self._recorder is not None:
+            # the last sample of the chunk was captured the input latency (minus the chunk) before the callback
+            latency = time_info.currentTime - time_info.inputBufferAdcTime if time_info.inputBufferAdcTime > 0 else 0.0
+            self._recorded.put((indata.tobytes(), time.time() - max(latency - frames / self.SAMPLE_RATE, 0.0)))
+
+    def _record(self) -> None:
+        while (chunk := self._recorded.get()) is not None:
+            pcm, timestamp = chunk
+            self._recorder.write(pcm, self.SAMPLE_RATE, self.SAMPLE_WIDTH, timestamp=timestamp)
+
+    def __enter__(self):
+        self._input = sd.InputStream(device=self._device, samplerate=self.SAMPLE_RATE, channels=1, dtype="int16",
+                                     blocksize=self.CHUNK, callback=self._callback)
+        if self._recorder is not None:
+            self._recording = threading.Thread(target=self._record, name="audio-recorder", daemon=True)
+            self._recording.start()
+        self._input.start()
+        self._position = self._ring.written
+        self.stream = _CaptureStream(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+        self._input.stop()
+        self._input.close()
+        self._input = None
+        if self._recording is not None:
+            self._recorded.put(None)
+            self._recording.join()
+            self._recording = None
+
+    def read(self, size: int) -> bytes:
+        """
+        :param size: the number of samples
+        :return: the next samples as 16 bit PCM, blocks until they were captured
+        """
+        samples, self._position = self._ring.read(self._position, size)
+        return samples.tobytes()
+
+    def rewind(self, seconds: float) -> None:
+        """
+        Continues reading from seconds before the newest audio, dropping anything older that was not read
+        :param seconds: the pre-roll, at most the length of the ring
+        """
+        self._position = max(self._ring.written - int(seconds * self.SAMPLE_RATE), 0)
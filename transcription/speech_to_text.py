@@ -0,0 +1,197 @@
+import time
+from typing import Dict, List, NamedTuple
+import numpy as np
+import speech_recognition as sr
+from faster_whisper import WhisperModel
+
+SAMPLE_RATE = 16000  # faster-whisper takes 16 kHz mono float32 audio
+WARMUP_SECONDS = 1.0
+
+
+class Hypothesis(NamedTuple):
+    """
+    What the user said so far, sent over the whisper channel
+    """
+    text: str
+    final: bool  # the user stopped talking, the text won't change anymore
+    stable: bool  # the text agrees with the previous partial, so it is worth acting on before the final one
+
+
+class SpeechToText:
+    """
+    Owns one faster-whisper model for the lifetime of a process, and transcribes PCM without writing
+    it to a WAV file and decoding it again like sr.Recognizer.recognize_faster_whisper does.
+
+    >>> stt = SpeechToText("tiny")  # doctest: +SKIP
+    >>> stt.transcribe(np.zeros(SAMPLE_RATE, dtype=np.int16))  # doctest: +SKIP
+    ''
+    """
+    def __init__(self, model: str = "base", device: str = "cpu", compute_type: str = "int8", cpu_threads: int = 4,
+                 beam_size: int = 1, language: str = "en", warmup: bool = True):
+        """
+        :param model: the size of the model ("tiny", "base", "small", "medium", "large-v3", "turbo") or a path to one
+        :param device: cpu, cuda or auto
+        :param compute_type: the precision of the weights, int8 is the fastest on a CPU
+        :param cpu_threads: the threads used on a CPU, 0 lets CTranslate2 decide
+        :param beam_size: the beams searched while decoding, 1 is greedy and the fastest
+        :param language: the spoken language, detecting it costs an extra pass over the audio
+        :param warmup: transcribes a second of silence, so the first phrase doesn't pay for the lazy initialisation
+        """
+        self._model = WhisperModel(model, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+        self._beam_size = beam_size
+        self._language = language
+        self._timings = {"audio": 0.0, "decode": 0.0}
+        if warmup:
+            self.transcribe(np.zeros(int(WARMUP_SECONDS * SAMPLE_RATE), dtype=np.float32))
+
+    @staticmethod
+    def to_float(pcm: np.ndarray | bytes, sample_width: int = 2) -> np.ndarray:
+        """
+        :param pcm: mono 16 kHz samples, as float32 in [-1, 1], integer samples, or raw little endian bytes
+        :param sample_width: the bytes per sample of raw bytes
+        :return: the samples as float32 in [-1, 1]
+        """
+        if isinstance(pcm, (bytes, bytearray, memoryview)):
+            pcm = np.frombuffer(pcm, dtype=f"<i{sample_width}")
+        if pcm.dtype == np.float32:
+            return pcm
+        if pcm.dtype.kind in "iu":
+            info = np.iinfo(pcm.dtype)
+            # unsigned samples (8 bit audio) are centered on the middle of their range
+            offset = (info.max + 1) // 2 if pcm.dtype.kind == "u" else 0
+            return (pcm.astype(np.float32) - offset) / float(info.max - offset + 1)
+        return pcm.astype(np.float32)
+
+    def transcribe(self, pcm: np.ndarray | bytes, sample_width: int = 2) -> str:
+        """
+        :param pcm: mono 16 kHz samples, see to_float
+        :param sample_width: the bytes per sample of raw bytes
+        :return: the text, stripped
+        """
+        audio = self.to_float(pcm, sample_width)
+        start = time.perf_counter()
+        segments, _ = self._model.transcribe(audio, language=self._language, beam_size=self._beam_size,
+                                             condition_on_previous_text=False)
+        # the segments are decoded lazily, while they are iterated
+        text = "".join(segment.text for segment in segments).strip()
+        self._timings = {"audio": len(audio) / SAMPLE_RATE, "decode": (time.perf_counter() - start) * 1000}
+        return text
+
+    def transcribe_audio(self, audio: sr.AudioData) -> str:
+        """
+        :param audio: audio captured by an sr.Recognizer
+        :return: the text, stripped
+        """
+        # resampled and converted to 16 bit in memory, which is much cheaper than the WAV round trip
+        return self.transcribe(audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2))
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """
+        The length of the last audio in seconds, and the time it took to decode in milliseconds
+        """
+        return self._timings
+
+
+class StreamingRecognizer:
+    """
+    Transcribes an utterance while it is still being spoken. Feed it the chunks read from an audio
+    source: every partial_every seconds of speech it decodes the last window seconds and returns a
+    partial hypothesis, and once the user has been silent for pause_threshold seconds it decodes the
+    whole utterance and returns the final one.
+
+    Speech is told apart from silence by the energy of a chunk, like sr.Recognizer.listen does.
+
+    >>> with sr.AudioFile("transcription/test.wav") as source:  # doctest: +SKIP
+    ...     stream = StreamingRecognizer(SpeechToText("tiny"), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+    ...     while chunk := source.stream.read(source.CHUNK):
+    ...         for hypothesis in stream.feed(chunk):
+    ...             print(hypothesis)
+    """
+    def __init__(self, stt: SpeechToText, sample_rate: int, sample_width: int, energy_threshold: float = 300,
+                 pause_threshold: float = 0.8, partial_every: float = 0.5, window: float = 10.0,
+                 pre_roll: float = 0.3, max_seconds: float = 30.0):
+        """
+        :param stt: the model the audio is decoded with
+        :param sample_rate: the sample rate of the chunks
+        :param sample_width: the bytes per sample of the chunks
+        :param energy_threshold: the RMS above which a chunk counts as speech, e.g. sr.Recognizer.energy_threshold
+        :param pause_threshold: seconds of silence that end an utterance
+        :param partial_every: seconds of audio between two partial hypotheses
+        :param window: seconds of the end of the utterance a partial hypothesis is decoded from
+        :param pre_roll: seconds of audio before the speech started kept at the start of the utterance
+        :param max_seconds: an utterance is finalised at this length, the most whisper decodes at once
+        """
+        self._stt = stt
+        self._sample_rate = sample_rate
+        self._sample_width = sample_width
+        self._energy_threshold = energy_threshold
+        self._pause_threshold = pause_threshold
+        self._partial_every = partial_every
+        # in bytes, rounded down to whole samples
+        self._window = int(window * sample_rate) * sample_width
+        self._pre_roll_size = int(pre_roll * sample_rate) * sample_width
+        self._max_size = int(max_seconds * sample_rate) * sample_width
+
+        self._pre_roll = bytearray()
+        self._utterance = bytearray()
+        self._speaking = False
+        self._silence = 0.0
+        self._since_partial = 0.0
+        self._previous = None
+
+    def feed(self, chunk: bytes) -> List[Hypothesis]:
+        """
+        :param chunk: the next PCM chunk read from the source
+        :return: the hypotheses decoded after this chunk, at most one
+        """
+        samples = np.frombuffer(chunk, dtype=f"<i{self._sample_width}")
+        energy = np.sqrt(np.mean(np.square(samples, dtype=np.float64))) if len(samples) > 0 else 0.0
+        seconds = len(samples) / self._sample_rate
+        voiced = energy > self._energy_threshold
+
+        if not self._speaking:
+            if not voiced:
+                self._pre_roll += chunk
+                del self._pre_roll[:-self._pre_roll_size or len(self._pre_roll)]
+                return []
+            self._speaking = True
+            self._utterance = self._pre_roll
+            self._pre_roll = bytearray()
+
+        self._utterance += chunk
+        self._silence = 0.0 if voiced else self._silence + seconds
+        self._since_partial += seconds
+        if self._silence >= self._pause_threshold or len(self._utterance) >= self._max_size:
+            hypothesis = Hypothesis(self._transcribe(self._utterance), True, True)
+            self.reset()
+            return [hypothesis]
+        if self._since_partial >= self._partial_every:
+            self._since_partial = 0.0
+            text = self._transcribe(self._utterance[-self._window:])
+            # two partials in a row agreeing is the usual sign the words won't change anymore
+            stable = bool(text) and text == self._previous
+            self._previous = text
+            return [Hypothesis(text, False, stable)]
+        return []
+
+    def reset(self) -> None:
+        """
+        Drops the current utterance, e.g. when the listening is paused
+        """
+        self._pre_roll = bytearray()
+        self._utterance = bytearray()
+        self._speaking = False
+        self._silence = 0.0
+        self._since_partial = 0.0
+        self._previous = None
+
+    def _transcribe(self, pcm: bytearray) -> str:
+        return self._stt.transcribe_audio(sr.AudioData(bytes(pcm), self._sample_rate, self._sample_width))
+
+    @property
+    def speaking(self) -> bool:
+        """
+        Whether an utterance has started and not ended yet
+        """
+        return self._speaking
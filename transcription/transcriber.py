@@ -11,6 +11,10 @@ import cv2
 import time
 import pprint
 from YOLO_test import YOLO
+from metrics import Metrics, current, install
+from recording import AudioRecorder, RecordingSource
+from transcription.capture import MicrophoneCapture
+from transcription.speech_to_text import Hypothesis, SpeechToText, StreamingRecognizer
 
 load_dotenv()
 
@@ -27,20 +31,18 @@ def active_listening(model: str = "base", device_index: int = 0, pause_threshold
     :param pause_threshold: seconds of non-speaking audio before a phrase is considered complete
     :return: the text from the audio
     """
+    metrics = current()
     r = sr.Recognizer()
-    print("I am here")
     r.pause_threshold = pause_threshold
     m = sr.Microphone(device_index=device_index)
-    print("I am here")
     with m as source:
         r.adjust_for_ambient_noise(source)
 
-    print("I am here")
-    with m as source:
+    with m as source, metrics.span("listen_seconds"):
         audio = r.listen(source)
-    print("I am here")
     try:
-        text = r.recognize_faster_whisper(audio, language="en", model=model)
+        with metrics.span("transcription_seconds"):
+            text = r.recognize_faster_whisper(audio, language="en", model=model)
         return text.lstrip(" ").rstrip(" ")
     except sr.UnknownValueError:
         return "Faster-Whisper couldn't understand audio"
@@ -57,39 +59,69 @@ def callback(recognizer, audio):
     """
 
 
-def whisper_process(queue, pause_event: mp.Event, model: str = "base", mic_index: int = 0, pause_threshold: float = 0.8):
+def whisper_process(channel, talk_event: mp.Event, model: str = "base", mic_index: int | sr.AudioSource = 0,
+                    pause_threshold: float = 0.8, recorder: AudioRecorder = None, metrics: Metrics = None,
+                    compute_type: str = "int8", cpu_threads: int = 4, beam_size: int = 1, streaming: bool = False,
+                    partial_every: float = 0.5, window: float = 10.0, pre_roll: float = 0.5):
     """
     This creates a whisper process
 
-    This listens in the background for any text that was spoken
-    :param queue: the process queue
-    :param pause_event: a pause event for finer process control
+    This listens in the background for any text that was spoken, and puts a speech_to_text.Hypothesis
+    on the channel for it. Without streaming only final hypotheses are sent, once the user stopped talking.
+    :param channel: the whisper channel (see channels.LatestChannel)
+    :param talk_event: set while the user may talk (push to talk), the process sleeps on it while it is cleared
     :param model: the type of model ("tiny", "base", "small", "medium", "large", "turbo")
-    :param mic_index: the index of the mic
+    :param mic_index: the index of the mic (see capture.MicrophoneCapture), or an audio source such as
+     recording.ReplayMicrophone
     :param pause_threshold: the silent threshold in seconds before stop listening
+    :param recorder: records all the audio the mic captures, or what is read from another audio source
+    :param metrics: the metrics of the process, see metrics.SharedMetrics
+    :param compute_type: the precision of the whisper weights, see speech_to_text.SpeechToText
+    :param cpu_threads: the threads whisper decodes with
+    :param beam_size: the beams whisper searches while decoding, 1 is greedy
+    :param streaming: also sends partial hypotheses while the user is still talking, see speech_to_text.StreamingRecognizer
+    :param partial_every: seconds of speech between two partial hypotheses
+    :param window: seconds of the end of the utterance a partial hypothesis is decoded from
+    :param pre_roll: seconds of audio from before talk_event was set that are transcribed too, so the first
+     words said while pressing the key are not lost
     :return:
     """
+    metrics = metrics if metrics is not None else current()
+    install(metrics)
+    # loaded and warmed up once, before the user can press the key
+    stt = SpeechToText(model, compute_type=compute_type, cpu_threads=cpu_threads, beam_size=beam_size)
     r = sr.Recognizer()
     r.pause_threshold = pause_threshold
 
-    m = sr.Microphone(device_index=mic_index)
+    # the mic captures all the time, so the audio from just before the user pressed the key can be rewound to
+    mic = mic_index if isinstance(mic_index, sr.AudioSource) else MicrophoneCapture(device=mic_index, recorder=recorder)
+    m = mic
+    if recorder is not None and not isinstance(mic, MicrophoneCapture):
+        m = RecordingSource(m, recorder)
 
     with m as source:
         r.adjust_for_ambient_noise(source)
-        while True:
-            if pause_event.is_set():
-                time.sleep(0.5)
+        stream = StreamingRecognizer(stt, source.SAMPLE_RATE, source.SAMPLE_WIDTH, r.energy_threshold,
+                                     pause_threshold, partial_every, window) if streaming else None
+        while not getattr(m, "finished", False):  # only a replayed recording ever finishes
+            if not talk_event.is_set():
+                if stream is not None:
+                    stream.reset()
+                talk_event.wait()
+                if hasattr(mic, "rewind"):  # a live or a replayed mic
+                    mic.rewind(pre_roll)
+            if stream is not None:
+                for hypothesis in stream.feed(source.stream.read(source.CHUNK)):
+                    metrics.observe("transcription_seconds", stt.timings["decode"] / 1000)
+                    channel.put(hypothesis)
                 continue
-            try:
-                print("Start talking!")
+            print("Start talking!")
+            with metrics.span("listen_seconds"):
                 audio = r.listen(source)
-                text = r.recognize_faster_whisper(audio, language="en", model=model).lstrip(" ").rstrip(" ")
-                queue.put(("whisper", text))
-                # print(f"The text generated: {text}")
-            except sr.UnknownValueError:
-                queue.put(("whisper", "COULDN'T UNDERSTAND"))
-            except sr.RequestError as e:
-                queue.put(("whisper", "UNKNOWN ERROR"))
+            with metrics.span("transcription_seconds"):
+                text = stt.transcribe_audio(audio)
+            channel.put(Hypothesis(text, final=True, stable=True))
+            # print(f"The text generated: {text}")
 
 
 def background_listening(callback: Callable, model: str = "base", device_index: int = 0, pause_threshold: float = 0.8) -> Callable:
@@ -143,10 +175,16 @@ class Transcriber:
     >>> # it will update the transcriber history, and also return a response back
     >>> # response = transcriber.get_gemini_user_response()
     """
-    def __init__(self, model_name: str = "gemini-2.0-flash", history_window: int = 10):
+    def __init__(self, model_name: str = "gemini-2.0-flash", history_window: int = 10, gemini_client=None):
+        """
+        :param model_name: the gemini model
+        :param history_window: the number of history entries sent with a query
+        :param gemini_client: the genai client to use, defaults to the module client (pass a fake one for testing)
+        """
         self._history = []
         self._model_name = model_name
         self._history_window = history_window
+        self._client = client if gemini_client is None else gemini_client
 
     def push_user_query(self, message: str, yolo_objects):
         """
@@ -155,7 +193,36 @@ class Transcriber:
         :param yolo_objects: the yolo objects
         :return: none
         """
-        entry = {
+        self._history = self._history[-(self._history_window - 1):]
+        self._history.append(self._user_entry(message, yolo_objects))
+
+    def push_system_response(self, message: str):
+        """
+        Pushes a response entry into the transcribers current history, e.g. one returned by answer
+        :param message: the response message
+        :return: none
+        """
+        self._history.append({
+            "agent": "system",
+            "message": message
+        })
+        self._history = self._history[-self._history_window:]
+
+    def answer(self, message: str, yolo_objects, image: np.ndarray) -> str:
+        """
+        Generates a response to a query without touching the history, so a speculative answer to a
+        partial transcription can be thrown away. Push the query and the response once it is kept.
+        :param message: the query message
+        :param yolo_objects: the yolo objects
+        :param image: a rgb image with 3 channels
+        :return: the system response
+        """
+        history = self._history[-(self._history_window - 1):] + [self._user_entry(message, yolo_objects)]
+        return self._generate(history, image)
+
+    @staticmethod
+    def _user_entry(message: str, yolo_objects):
+        return {
             "agent": "user",
             "message": message,
             "objects": {
@@ -164,8 +231,6 @@ class Transcriber:
                 "forward": yolo_objects["forward"]["objects"]
             }
         }
-        self._history = self._history[-(self._history_window - 1):]
-        self._history.append(entry)
 
     def get_gemini_user_response(self, image: np.ndarray) -> str:
         """
@@ -194,7 +259,11 @@ class Transcriber:
         :param image: a rgb image with 3 channels
         :return: updates the current history and also returns the system response
         """
+        response_text = self._generate(self._history, image)
+        self.push_system_response(response_text)
+        return response_text
 
+    def _generate(self, history, image: np.ndarray) -> str:
         prompt = """
         Example 1:
         Image: An image of a brown chair on the left, a white table in the center, and a black mouse in the center.
@@ -283,24 +352,16 @@ class Transcriber:
 
         query = f"""
         Now, for the given image and the message history, generate an output and return only the output:
-        {self._history}
+        {history}
         """
 
         img = Image.fromarray(image)
-        response = client.models.generate_content(
+        response = self._client.models.generate_content(
             model=self._model_name,
             contents=[prompt + query, img]
         )
 
-        response_text = response.text.strip("\n")
-        self._history.append({
-            "agent": "system",
-            "message": response_text
-        })
-
-        self._history = self._history[-self._history_window:]
-
-        return response_text
+        return response.text.strip("\n")
 
     @property
     def history(self):
@@ -313,7 +374,9 @@ if __name__ == '__main__':
     # print(text)
     image_path = "../table.jpeg"
     image = cv2.imread(image_path)
-    detected_objects = YOLO.yolo_object_detection_v11(image_path)
+    detector = YOLO.Detector()
+    detected_objects = detector.detect(image_path)
+    print(f"Detection took {detector.timings['total']:.1f} ms")
 
     transcriber = Transcriber()
     transcriber.push_user_query("What is to the left of me?", detected_objects)